@@ -0,0 +1 @@
+'''Benchmarks of the document transforms, tape validation and valuation on synthetic data. Run with python -m benchmarks.'''
@@ -0,0 +1,7 @@
+'''Runs the benchmarks, see python -m benchmarks --help.'''
+
+import sys
+
+from benchmarks.suite import main
+
+sys.exit(main())
@@ -0,0 +1,162 @@
+'''Synthetic tapes and valuation workbooks of any size, in the layouts the services expect.'''
+
+import datetime
+import random
+import StringIO
+import openpyxl
+
+# Row counts the benchmarks are usually run at.
+__SIZES__ = [1000, 10000, 100000, 1000000]
+
+# Excel row (1-based) of the first property on a generated tape, after the header block and the column labels.
+__TAPE_BASE_ROW__ = 19
+
+# Validator and required flag of every tape column, starting at the identifier column B. Same as the template tapes we receive.
+__TAPE_COLUMNS__ = [
+    (u'#', u'INTEGER', 1), (u'# of Units', u'INTEGER', 1), (u'Address', u'ADDRESS', 1), (u'City', u'CITY', 1), (u'County', u'COUNTY', 1),
+    (u'State', u'US_STATE', 1), (u'ZIP Code', u'ZIP_CODE', 1), (u'Year Built', u'YEAR', 1), (u'Acquisition Date', u'DATE', 1),
+    (u'Acquisition Price', u'DOLLAR', 1), (u'Renovation Costs', u'DOLLAR', 0), (u'Renovation Date', u'DATE', 0), (u'Class of Space', u'CLASS_OF_SPACE', 1),
+    (u'Beds', u'INTEGER', 1), (u'Baths', u'FLOAT', 1), (u'Lease Status', u'LEASING_STATUS', 1), (u'Days to Complete Construction', u'INTEGER', 1),
+    (u'Lease Start Date', u'DATE', 0), (u'Lease End Date', u'DATE', 0), (u'Monthly Rent', u'DOLLAR', 0), (u'Property Taxes (annual)', u'DOLLAR', 1),
+    (u"Homeowner's Insurance (annual)", u'DOLLAR', 1), (u'Management Fee (%)', u'PERCENTAGE', 1), (u'HOA Fee (annual)', u'DOLLAR', 1),
+    (u'Owner Paid Utilities (annual)', u'DOLLAR', 1), (u'Estimated Upkeep (annual)', u'DOLLAR', 1), (u'Turnover Costs', u'DOLLAR', 1),
+    (u'All Other Expenses (annual)', u'DOLLAR', 1), (u'Owner Estimate of Value', u'DOLLAR', 1), (u'Owner Estimate Source', u'ESTIMATE_SOURCE', 1),
+    (u'Outstanding Property Debt', u'DOLLAR', 1), (u'Outstanding Property Claims', u'DOLLAR', 1)
+]
+
+# Map sheet header and the layout parameters that go in its first row: comment column A, data from column B, unit counts in C,
+# lease status in Q, identifiers in B and the Excel cells of the totals and the status field.
+__MAP_COLUMNS__ = [u'Column Type', u'Required', u'Base Row', u'Base Column', u'Comment Column', u'Unit Count Column', u'Leased Count Column',
+                   u'Identifier Column', u'Property Count Field', u'Unit Count Field', u'Leased Count Field', u'Corporate Debt Field', u'Status Field']
+__MAP_LAYOUT__ = [float(__TAPE_BASE_ROW__), u'B', u'A', u'C', u'Q', u'B', u'7D', u'8D', u'9D', u'10D', u'1A']
+
+# Values that break a cell of each validator, used when corrupting a share of the tape.
+__INVALID_VALUES__ = {
+    u'INTEGER': u'many', u'ADDRESS': u'#!', u'CITY': u'$', u'COUNTY': u'$', u'US_STATE': u'XX', u'ZIP_CODE': u'ABCDE', u'YEAR': u'MCMXC',
+    u'DATE': u'yesterday', u'DOLLAR': u'lots', u'CLASS_OF_SPACE': u'Z', u'FLOAT': u'one and a half', u'LEASING_STATUS': u'Sublet',
+    u'PERCENTAGE': u'half', u'ESTIMATE_SOURCE': u'Guess'
+}
+
+__STATES__ = [u'CA', u'FL', u'IL', u'TX', u'WA', u'VA', u'NY', u'GA']
+# (first, last) 3-digit ZIP prefixes of each state, so that generated ZIP codes are in their row's state.
+__STATE_ZIP_PREFIXES__ = {u'CA': (900, 961), u'FL': (320, 339), u'IL': (600, 629), u'TX': (750, 799), u'WA': (980, 994),
+                          u'VA': (220, 246), u'NY': (100, 149), u'GA': (300, 319)}
+__LEASING_STATUSES__ = [u'Leased', u'Leased - M2M', u'Reno', u'Vacant - Advert', u'Vacant - Pending']
+__ESTIMATE_SOURCES__ = [u'Internal AVM', u'External BPO', u'N/A']
+
+# Day 0 of Excel's 1900 date system, as far as serial dates after February 1900 go.
+__EXCEL_EPOCH__ = datetime.date(1899, 12, 30)
+
+def _valid_value(validator, rng):
+    '''Random cell value that passes the validator.'''
+    if validator == u'INTEGER':
+        return float(rng.randint(0, 6))
+    elif validator == u'ADDRESS':
+        return u'%d Sample Road' % rng.randint(1, 9999)
+    elif validator == u'CITY':
+        return rng.choice([u'Springfield', u'Gainesville', u'New Reno'])
+    elif validator == u'COUNTY':
+        return rng.choice([u'Sangamon', u'Alachua', u'McPherson County'])
+    elif validator == u'US_STATE':
+        return rng.choice(__STATES__)
+    elif validator == u'ZIP_CODE':
+        return float(rng.randint(10000, 99999))
+    elif validator == u'YEAR':
+        return float(rng.randint(1900, 2015))
+    elif validator == u'DATE':
+        return float(rng.randint(36000, 42000))
+    elif validator == u'DOLLAR':
+        return float(rng.randint(0, 500000))
+    elif validator == u'CLASS_OF_SPACE':
+        return rng.choice([u'A', u'B', u'C'])
+    elif validator == u'FLOAT':
+        return rng.choice([1.0, 1.5, 2.0, 2.5, 3.0])
+    elif validator == u'LEASING_STATUS':
+        return rng.choice(__LEASING_STATUSES__)
+    elif validator == u'PERCENTAGE':
+        return round(rng.uniform(0.0, 0.1), 3)
+    elif validator == u'ESTIMATE_SOURCE':
+        return rng.choice(__ESTIMATE_SOURCES__)
+    raise KeyError(validator)
+
+# Columns of the state and the ZIP code in a generated row, after the comment column.
+__STATE_COLUMN__ = [validator for _, validator, _ in __TAPE_COLUMNS__].index(u'US_STATE') + 1
+__ZIP_COLUMN__ = [validator for _, validator, _ in __TAPE_COLUMNS__].index(u'ZIP_CODE') + 1
+
+def _state_zip(state, zip_code):
+    '''The random ZIP code moved into the state's prefixes, without drawing again so the rest of the tape stays the same.'''
+    first, last = __STATE_ZIP_PREFIXES__[state]
+    return float(first * 100 + int(zip_code) % ((last - first + 1) * 100))
+
+def tape_rows(rows, seed=0, invalid_fraction=0.0, date_format=None):
+    '''Yields the data rows of a tape: comment column, identifier and one value per __TAPE_COLUMNS__ entry.
+
+    invalid_fraction - share of rows that get one cell broken, so the error paths are exercised too.
+    date_format - strftime format to write dates as text in, rather than as Excel serial dates.
+    '''
+    rng = random.Random(seed)
+    for index in range(rows):
+        row = [u''] + [_valid_value(validator, rng) for _, validator, _ in __TAPE_COLUMNS__]
+        if date_format is not None:
+            for column, (_, validator, _) in enumerate(__TAPE_COLUMNS__, 1):
+                if validator == u'DATE':
+                    row[column] = unicode((__EXCEL_EPOCH__ + datetime.timedelta(days=row[column])).strftime(date_format))
+        row[1] = float(index + 1)
+        row[2] = float(rng.randint(1, 4))
+        row[__ZIP_COLUMN__] = _state_zip(row[__STATE_COLUMN__], row[__ZIP_COLUMN__])
+        if rng.random() < invalid_fraction:
+            column = rng.randint(3, len(__TAPE_COLUMNS__))
+            row[column] = __INVALID_VALUES__[__TAPE_COLUMNS__[column - 1][1]]
+        yield row
+
+def _save(workbook):
+    '''Serializes an openpyxl workbook to xlsx bytes.'''
+    output_stream = StringIO.StringIO()
+    workbook.save(output_stream)
+    return output_stream.getvalue()
+
+def tape_workbook(rows, seed=0, invalid_fraction=0.0, date_format=None):
+    '''Tape xlsx with a Portfolio sheet of rows properties and the Map sheet TapeValidation reads its layout from.'''
+    width = len(__TAPE_COLUMNS__) + 2
+    workbook = openpyxl.Workbook(write_only=True)
+    portfolio = workbook.create_sheet(u'Portfolio')
+    header = [[u''] * width for _ in range(__TAPE_BASE_ROW__ - 1)]
+    header[1][1] = u'TRANSACTION DATA SUBMISSION'
+    for row, label in zip(range(6, 10), [u'Total Property Count', u'Total Unit Count', u'Total Lease Count', u'Total Corporate Debt']):
+        header[row][1], header[row][3] = label, 0.0
+    header[-1] = [u''] + [label for label, _, _ in __TAPE_COLUMNS__] + [u'Comments']
+    for row in header:
+        portfolio.append(row)
+    for row in tape_rows(rows, seed, invalid_fraction, date_format):
+        portfolio.append(row + [u''])
+
+    tape_map = workbook.create_sheet(u'Map')
+    tape_map.append(__MAP_COLUMNS__)
+    for index, (_, validator, required) in enumerate(__TAPE_COLUMNS__):
+        tape_map.append([validator, required] + (__MAP_LAYOUT__ if index == 0 else [u''] * len(__MAP_LAYOUT__)))
+    return _save(workbook)
+
+# Deal sheet and data sheet columns of a valuation workbook.
+__DEAL_COLUMNS__ = [u'Current Offer', u'Assumed Occupancy', u'Assumed Operating Income Percent', u'Baseline Real Value to Valuation', u'Target IRR']
+__DATA_COLUMNS__ = [u'Address', u'Property Type', u'City', u'State', u'Zip', u'# of Units', u'# of Leases', u'Monthly Rent', u'Valuation']
+
+def valuation_rows(rows, seed=0):
+    '''Yields the data sheet rows of a valuation workbook, one property each.'''
+    rng = random.Random(seed)
+    for _ in range(rows):
+        yield [u'%d Sample Road' % rng.randint(1, 9999), u'SFR', u'Springfield', rng.choice(__STATES__), u'%05d' % rng.randint(10000, 99999),
+               1.0, float(rng.randint(0, 1)), float(rng.randint(800, 6000)), float(rng.randint(100, 1500) * 1000)]
+
+def valuation_workbook(rows, seed=0):
+    '''Valuation xlsx with a Deal sheet and a Data sheet of rows properties, offered at 9% over their total valuation.'''
+    workbook = openpyxl.Workbook(write_only=True)
+    deal = workbook.create_sheet(u'Deal')
+    data = workbook.create_sheet(u'Data')
+    data.append(__DATA_COLUMNS__)
+    total_valuation = 0.0
+    for row in valuation_rows(rows, seed):
+        total_valuation += row[-1]
+        data.append(row)
+    deal.append(__DEAL_COLUMNS__)
+    deal.append([total_valuation * 1.09, 0.85, 0.55, 1.09, 0.12])
+    return _save(workbook)
@@ -0,0 +1,179 @@
+'''Times the transforms, tape validation and valuation over synthetic data and compares the results with a saved baseline.'''
+
+import argparse
+import json
+import multiprocessing
+import os.path
+import platform
+import resource
+import sys
+import timeit
+
+from benchmarks import generators
+from daedalus.common import timing
+from daedalus.validation.tape_validation import TapeValidation
+from daedalus.valuation import valuation
+from daedalus.xlstransform import transforms
+
+DESCRIPTION = 'Benchmarks the document transforms, tape validation and valuation on synthetic tapes and portfolios.'
+
+# Baseline shipped with the repository, recorded at 1k and 10k rows.
+__BASELINE_PATH__ = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+
+# Slowdown over the baseline, as a fraction of its time, that counts as a regression.
+__THRESHOLD__ = 0.1
+
+def _tape(rows):
+    '''Synthetic tape with a few broken cells.'''
+    return generators.tape_workbook(rows, invalid_fraction=0.01)
+
+def _valuation_data(rows):
+    '''Synthetic portfolio as the JSON dict valuate takes.'''
+    return json.loads(transforms.excel_to_json(generators.valuation_workbook(rows)))
+
+def _valuate(engine):
+    '''Valuation of the portfolio, without the aggregate cache so every run sums the data sheet.'''
+    def run(data):
+        valuation.__AGGREGATE_CACHE__.clear()
+        return valuation.valuate(data, engine=engine)
+    return run
+
+def _text_date_tape(rows):
+    '''Synthetic tape with its dates written as text, in the last of the formats valid_date tries.'''
+    return generators.tape_workbook(rows, invalid_fraction=0.01, date_format='%Y-%b-%d')
+
+def _tape_json(rows):
+    '''Synthetic tape as the JSON excel_to_json makes of it.'''
+    return transforms.excel_to_json(_tape(rows))
+
+# Benchmark cases: (input generator, function timed on the input). The input is built once per size, outside the timing.
+__CASES__ = {
+    'excel_to_json': (_tape, transforms.excel_to_json),
+    'json_to_excel': (_tape_json, transforms.json_to_excel),
+    'tape_type_check': (_tape, lambda tape: TapeValidation(tape)._check_type()), # pylint: disable=protected-access
+    'tape_type_check_rows': (_tape, lambda tape: TapeValidation(tape, 'rows')._check_type()), # pylint: disable=protected-access
+    'tape_type_check_text_dates': (_text_date_tape, lambda tape: TapeValidation(tape)._check_type()), # pylint: disable=protected-access
+    'tape_type_check_streaming': (_tape, lambda tape: TapeValidation(tape, 'streaming')._check_type()), # pylint: disable=protected-access
+    'tape_validation': (_tape, lambda tape: TapeValidation(tape).run()),
+    'tape_validation_report': (_tape, lambda tape: TapeValidation(tape).run('report')),
+    'tape_validation_fail_fast': (_tape, lambda tape: TapeValidation(tape, max_errors=100).run('report')),
+    'tape_validation_sample': (_tape, lambda tape: TapeValidation(tape).run('sample')),
+    'valuate': (_valuation_data, _valuate('decimal')),
+    'valuate_numpy': (_valuation_data, _valuate('numpy'))
+}
+
+def _peak_rss_mb():
+    '''High-water mark of this process' resident memory in MB.'''
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, OS X bytes.
+    return peak / (1024.0 * 1024.0) if sys.platform == 'darwin' else peak / 1024.0
+
+def _measure(case, data, rows, repeat):
+    '''Times the case repeat times in this process. Returns the result dict, see run_case.'''
+    function = __CASES__[case][1]
+    rss_before = _peak_rss_mb()
+    best, stages = None, None
+    for _ in range(repeat):
+        with timing.record() as timings:
+            start = timeit.default_timer()
+            function(data)
+            seconds = timeit.default_timer() - start
+        if best is None or seconds < best:
+            best, stages = seconds, dict(timings)
+    peak = _peak_rss_mb()
+    return {'rows': rows, 'seconds': best, 'rows_per_second': rows / best if best else None, 'peak_rss_mb': peak,
+            'peak_growth_mb': peak - rss_before, 'stages': stages}
+
+def _measure_into(queue, case, data, rows, repeat):
+    '''Child process body, reports the result or the error through the queue.'''
+    try:
+        queue.put(_measure(case, data, rows, repeat))
+    except Exception as error: # pylint: disable=broad-except
+        queue.put({'rows': rows, 'error': '%s: %s' % (type(error).__name__, error)})
+
+def run_case(case, rows, repeat=3, inputs=None):
+    '''Runs one case at one size in a forked process, so its memory high-water mark is its own and not the input generator's.
+
+    inputs - dict the generated inputs are kept in by (generator, rows), to share them between cases.
+
+    Returns a dict with the best time over repeat runs in 'seconds', 'rows_per_second', the process' 'peak_rss_mb' and the
+    'peak_growth_mb' while the case ran, and the 'stages' recorded by daedalus.common.timing. A failing case returns its 'error'.
+    '''
+    assert case in __CASES__
+    assert repeat > 0
+    inputs = {} if inputs is None else inputs
+    make_input = __CASES__[case][0]
+    if (make_input, rows) not in inputs:
+        inputs[(make_input, rows)] = make_input(rows)
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure_into, args=(queue, case, inputs[(make_input, rows)], rows, repeat))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def run(cases, sizes, repeat=3):
+    '''Runs every case at every size. Returns {case: {rows: result}} with the rows as strings, as they are saved in JSON.'''
+    results = dict((case, {}) for case in cases)
+    for rows in sizes:
+        inputs = {}
+        for case in cases:
+            results[case][str(rows)] = run_case(case, rows, repeat, inputs)
+    return results
+
+def compare(results, baseline, threshold=__THRESHOLD__):
+    '''Lists the (case, rows, baseline seconds, seconds) that are more than threshold slower than the baseline.
+
+    Cases or sizes missing from either side, or failing on either side, are not compared.
+    '''
+    regressions = []
+    for case, by_size in sorted(results.items()):
+        for rows, result in sorted(by_size.items(), key=lambda item: int(item[0])):
+            reference = baseline.get('results', {}).get(case, {}).get(rows)
+            if not reference or 'error' in reference or 'error' in result:
+                continue
+            if result['seconds'] > reference['seconds'] * (1.0 + threshold):
+                regressions.append((case, int(rows), reference['seconds'], result['seconds']))
+    return regressions
+
+def report(results):
+    '''Formats the results as a table.'''
+    lines = ['%-25s %9s %10s %12s %9s %9s' % ('case', 'rows', 'seconds', 'rows/s', 'peak MB', 'growth MB')]
+    for case, by_size in sorted(results.items()):
+        for rows, result in sorted(by_size.items(), key=lambda item: int(item[0])):
+            if 'error' in result:
+                lines.append('%-25s %9s  %s' % (case, rows, result['error']))
+            else:
+                lines.append('%-25s %9s %10.4f %12.1f %9.1f %9.1f' % (case, rows, result['seconds'], result['rows_per_second'],
+                                                                    result['peak_rss_mb'], result['peak_growth_mb']))
+    return '\n'.join(lines)
+
+def parse_args(args):
+    '''Parses the command line arguments.'''
+    parser = argparse.ArgumentParser(description=DESCRIPTION)
+    parser.add_argument('--cases', nargs='+', choices=sorted(__CASES__), default=sorted(__CASES__))
+    parser.add_argument('--sizes', nargs='+', type=int, default=generators.__SIZES__[:2],
+                        help='row counts to run at, eg. %s' % ' '.join(str(size) for size in generators.__SIZES__))
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case and size, the best one is kept')
+    parser.add_argument('--save', metavar='PATH', help='save the results as a new baseline')
+    parser.add_argument('--compare', metavar='PATH', nargs='?', const=__BASELINE_PATH__, help='baseline to compare with')
+    parser.add_argument('--threshold', type=float, default=__THRESHOLD__, help='slowdown that fails the comparison, eg. 0.1 for 10%%')
+    return parser.parse_args(args)
+
+def main(argv=None):
+    '''Entry point from the command line. Returns 1 when a case regressed against the baseline.'''
+    args = parse_args(sys.argv[1:] if argv is None else argv)
+    results = run(args.cases, args.sizes, args.repeat)
+    print report(results)
+    if args.save:
+        with open(args.save, 'w') as baseline_file:
+            json.dump({'machine': platform.platform(), 'python': platform.python_version(), 'results': results}, baseline_file,
+                      indent=2, separators=(',', ': '), sort_keys=True)
+    if args.compare:
+        with open(args.compare) as baseline_file:
+            baseline = json.load(baseline_file)
+        regressions = compare(results, baseline, args.threshold)
+        for case, rows, reference, seconds in regressions:
+            print 'REGRESSION %s at %d rows: %.4fs, baseline %.4fs (%+.0f%%)' % (case, rows, seconds, reference, (seconds / reference - 1) * 100)
+        return 1 if regressions else 0
+    return 0
@@ -0,0 +1,55 @@
+'''Bounded least recently used cache.'''
+
+import collections
+
+class LRUCache(object):
+    '''Dictionary-like cache holding at most max_entries items, evicting the least recently used one first.
+
+    With max_bytes, the cache also holds at most that many bytes of values, as measured by sizeof. max_entries can then be None for
+    no bound on the number of items. A value larger than max_bytes is not kept.
+    '''
+
+    def __init__(self, max_entries, max_bytes=None, sizeof=len):
+        assert max_entries is None or max_entries > 0
+        assert max_bytes is None or max_bytes > 0
+        assert max_entries is not None or max_bytes is not None
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.total_bytes = 0
+        self._entries = collections.OrderedDict()
+        self._sizes = {}
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        '''Returns the cached value and marks it as most recently used.'''
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            return default
+        self._entries[key] = value
+        return value
+
+    def put(self, key, value):
+        '''Caches a value, evicting the least recently used entries past max_entries or max_bytes.'''
+        self._entries.pop(key, None)
+        self.total_bytes -= self._sizes.pop(key, 0)
+        self._entries[key] = value
+        if self.max_bytes is not None:
+            self._sizes[key] = self.sizeof(value)
+            self.total_bytes += self._sizes[key]
+        while self._entries and (self.max_entries is not None and len(self._entries) > self.max_entries or
+                                 self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            evicted, _ = self._entries.popitem(last=False)
+            self.total_bytes -= self._sizes.pop(evicted, 0)
+
+    def clear(self):
+        '''Drops every cached value.'''
+        self._entries.clear()
+        self._sizes.clear()
+        self.total_bytes = 0
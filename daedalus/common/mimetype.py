@@ -9,6 +9,9 @@ __MIMETYPE_MAPS__ = {
     },
     'json': {
         'default': 'application/json'
+    },
+    'npy': {
+        'default': 'application/octet-stream'
     }
 }
 
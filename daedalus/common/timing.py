@@ -0,0 +1,41 @@
+'''Lightweight per-stage timing of jobs.'''
+
+import collections
+import contextlib
+import threading
+import timeit
+
+__LOCAL__ = threading.local()
+
+def _recordings():
+    '''Stack of the timings being recorded on this thread, innermost last.'''
+    if not hasattr(__LOCAL__, 'recordings'):
+        __LOCAL__.recordings = []
+    return __LOCAL__.recordings
+
+@contextlib.contextmanager
+def record():
+    '''Records the duration of every stage run inside the block. Yields an ordered dict of stage name to seconds.'''
+    timings = collections.OrderedDict()
+    recordings = _recordings()
+    recordings.append(timings)
+    try:
+        yield timings
+    finally:
+        recordings.remove(timings)
+
+@contextlib.contextmanager
+def stage(name):
+    '''Times the block as the named stage. Repeated stages add up. Costs two clock reads when nothing is recording.'''
+    start = timeit.default_timer()
+    try:
+        yield
+    finally:
+        recordings = _recordings()
+        if recordings:
+            timings = recordings[-1]
+            timings[name] = timings.get(name, 0.0) + timeit.default_timer() - start
+
+def to_header(timings):
+    '''Formats timings like the Server-Timing HTTP header, eg. "parse;dur=1.204, encode;dur=0.310" in milliseconds.'''
+    return ', '.join('%s;dur=%.3f' % (name, seconds * 1000.0) for name, seconds in timings.items())
@@ -18,4 +18,18 @@ POSTGRES_URL = os.environ.get('POSTGRES_URL', 'postgres://localhost:5432')
 
 LOG_LEVEL = os.environ.get('LOG_LEVEL', 'INFO')
 
+VALUATION_CACHE_SIZE = int(os.environ.get('VALUATION_CACHE_SIZE', 128))
+VALUATION_PROCESSES = int(os.environ.get('VALUATION_PROCESSES', 1))
+
+VALIDATION_PLAN_CACHE_SIZE = int(os.environ.get('VALIDATION_PLAN_CACHE_SIZE', 32))
+VALIDATION_PROCESSES = int(os.environ.get('VALIDATION_PROCESSES', 1))
+VALIDATION_CHUNK_SIZE = int(os.environ.get('VALIDATION_CHUNK_SIZE', 50000))
+VALIDATION_ENGINE = os.environ.get('VALIDATION_ENGINE', 'columnar')
+VALIDATION_REVISION_CACHE_SIZE = int(os.environ.get('VALIDATION_REVISION_CACHE_SIZE', 64))
+VALIDATION_MAX_ERRORS = int(os.environ.get('VALIDATION_MAX_ERRORS', 0))
+VALIDATION_SAMPLE_SIZE = int(os.environ.get('VALIDATION_SAMPLE_SIZE', 1000))
+VALIDATION_RESULT_CACHE_BYTES = int(os.environ.get('VALIDATION_RESULT_CACHE_BYTES', 256 * 1024 * 1024))
+VALIDATION_RESULT_CACHE_DIR = os.environ.get('VALIDATION_RESULT_CACHE_DIR')
+VALIDATION_RESULT_CACHE_DISK_BYTES = int(os.environ.get('VALIDATION_RESULT_CACHE_DISK_BYTES', 4 * 1024 * 1024 * 1024))
+
 ALLOWED_DOMAINS = ['localhost', '127.0.0.1']
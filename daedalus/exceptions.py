@@ -44,3 +44,21 @@ class UnknownUsername(DaedalusError):
 
 class BadDataFrameKey(DaedalusError):
     '''Thrown when a key is missing from a dataframe.'''
+
+class UnknownEngine(DaedalusError):
+    '''Thrown when asking for a valuation or validation engine that does not exist.'''
+
+class BadSensitivityAxis(DaedalusError):
+    '''Thrown when a sensitivity grid asks for an unknown axis or metric.'''
+
+class BadDistribution(DaedalusError):
+    '''Thrown when a simulation asks for an unknown probability distribution.'''
+
+class BadGoal(DaedalusError):
+    '''Thrown when a goal seek asks for an unknown target.'''
+
+class BadHeader(DaedalusError):
+    '''Thrown when a job header holds a value that can't be used.'''
+
+class BadCellValue(DaedalusError):
+    '''Thrown when a data sheet cell holds a value that can't be used.'''
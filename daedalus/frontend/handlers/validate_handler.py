@@ -8,6 +8,9 @@ class ValidateHandler(QueueingRequestHandler):
 
     queue_name = 'validation'
 
+    # Request headers passed on to the validation job: the identifier of a revised tape, the output wanted and the errors to stop at.
+    forwarded_headers = {'x-tape-id': 'tape_id', 'x-output-format': 'output_format', 'x-max-errors': 'max_errors'}
+
     @classmethod
     def route(cls):
         '''Route definition for the application.'''
@@ -17,4 +20,7 @@ class ValidateHandler(QueueingRequestHandler):
     def post(self):
         '''Starts a job to validate a document.'''
         self.request_message.body = self.request.body
+        for http_header, header in self.forwarded_headers.items():
+            if self.request.headers.get(http_header) is not None:
+                self.request_message.set_header(header, self.request.headers.get(http_header))
         self.publish(self.request_message)
@@ -1,9 +1,16 @@
 # pylint: disable=no-member
 '''Classes for handling the /valuate route.'''
 
+import daedalus.valuation.break_even
+import daedalus.valuation.encoding
 import daedalus.xlstransform.transforms
+import json
 from daedalus.frontend.handlers.queueing_request_handler import QueueingRequestHandler, jobify
 
+def _is_precision(text):
+    '''True for a number of decimals the offer matrix encodings can round to.'''
+    return text.isdigit() and int(text) <= daedalus.valuation.encoding.__MAX_PRECISION__
+
 class ValuateHandler(QueueingRequestHandler):
     '''Handles the document transformation route.'''
 
@@ -24,4 +31,30 @@ class ValuateHandler(QueueingRequestHandler):
             self.write({'error': error.message})
             return
 
+        # ?solve=<target> asks for just the offer that hits the target instead of the offer matrix.
+        solve = self.get_argument('solve', None)
+        if solve:
+            if solve not in daedalus.valuation.break_even.__TARGETS__:
+                self.set_status(400)
+                self.write({'error': 'unsupported goal seek target: %r' % solve})
+                return
+            incoming_file = {'portfolio': json.loads(incoming_file), 'solve': solve}
+
+        # ?encoding=columnar|npy and ?precision=<decimals> pick a compact offer matrix encoding.
+        encoding = self.get_argument('encoding', None)
+        if encoding:
+            if encoding not in daedalus.valuation.encoding.__ENCODINGS__:
+                self.set_status(400)
+                self.write({'error': 'unsupported encoding: %r' % encoding})
+                return
+            self.request_message.set_header('encoding', encoding)
+        precision = self.get_argument('precision', None)
+        if precision:
+            if not _is_precision(precision):
+                self.set_status(400)
+                self.write({'error': 'precision must be a number of decimals from 0 to %d, got %r' %
+                                     (daedalus.valuation.encoding.__MAX_PRECISION__, precision)})
+                return
+            self.request_message.set_header('precision', int(precision))
+
         self.request_message.body = incoming_file
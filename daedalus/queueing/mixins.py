@@ -2,6 +2,7 @@
 '''Responder - responds to items on the response queue.'''
 
 import datetime
+import json
 import daedalus.common.security
 import daedalus.exceptions
 import daedalus.queueing.messages
@@ -12,7 +13,7 @@ import multiprocessing
 import Queue
 import requests
 
-from daedalus.common import auth, log_manager
+from daedalus.common import auth, log_manager, timing
 
 def _make_request(queue, response_message):
     '''Default response processing function. Kicks a webhook url.'''
@@ -55,8 +56,11 @@ class ConsumerMixin(kombu.mixins.ConsumerMixin):
         try:
             start_time = datetime.datetime.now().ctime()
             log_manager.info('Starting processing task at %s' % start_time)
-            self.process_task(request_message, response_message)
+            with timing.record() as timings:
+                self.process_task(request_message, response_message)
             response_message.set_header('start_time', start_time)
+            response_message.set_header('stage_timings', timing.to_header(timings))
+            log_manager.info('Stage timings: %s' % json.dumps(timings))
             response_message.set_header('end_time', datetime.datetime.now().ctime())
             response_message.set_header('job_status', 'success')
             log_manager.info('Finished processing task at %s' % response_message.get_header('end_time'))
@@ -12,11 +12,15 @@ def parse_args(args):
     argparser = argparse.ArgumentParser(description=DESCRIPTION)
     argparser.add_argument('infile', nargs='?', type=argparse.FileType('r'), default=sys.stdin)
     argparser.add_argument('outfile', nargs='?', type=argparse.FileType('w'), default=sys.stdout)
+    argparser.add_argument('--format', choices=['excel', 'report', 'sample'], default='excel',
+                           help='write the document with its errors marked, a JSON report of the errors, or a JSON estimate of them '
+                                'from a sample of the rows')
+    argparser.add_argument('--max-errors', type=int, default=None, help='stop validating after that many errors, 0 for no limit')
     return argparser.parse_args(args)
 
 def main():
     '''Entry point from the command line. Parses arguments and calls validate.'''
     args = parse_args(sys.argv[1:])
     input_data = args.infile.read()
-    output_data = daedalus.validation.validate(input_data)
+    output_data = daedalus.validation.validate(input_data, output_format=args.format, max_errors=args.max_errors)
     args.outfile.write(output_data)
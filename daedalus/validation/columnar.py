@@ -0,0 +1,170 @@
+'''Tape validation a column at a time.
+
+Number cells are checked in bulk with NumPy masks. Every other cell goes through its column's validator once per distinct value, so
+low cardinality columns like states, enums and cities cost one check per value rather than per row. The problems found are the same,
+in the same order, as checking cell by cell.
+'''
+
+import collections
+import multiprocessing
+import numpy
+
+import daedalus.exceptions
+
+# Masks of the number cells each column type accepts, computed on a float64 array. Number cells outside the mask, eg. out of range,
+# are left to the column's validator for the exact error.
+__NUMBER_CHECKS__ = {
+    u'DATE': lambda numbers: (numbers >= 61) & (numbers < 2958465), # Excel 1900 serial dates xlrd converts without ambiguity
+    u'DOLLAR': lambda numbers: numpy.ones(numbers.shape, dtype=bool),
+    u'FLOAT': lambda numbers: numpy.ones(numbers.shape, dtype=bool),
+    u'INTEGER': numpy.isfinite,
+    u'PERCENTAGE': lambda numbers: (numbers >= 0.0) & (numbers <= 100.0),
+    u'YEAR': lambda numbers: (numbers == numpy.floor(numbers)) & (numbers >= 1000) & (numbers < 10000),
+    u'ZIP_CODE': lambda numbers: (numbers == numpy.floor(numbers)) & (numbers >= 10000) & (numbers < 100000)
+}
+
+# Leasing statuses counted as leased in the tape totals.
+__LEASED_STATUSES__ = frozenset([u'LEASED', u'LEASED - M2M'])
+
+# Tape being checked in parallel. Set before the pool forks so workers inherit the rows and plan rather than unpickling them per chunk.
+__SHARED__ = {}
+
+def _numbers(values):
+    '''Mask of the number cells and a float64 array holding them, 0 elsewhere.'''
+    is_number = numpy.array(map(type, values), dtype=object) == float
+    numbers = numpy.zeros(len(values))
+    numbers[is_number] = numpy.array(values, dtype=object)[is_number]
+    return is_number, numbers
+
+def _numbering_problems(identifiers, problems, first=1):
+    '''Adds (position, -1, None, error) for every identifier out of sequence, starting at first. Identifiers that are not integers are
+    skipped.'''
+    is_number, numbers = _numbers(identifiers)
+    expected = numpy.arange(first, first + len(identifiers))
+    finite = is_number & numpy.isfinite(numbers)
+    for position in numpy.flatnonzero(finite & (numpy.trunc(numbers) != expected)):
+        problems.append((position, -1, None, 'Invalid numbering.'))
+    for position in numpy.flatnonzero(~finite):
+        try:
+            if int(identifiers[position]) != position + first:
+                problems.append((position, -1, None, 'Invalid numbering.'))
+        except ValueError:
+            pass
+
+def _count_units(values):
+    '''Sum of the unit cells as whole numbers, or None when one of them is not a number.'''
+    is_number, numbers = _numbers(values)
+    if not is_number.all():
+        if not all(isinstance(values[position], (float, int)) for position in numpy.flatnonzero(~is_number)):
+            return None
+        return sum(int(value) for value in values)
+    return int(numpy.trunc(numbers).sum())
+
+def _count_leased(values):
+    '''Number of leased units, or None when a leasing status is missing. Each distinct status is only upper cased once.'''
+    statuses = collections.Counter(values)
+    if u'' in statuses:
+        return None
+    return sum(count for status, count in statuses.items() if isinstance(status, basestring) and status.upper() in __LEASED_STATUSES__)
+
+def _column_problems(values, order, column, column_type, validator, mandatory, problems): # pylint: disable=too-many-arguments
+    '''Adds (position, order, column, error) for every invalid or missing cell of one column.'''
+    if column_type in __NUMBER_CHECKS__:
+        is_number, numbers = _numbers(values)
+        with numpy.errstate(invalid='ignore'):
+            accepted = is_number & __NUMBER_CHECKS__[column_type](numbers)
+        positions = numpy.flatnonzero(~accepted)
+    else:
+        positions = range(len(values))
+    results = {}
+    for position in positions:
+        value = values[position]
+        if value == u'':
+            if mandatory:
+                problems.append((position, order, column, 'Required cell is empty.'))
+            continue
+        # Keyed by type too, as 1 and 1.0 are equal but not alike to the regex validators.
+        key = (value.__class__, value)
+        if key not in results:
+            results[key] = validator(value)
+        result, error = results[key]
+        if not result:
+            problems.append((position, order, column, error))
+
+def check_columns(rows, plan, base_row, identifier_column, row_offset=0, col_offset=0, start=0, stop=None, numbering=True, totals=None): # pylint: disable=too-many-arguments,too-many-locals
+    '''Validates the data rows of a tape column by column. Returns the ((row, col), error) problems in row, then column order.
+
+    rows - all rows of the tape sheet, the data starting at base_row.
+    plan - the ValidationPlan of the tape's template.
+    row_offset, col_offset - added to the row and column of every problem, eg. to report them in Excel numbering.
+    start, stop - range of data rows checked, counted from base_row. All of them by default.
+    numbering - False to skip checking the identifier column is numbered in sequence.
+    totals - dict to fill in with the 'property_count', 'unit_count' and 'leased_count' of the rows, from the unit and leased count
+    columns of the plan's metadata. The counts are None when a cell they are made of is invalid.
+    '''
+    stop = len(rows) - base_row if stop is None else stop
+    data = rows[base_row + start:base_row + stop]
+    if len(set(len(cells) for cells in data)) == 1:
+        # Transposing is much faster than picking every column out, but only lines up when the rows are all as wide.
+        columns = zip(*data)
+        column_values = lambda column: columns[column]
+    else:
+        column_values = lambda column: [cells[column] for cells in data]
+    problems = []
+    if numbering:
+        _numbering_problems(column_values(identifier_column), problems, start + 1)
+    for order, (column, validator, mandatory) in enumerate(plan.columns):
+        _column_problems(column_values(column), order, column, plan.column_types[order], validator, mandatory, problems)
+    if totals is not None:
+        width = min(len(cells) for cells in data) if data else 0
+        unit_column, leased_column = plan.metadata['unit_count_column'], plan.metadata['leased_count_column']
+        totals['property_count'] = len(data)
+        totals['unit_count'] = _count_units(column_values(unit_column)) if unit_column < width or not data else None
+        totals['leased_count'] = _count_leased(column_values(leased_column)) if leased_column < width or not data else None
+    problems.sort(key=lambda problem: problem[:2])
+    return [((base_row + start + int(position) + row_offset, identifier_column if column is None else column + col_offset), error)
+            for position, _, column, error in problems]
+
+def merge_totals(chunk_totals):
+    '''Totals of a tape from the totals of its chunks, see check_columns.'''
+    totals = {'property_count': 0, 'unit_count': 0, 'leased_count': 0}
+    for chunk in chunk_totals:
+        for key, count in chunk.items():
+            totals[key] = None if count is None or totals[key] is None else totals[key] + count
+    return totals
+
+def _check_chunk(chunk):
+    '''Pool worker body, checks one (start, stop) chunk of the shared tape. Returns its problems and totals.'''
+    start, stop = chunk
+    totals = {} if __SHARED__['totals'] else None
+    problems = check_columns(__SHARED__['rows'], __SHARED__['plan'], __SHARED__['base_row'], __SHARED__['identifier_column'],
+                             __SHARED__['row_offset'], __SHARED__['col_offset'], start, stop, totals=totals)
+    return problems, totals
+
+def check_columns_parallel(rows, plan, base_row, identifier_column, row_offset=0, col_offset=0, processes=1, chunk_size=50000, totals=None): # pylint: disable=too-many-arguments,too-many-locals
+    '''Same as check_columns, with the data rows split in chunks of chunk_size checked across processes workers.
+
+    The workers are forked after the tape is shared, so only the chunk bounds, the problems found and the totals go through pickling.
+    Problems are merged in row order. Tapes of a single chunk, or a single process, are checked in this process.
+    '''
+    if processes < 1 or chunk_size < 1:
+        raise daedalus.exceptions.DaedalusError('Invalid processes or chunk size: %r, %r' % (processes, chunk_size))
+    data_rows = max(len(rows) - base_row, 0)
+    chunks = [(start, min(start + chunk_size, data_rows)) for start in range(0, data_rows, chunk_size)]
+    if processes == 1 or len(chunks) <= 1:
+        return check_columns(rows, plan, base_row, identifier_column, row_offset, col_offset, totals=totals)
+
+    __SHARED__.update(rows=rows, plan=plan, base_row=base_row, identifier_column=identifier_column, row_offset=row_offset,
+                      col_offset=col_offset, totals=totals is not None)
+    try:
+        pool = multiprocessing.Pool(min(processes, len(chunks)))
+        try:
+            results = pool.map(_check_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    finally:
+        __SHARED__.clear()
+    if totals is not None:
+        totals.update(merge_totals(chunk_totals for _, chunk_totals in results))
+    return [problem for chunk_problems, _ in results for problem in chunk_problems]
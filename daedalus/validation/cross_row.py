@@ -0,0 +1,103 @@
+'''Validation rules across the rows of a tape: duplicate properties and ZIP codes outside their state.
+
+Rules are checked a row at a time against hash indexes of the rows before it, so a tape is checked in one pass whatever its length,
+and rows read off the document as they come can be checked as they are. Duplicate identifiers need no rule of their own, the
+numbering of the rows 1..n already reports every one of them.
+'''
+
+import re
+
+from daedalus.validation import zip_states
+
+# State codes of the full state names a state column can hold.
+__STATE_NAMES__ = {
+    u'ALABAMA': 'AL', u'ALASKA': 'AK', u'AMERICAN SAMOA': 'AS', u'ARIZONA': 'AZ', u'ARKANSAS': 'AR', u'CALIFORNIA': 'CA',
+    u'COLORADO': 'CO', u'CONNECTICUT': 'CT', u'DELAWARE': 'DE', u'DISTRICT OF COLUMBIA': 'DC', u'FLORIDA': 'FL', u'GEORGIA': 'GA',
+    u'GUAM': 'GU', u'HAWAII': 'HI', u'IDAHO': 'ID', u'ILLINOIS': 'IL', u'INDIANA': 'IN', u'IOWA': 'IA', u'KANSAS': 'KS',
+    u'KENTUCKY': 'KY', u'LOUISIANA': 'LA', u'MAINE': 'ME', u'MARYLAND': 'MD', u'MASSACHUSETTS': 'MA', u'MICHIGAN': 'MI',
+    u'MINNESOTA': 'MN', u'MISSISSIPPI': 'MS', u'MISSOURI': 'MO', u'MONTANA': 'MT', u'NEBRASKA': 'NE', u'NEVADA': 'NV',
+    u'NEW HAMPSHIRE': 'NH', u'NEW JERSEY': 'NJ', u'NEW MEXICO': 'NM', u'NEW YORK': 'NY', u'NORTH CAROLINA': 'NC', u'NORTH DAKOTA': 'ND',
+    u'NORTHERN MARIANA ISLANDS': 'MP', u'OHIO': 'OH', u'OKLAHOMA': 'OK', u'OREGON': 'OR', u'PENNSYLVANIA': 'PA', u'PUERTO RICO': 'PR',
+    u'RHODE ISLAND': 'RI', u'SOUTH CAROLINA': 'SC', u'SOUTH DAKOTA': 'SD', u'TENNESSEE': 'TN', u'TEXAS': 'TX', u'UTAH': 'UT',
+    u'VERMONT': 'VT', u'VIRGIN ISLANDS': 'VI', u'VIRGINIA': 'VA', u'WASHINGTON': 'WA', u'WEST VIRGINIA': 'WV', u'WISCONSIN': 'WI',
+    u'WYOMING': 'WY'
+}
+
+# Usual abbreviations of address words, so that '12 Main Street' and '12 MAIN ST.' are the same property.
+__ADDRESS_ABBREVIATIONS__ = {
+    u'AVENUE': u'AVE', u'BOULEVARD': u'BLVD', u'CIRCLE': u'CIR', u'COURT': u'CT', u'DRIVE': u'DR', u'EAST': u'E', u'HIGHWAY': u'HWY',
+    u'LANE': u'LN', u'NORTH': u'N', u'PARKWAY': u'PKWY', u'PLACE': u'PL', u'ROAD': u'RD', u'SOUTH': u'S', u'STREET': u'ST',
+    u'TERRACE': u'TER', u'TRAIL': u'TRL', u'WEST': u'W', u'APARTMENT': u'APT', u'SUITE': u'STE', u'UNIT': u'UNIT'
+}
+
+_ADDRESS_SEPARATORS = re.compile(r'[^0-9A-Z]+')
+_ZIP = re.compile(r'^(\d{5})(?:\.0|-\d{4})?$')
+
+def address_key(address):
+    '''Address upper cased, without punctuation and with its words abbreviated, or None for an empty or non text address.'''
+    if not isinstance(address, basestring):
+        return None
+    words = _ADDRESS_SEPARATORS.split(address.upper())
+    return u' '.join(__ADDRESS_ABBREVIATIONS__.get(word, word) for word in words if word) or None
+
+def zip_code(value):
+    '''5-digit ZIP code of a cell, read as a number or as text, or None for a cell that is not one.'''
+    if isinstance(value, float):
+        return '%05d' % value if value == int(value) and 0 <= value < 100000 else None
+    if not isinstance(value, basestring):
+        return None
+    match = _ZIP.match(value.strip())
+    return match.group(1) if match else None
+
+def state_code(value):
+    '''Code of the state of a cell, by its code or full name, or None for no state of the ZIP table.'''
+    if not isinstance(value, basestring):
+        return None
+    state = value.strip().upper()
+    state = __STATE_NAMES__.get(state, state)
+    return state if state in zip_states.__STATES__ else None
+
+class CrossRowRules(object): # pylint: disable=too-few-public-methods
+    '''Checks rows against the rows checked before them. Each rule is left out for a tape without the columns it needs.
+
+    plan - the ValidationPlan of the tape's template, giving the first ADDRESS, ZIP_CODE and US_STATE columns.
+    row_offset, col_offset - added to the row and column of every problem, as check_columns does.
+    duplicates - whether to look for duplicate properties. Without, eg. for a sample of the rows, each row is checked on its own.
+    '''
+
+    def __init__(self, plan, row_offset=0, col_offset=0, duplicates=True):
+        columns = {}
+        for (column, _, _), column_type in reversed(zip(plan.columns, plan.column_types)):
+            columns[column_type] = column
+        self.address_column = columns.get(u'ADDRESS') if duplicates else None
+        self.zip_column = columns.get(u'ZIP_CODE')
+        self.state_column = columns.get(u'US_STATE')
+        self.row_offset = row_offset
+        self.col_offset = col_offset
+        # First row of every (address, ZIP code) property.
+        self.properties = {}
+
+    def _cell(self, cells, column): # pylint: disable=no-self-use
+        '''Value of a cell, u'' for a column the row is too short for or no such column.'''
+        return cells[column] if column is not None and column < len(cells) else u''
+
+    def check(self, row, cells):
+        '''((row, column), error) problems of one data row against the rows checked before it, then adds it to the indexes.'''
+        problems = []
+        excel_row = row + self.row_offset
+        zip_value = zip_code(self._cell(cells, self.zip_column))
+        address = address_key(self._cell(cells, self.address_column))
+        if address is not None and zip_value is not None:
+            first = self.properties.setdefault((address, zip_value), excel_row)
+            if first != excel_row:
+                problems.append(((excel_row, self.address_column + self.col_offset), 'Duplicate property of row %d.' % first))
+        state = state_code(self._cell(cells, self.state_column))
+        if state is not None and zip_value is not None:
+            zip_state = zip_states.zip_state(zip_value)
+            if zip_state is not None and zip_state != state:
+                problems.append(((excel_row, self.zip_column + self.col_offset), 'ZIP code %s is in %s, not %s.' % (zip_value, zip_state, state)))
+        return problems
+
+def merge(problems, cross_row_problems):
+    '''Problems of both lists in row order, the cross row problems of a row after its other problems. Both lists are in row order.'''
+    return sorted(problems + cross_row_problems, key=lambda problem: problem[0][0])
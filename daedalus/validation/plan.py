@@ -0,0 +1,53 @@
+# pylint: disable=protected-access
+'''Per-column validation plans compiled from the Map sheet of a tape template.'''
+
+import copy
+import daedalus.config
+
+from daedalus.common.lru_cache import LRUCache
+from daedalus.validation import validation
+
+# Validator of every column type a Map sheet can name, with regexes compiled and ranges and precisions bound once here.
+__COLUMN_VALIDATORS__ = {
+    u'ADDRESS': validation.regex_validator(validation._ADDRESS_REGEX), # Address
+    u'CITY': validation.regex_validator(validation._CITY_REGEX), # City
+    u'CLASS_OF_SPACE': validation.valid_class_of_space, # Class of Space
+    u'COUNTY': validation.regex_validator(validation._COUNTY_REGEX), # County
+    u'DATE': validation.valid_date, # Renovation Date
+    u'DOLLAR': validation.dollar_validator(None), # Acquisition Price
+    u'ESTIMATE_SOURCE': validation.valid_estimate_source, # Owner Estimate Source
+    u'FLOAT': validation.float_validator(None, None, None), # Baths
+    u'INTEGER': validation.integer_validator(None, None), # #
+    u'LEASING_STATUS': validation.valid_leasing_status, # Lease Status
+    u'PERCENTAGE': validation.percentage_validator(None), # Management Fee
+    u'US_STATE': validation.valid_us_state, # State
+    u'YEAR': validation.regex_validator(validation._YEAR_REGEX), # Year Built
+    u'ZIP_CODE': validation.regex_validator(validation._ZIP_REGEX) # Zip Code
+}
+
+# Compiled plans by the contents of their Map sheet, so tapes of the same template skip compiling it again.
+__PLAN_CACHE__ = LRUCache(daedalus.config.VALIDATION_PLAN_CACHE_SIZE)
+
+def template_key(map_rows):
+    '''Hashable key of a Map sheet, equal for tapes of the same template.'''
+    return tuple(tuple(row) for row in map_rows)
+
+class ValidationPlan(object): # pylint: disable=too-few-public-methods
+    '''Validation of a tape template: its layout metadata and, for every data column, where it is, its validator and whether it is required.'''
+
+    def __init__(self, metadata, column_types, required):
+        '''Binds a validator to each column type. Raises KeyError for a type without a validator.'''
+        self.metadata = metadata
+        self.column_types = list(column_types)
+        self.validators = [__COLUMN_VALIDATORS__[column_type] for column_type in column_types]
+        self.mandatory_fields = [bool(flag) for flag in required]
+        # (row index of the cell, validator, required) of each data column.
+        self.columns = [(metadata['base_column'] + index, validator, mandatory)
+                        for index, (validator, mandatory) in enumerate(zip(self.validators, self.mandatory_fields))]
+
+    def bind(self, validators):
+        '''Copy of the plan with the validators of some columns replaced, by their order, eg. with validators that learn from a tape.'''
+        plan = copy.copy(self)
+        plan.validators = [validators.get(order, validator) for order, validator in enumerate(self.validators)]
+        plan.columns = [(column, plan.validators[order], mandatory) for order, (column, _, mandatory) in enumerate(self.columns)]
+        return plan
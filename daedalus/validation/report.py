@@ -0,0 +1,64 @@
+'''Problems found in a tape indexed by row, and the JSON report made of them.'''
+
+import collections
+import json
+
+# Problems not made by a column's validator, counted under these names.
+__NUMBERING__ = 'NUMBERING'
+__REQUIRED__ = 'REQUIRED'
+
+class ProblemIndex(object):
+    '''((row, column), error) problems of a tape, indexed by row as they are added. Iterates over them in the order they were added.'''
+
+    def __init__(self, problems=()):
+        self._problems = []
+        # (column, error) problems by row, the rows in the order their first problem was added.
+        self.rows = collections.OrderedDict()
+        self.extend(problems)
+
+    def add(self, cell, error):
+        '''Adds the problem of a (row, column) cell.'''
+        self._problems.append((cell, error))
+        row, column = cell
+        self.rows.setdefault(row, []).append((column, error))
+
+    def extend(self, problems):
+        '''Adds ((row, column), error) problems.'''
+        for cell, error in problems:
+            self.add(cell, error)
+
+    def __iter__(self):
+        return iter(self._problems)
+
+    def __len__(self):
+        return len(self._problems)
+
+    def comments(self):
+        '''Comment of every row with problems, eg. '3: Invalid date.; 7: Required cell is empty.', by row.'''
+        return collections.OrderedDict((row, '; '.join('%d: %s' % problem for problem in problems)) for row, problems in self.rows.items())
+
+    def counts(self, column_types):
+        '''Number of problems by the type of the column they are in, the numbering and the required cells counted apart.
+
+        column_types - column type by column, as the problems number them.
+        '''
+        counts = collections.Counter()
+        for (_, column), error in self._problems:
+            if error == 'Invalid numbering.':
+                counts[__NUMBERING__] += 1
+            elif error == 'Required cell is empty.':
+                counts[__REQUIRED__] += 1
+            else:
+                counts[column_types.get(column)] += 1
+        return dict(counts)
+
+def to_json(index, column_types, totals, date_formats=None, stopped=False):
+    '''Compact JSON report of a validated tape: its status, the [row, column, error] problems in the order they were found, the
+    problem counts by validator and the totals. stopped tells the validation stopped at its limit of problems, so there may be more.'''
+    return json.dumps({'status': 'Invalid' if index else 'Valid',
+                       'stopped': stopped,
+                       'error_rows': list(index.rows),
+                       'errors': [[row, column, error] for (row, column), error in index],
+                       'error_counts': index.counts(column_types),
+                       'totals': totals,
+                       'date_formats': date_formats or {}}, separators=(',', ':'), sort_keys=True)
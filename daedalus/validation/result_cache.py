@@ -0,0 +1,157 @@
+'''Outputs of validated tapes by a hash of their contents, so that tapes submitted again are answered without validating them again.
+
+Entries are kept in memory and, with VALIDATION_RESULT_CACHE_DIR set, in files of that directory too, so they outlive the worker.
+Both tiers are bounded by the bytes they hold and evict the least recently used entries first.
+'''
+
+import hashlib
+import marshal
+import os
+import tempfile
+
+import daedalus.config
+import daedalus.version
+
+from daedalus.common.lru_cache import LRUCache
+
+# Bumped whenever the validation output of a tape changes, eg. with a new rule, so that outputs cached before are not served.
+__RULES_VERSION__ = 2
+
+def result_key(data, output_format='excel', max_errors=None):
+    '''Key of the validation output of a tape: a hash of its bytes, the validator version, the output format and the error limit.'''
+    digest = hashlib.sha1('%s\0%d\0%s\0%s\0' % (daedalus.version.__version__, __RULES_VERSION__, output_format, max_errors))
+    digest.update(data)
+    return digest.hexdigest()
+
+class DiskCache(object):
+    '''Files of a directory as a cache holding at most max_bytes, evicting the least recently used files first.
+
+    Reads touch the modification time of a file, which orders the files for eviction. Files are written aside and renamed in place,
+    so workers sharing the directory never read a partly written entry.
+    '''
+
+    # Fraction of max_bytes evictions go down to, so that a full cache does not list the directory on every write.
+    _LOW_WATERMARK = 0.75
+
+    def __init__(self, directory, max_bytes):
+        assert max_bytes > 0
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # Bytes of the files, counted on the first write, which creates the directory.
+        self.total_bytes = None
+
+    def _open(self):
+        '''Creates the directory when missing and counts the bytes of the files already there.'''
+        try:
+            os.makedirs(self.directory)
+        except OSError:
+            if not os.path.isdir(self.directory):
+                raise
+        self.total_bytes = sum(size for _, size, _ in self._files())
+
+    def _files(self):
+        '''(modification time, size, path) of every entry, written aside files left out.'''
+        files = []
+        if not os.path.isdir(self.directory):
+            return files
+        for name in os.listdir(self.directory):
+            if name.startswith('.'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+        return files
+
+    def get(self, key, default=None):
+        '''Returns the cached bytes and marks them as most recently used.'''
+        path = os.path.join(self.directory, key)
+        try:
+            with open(path, 'rb') as entry:
+                value = entry.read()
+        except IOError:
+            return default
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        '''Caches bytes, evicting the least recently used files once past max_bytes.'''
+        if self.total_bytes is None:
+            self._open()
+        path = os.path.join(self.directory, key)
+        try:
+            replaced = os.path.getsize(path)
+        except OSError:
+            replaced = 0
+        handle, temporary_path = tempfile.mkstemp(dir=self.directory, prefix='.')
+        with os.fdopen(handle, 'wb') as entry:
+            entry.write(value)
+        os.rename(temporary_path, path)
+        self.total_bytes += len(value) - replaced
+        if self.total_bytes > self.max_bytes:
+            self._evict()
+
+    def _evict(self):
+        '''Removes the least recently used files down to the low watermark. Sizes are read again, as other workers write too.'''
+        files = sorted(self._files())
+        self.total_bytes = sum(size for _, size, _ in files)
+        for _, size, path in files:
+            if self.total_bytes <= self.max_bytes * self._LOW_WATERMARK:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            self.total_bytes -= size
+
+    def clear(self):
+        '''Removes every cached file.'''
+        for _, _, path in self._files():
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        if self.total_bytes is not None:
+            self.total_bytes = 0
+
+class ResultCache(object):
+    '''Validation outputs and summaries by result_key, in memory and on disk when given a directory. A tier of 0 bytes is disabled.'''
+
+    def __init__(self, max_bytes, directory=None, disk_max_bytes=None):
+        self.memory = LRUCache(None, max_bytes) if max_bytes else None
+        self.disk = DiskCache(directory, disk_max_bytes) if directory and disk_max_bytes else None
+
+    def get(self, key):
+        '''Returns the (output, summary) cached for the key, or None. Entries found on disk are kept in memory from then on.'''
+        entry = self.memory.get(key) if self.memory is not None else None
+        if entry is None and self.disk is not None:
+            entry = self.disk.get(key)
+            if entry is not None and self.memory is not None:
+                self.memory.put(key, entry)
+        return None if entry is None else marshal.loads(entry)
+
+    def put(self, key, output, summary):
+        '''Caches the output of a validation and the summary it filled in.'''
+        if self.memory is None and self.disk is None:
+            return
+        entry = marshal.dumps((output, summary))
+        if self.memory is not None:
+            self.memory.put(key, entry)
+        if self.disk is not None:
+            self.disk.put(key, entry)
+
+    def clear(self):
+        '''Drops every cached output, on disk too.'''
+        if self.memory is not None:
+            self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+# Outputs of the tapes validated by this worker, and by the others sharing the cache directory.
+__RESULTS__ = ResultCache(daedalus.config.VALIDATION_RESULT_CACHE_BYTES, daedalus.config.VALIDATION_RESULT_CACHE_DIR,
+                          daedalus.config.VALIDATION_RESULT_CACHE_DISK_BYTES)
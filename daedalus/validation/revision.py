@@ -0,0 +1,75 @@
+'''Results of the last validated version of each tape, so that revised tapes only have their changed rows validated again.'''
+
+import hashlib
+import marshal
+
+import daedalus.config
+
+from daedalus.common.lru_cache import LRUCache
+
+# Last validated revision of every tape by the identifier its callers give it.
+__REVISIONS__ = LRUCache(daedalus.config.VALIDATION_REVISION_CACHE_SIZE)
+
+def row_hash(cells):
+    '''Content hash of a data row, blind to trailing empty cells. marshal tells 1 from 1.0 and is several times faster than repr.'''
+    end = len(cells)
+    while end and cells[end - 1] == u'':
+        end -= 1
+    return hashlib.sha1(marshal.dumps(cells[:end])).digest()
+
+class Revision(object):
+    '''One validated version of a tape: the hash of each of its data rows and, by hash, the problems and counts of that row.
+
+    Rows are keyed by content rather than position, so rows that moved, eg. after an insertion, are not validated again. Their
+    numbering is, being cheap and the one check that depends on position.
+    '''
+
+    def __init__(self, template):
+        self.template = template
+        self.hashes = []
+        # (cell problems as (column, error), unit count, leased count) by row hash. None counts are invalid cells.
+        self.results = {}
+        self.unit_count = 0
+        self.unit_errors = 0
+        self.leased_count = 0
+        self.leased_errors = 0
+
+    def _count(self, result, sign):
+        '''Adds the counts of a row's result to the totals, or takes them off with a sign of -1.'''
+        _, unit_count, leased_count = result
+        if unit_count is None:
+            self.unit_errors += sign
+        else:
+            self.unit_count += sign * unit_count
+        if leased_count is None:
+            self.leased_errors += sign
+        else:
+            self.leased_count += sign * leased_count
+
+    def update(self, hashes, results):
+        '''Moves on to a new version of the tape, given the hashes of its rows and the results of the rows not in this one.
+
+        The totals are only adjusted for the positions whose row changed. Results of rows no longer in the tape are dropped.
+        '''
+        previous = self.results
+        self.results = dict(previous)
+        self.results.update(results)
+        for position in range(max(len(self.hashes), len(hashes))):
+            old = self.hashes[position] if position < len(self.hashes) else None
+            new = hashes[position] if position < len(hashes) else None
+            if old == new:
+                continue
+            if old is not None:
+                self._count(previous[old], -1)
+            if new is not None:
+                self._count(self.results[new], 1)
+        self.hashes = hashes
+        current = set(hashes)
+        if len(self.results) > len(current):
+            self.results = dict((row, self.results[row]) for row in current)
+
+    def totals(self):
+        '''Property, unit and leased counts of the current version, None for counts with invalid cells.'''
+        return {'property_count': len(self.hashes),
+                'unit_count': None if self.unit_errors else self.unit_count,
+                'leased_count': None if self.leased_errors else self.leased_count}
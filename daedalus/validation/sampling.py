@@ -0,0 +1,69 @@
+'''Estimates of how much of a tape is invalid from a random sample of its rows, eg. as a quick check before validating it whole.'''
+
+import json
+import math
+import random
+
+# Two-sided standard normal quantiles of the confidence levels estimates can be made at.
+__Z_SCORES__ = {0.8: 1.2816, 0.9: 1.6449, 0.95: 1.9600, 0.98: 2.3263, 0.99: 2.5758}
+
+def sample_rows(rows, base_row, size, seed=None):
+    '''Uniform random sample of size data rows, all of them for shorter tapes. Returns the (row, cells) sampled, in row order, and the
+    number of data rows.
+
+    rows - all rows of the tape sheet, the data starting at base_row. A list is sampled by position, any other iterable is gone over
+    once with reservoir sampling, so rows read off the document one at a time are not held in memory.
+    '''
+    assert size > 0
+    generator = random.Random(seed)
+    if isinstance(rows, list):
+        data_rows = max(len(rows) - base_row, 0)
+        positions = sorted(generator.sample(xrange(data_rows), min(size, data_rows)))
+        return [(base_row + position, rows[base_row + position]) for position in positions], data_rows
+    reservoir, data_rows = [], 0
+    for row, cells in enumerate(rows):
+        if row < base_row:
+            continue
+        if data_rows < size:
+            reservoir.append((row, cells))
+        else:
+            slot = generator.randint(0, data_rows)
+            if slot < size:
+                reservoir[slot] = (row, cells)
+        data_rows += 1
+    return sorted(reservoir), data_rows
+
+def wilson_interval(successes, trials, population, confidence=0.95):
+    '''(lower, upper) bounds of a proportion from successes out of trials drawn without replacement from population.
+
+    Wilson score interval, which stays within 0-1 and is sound for the small proportions of a mostly valid tape, with the finite
+    population correction so that a sample of the whole tape gives the exact proportion.
+    '''
+    assert confidence in __Z_SCORES__
+    if trials == 0:
+        return 0.0, 1.0
+    proportion = float(successes) / trials
+    correction = float(population - trials) / (population - 1) if population > 1 else 0.0
+    z_squared = __Z_SCORES__[confidence] ** 2 * correction
+    center = (proportion + z_squared / (2 * trials)) / (1 + z_squared / trials)
+    half_width = math.sqrt(z_squared * (proportion * (1 - proportion) / trials + z_squared / (4 * trials ** 2))) / (1 + z_squared / trials)
+    return max(0.0, center - half_width), min(1.0, center + half_width)
+
+def to_json(index, column_types, sampled_rows, data_rows, confidence=0.95, date_formats=None): # pylint: disable=too-many-arguments
+    '''Compact JSON estimate of a tape's validity from the problems of a sample of its rows: the share of invalid rows and their
+    number with their bounds at the confidence level, the problems of the sample and their counts by validator as in report.to_json.'''
+    invalid_rows = len(index.rows)
+    lower, upper = wilson_interval(invalid_rows, sampled_rows, data_rows, confidence)
+    rate = float(invalid_rows) / sampled_rows if sampled_rows else 0.0
+    # Rounded first, so that float noise on exact bounds does not add a row.
+    lower_rows, upper_rows = round(lower * data_rows, 6), round(upper * data_rows, 6)
+    return json.dumps({'status': 'Invalid' if index else 'Valid',
+                       'sampled_rows': sampled_rows,
+                       'data_rows': data_rows,
+                       'confidence': confidence,
+                       'row_error_rate': {'estimate': rate, 'lower': lower, 'upper': upper},
+                       'error_rows': {'estimate': int(round(rate * data_rows)), 'lower': int(math.floor(lower_rows)),
+                                      'upper': int(math.ceil(upper_rows))},
+                       'errors': [[row, column, error] for (row, column), error in index],
+                       'error_counts': index.counts(column_types),
+                       'date_formats': date_formats or {}}, separators=(',', ':'), sort_keys=True)
@@ -1,8 +1,15 @@
 '''Service for handling tape validation jobs.'''
 
+import daedalus.common.mimetype
 import daedalus.common.service
+import daedalus.config
+import daedalus.exceptions
 import daedalus.queueing.mixins
 import daedalus.validation
+import json
+
+from daedalus.common import log_manager
+from daedalus.validation import result_cache
 
 class ValidationConsumer(daedalus.queueing.mixins.ConsumerMixin):
     '''Answers jobs on the validation queue.'''
@@ -11,7 +18,64 @@ class ValidationConsumer(daedalus.queueing.mixins.ConsumerMixin):
 
     def process_task(self, request, response):
         incoming_file = request.body
-        response.body = daedalus.validation.validate(incoming_file)
+        summary = {}
+        options = {'summary': summary}
+        # Revised tapes carry the identifier of their first version, so only their changed rows are validated again.
+        if request.get_header('tape_id') is not None:
+            options['tape_id'] = request.get_header('tape_id')
+        # Integrators needing only the errors ask for the JSON report rather than the marked up document.
+        if request.get_header('output_format') is not None:
+            options['output_format'] = request.get_header('output_format')
+        # Hopeless tapes, eg. of the wrong template, are given up on after that many errors.
+        if request.get_header('max_errors') is not None:
+            options['max_errors'] = _max_errors(request.get_header('max_errors'))
+        # Tapes submitted again, eg. re-uploads or retries, are answered with the output of their first validation. Samples are drawn
+        # at random, so they are not.
+        key = None
+        if options.get('output_format') != 'sample':
+            key = result_cache.result_key(incoming_file, options.get('output_format', 'excel'),
+                                          options.get('max_errors', daedalus.config.VALIDATION_MAX_ERRORS))
+        cached = _cached_result(key)
+        if cached is not None:
+            log_manager.info('Tape validated before, answering with the cached output.')
+            response.body, summary = cached
+        else:
+            response.body = daedalus.validation.validate(incoming_file, **options)
+            _cache_result(key, response.body, summary)
+        # Reports and samples are JSON rather than the marked up document.
+        if options.get('output_format') in ['report', 'sample']:
+            response.set_header('content_type', daedalus.common.mimetype.simple_to_mimetype('json'))
+        if summary.get('date_formats'):
+            response.set_header('date_formats', json.dumps(summary['date_formats'], sort_keys=True))
+
+def _max_errors(header):
+    '''Error limit of the max_errors header, a whole number of 0 or more. Raises BadHeader for anything else.'''
+    try:
+        max_errors = int(header)
+    except (TypeError, ValueError):
+        max_errors = -1
+    if max_errors < 0:
+        raise daedalus.exceptions.BadHeader('max_errors must be a whole number of 0 or more, not %r.' % header)
+    return max_errors
+
+def _cached_result(key):
+    '''Cached (output, summary) of a result key, None for none or when the cache can't be read. A None key is never cached.'''
+    if key is None:
+        return None
+    try:
+        return result_cache.__RESULTS__.get(key)
+    except (IOError, OSError) as error:
+        log_manager.warn('Could not read the validation result cache: %s' % error)
+        return None
+
+def _cache_result(key, output, summary):
+    '''Caches the output of a validation, unless its key is None. A cache that can't be written, eg. on a full disk, is skipped.'''
+    if key is None:
+        return
+    try:
+        result_cache.__RESULTS__.put(key, output, summary)
+    except (IOError, OSError) as error:
+        log_manager.warn('Could not write the validation result cache: %s' % error)
 
 def main():
     '''Starts the daemon that is responsible for listening to rabbitmq.'''
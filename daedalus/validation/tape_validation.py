@@ -3,53 +3,86 @@
 import sys
 import re
 import string
-import json
 import StringIO
 
 from xlutils.copy import copy
-from xlrd import open_workbook
-from xlwt import easyxf
+from xlwt import Style, easyxf
 
-from daedalus.common import log_manager
-from daedalus.xlstransform.transforms import excel_to_json
-from daedalus.validation.validation import valid_date, valid_percentage, valid_dollar, valid_year, valid_address, valid_city, valid_county, valid_zip_code,\
-                                           valid_us_state, valid_estimate_source, valid_leasing_status, valid_class_of_space, valid_integer, valid_float
+import daedalus.config
+import daedalus.exceptions
+
+from daedalus.common import log_manager, timing
+from daedalus.validation import columnar, cross_row, report, revision, sampling, validation, plan as validation_plan
+from daedalus.xlstransform import xlsx_patch
+from daedalus.xlstransform.workbook import StreamingWorkbook, Workbook, is_xlsx
 
 class TapeValidation(object): # pylint: disable=too-few-public-methods
     '''Tape validation class. Initialize using Excel document and use run() to validate.'''
 
     # Supported types of cell borders.
     _BG_RED, _BG_GREEN, _BD_RED, _BD_RIGHT_RED = range(4)
+    # The same styles written into xlsx documents in place, see xlsx_patch.
+    _XLSX_STYLES = {
+        _BG_RED: {'fill': 'FFFF0000', 'font_colour': 'FFFFFFFF'},
+        _BG_GREEN: {'fill': 'FF008000', 'font_colour': 'FFFFFFFF'},
+        _BD_RED: {'borders': [('left', 'thin', 'FFFF0000'), ('right', 'thin', 'FFFF0000'), ('top', 'thin', 'FFFF0000'),
+                              ('bottom', 'thin', 'FFFF0000')]},
+        _BD_RIGHT_RED: {'borders': [('right', 'thick', 'FFFF0000')]}
+    }
     # Offset between Excel row numbering and JSON data. 1 for deleted 1st row in excel_to_json and 1 for 0-based numbering.
     _EXCEL_ROW_OFFSET = 2
     # Offset between Excel col numbering and JSON data. 1 for 0-based numbering.
     # TODO: keep this 0 for now, before breaking all other tests. Change to 1 before finishing write_to_excel. # pylint: disable=fixme
     _EXCEL_COL_OFFSET = 0
-    # Mapping between Excel values and validator functions.
-    _VALIDATOR_MAP = {
-        u'ADDRESS': valid_address, # Address
-        u'CITY': valid_city, # City
-        u'CLASS_OF_SPACE': valid_class_of_space, # Class of Space
-        u'COUNTY': valid_county, # County
-        u'DATE': valid_date, # Renovation Date
-        u'DOLLAR': valid_dollar, # Acquisition Price
-        u'ESTIMATE_SOURCE': valid_estimate_source, # Owner Estimate Source
-        u'FLOAT': valid_float, # Baths
-        u'INTEGER': valid_integer, # #
-        u'LEASING_STATUS': valid_leasing_status, # Lease Status
-        u'PERCENTAGE': valid_percentage, # Management Fee
-        u'US_STATE': valid_us_state, # State
-        u'YEAR': valid_year, # Year Built
-        u'ZIP_CODE': valid_zip_code # Zip Code
-    }
+    # Type check engines: cell by cell, column at a time with NumPy masks, or cell by cell as xlsx rows are read off the document.
+    _ENGINES = ['rows', 'columnar', 'streaming']
+    # Outputs of a validation: the document with its problems marked, a JSON report of them, or a JSON estimate of them from a sample.
+    _OUTPUT_FORMATS = ['excel', 'report', 'sample']
+    # Rows the columnar engine checks at a time when stopping at max_errors.
+    _FAIL_FAST_BLOCK = 1000
+    # Totals of a validation stopped at max_errors, which did not go over every row.
+    _NOT_COUNTED = 'Not counted, validation stopped.'
+
+    def __init__(self, input_doc, engine='columnar', processes=None, chunk_size=None, tape_id=None, max_errors=None): # pylint: disable=too-many-arguments
+        '''Add variables for document as Excel and dict. The document is parsed once, its workbook model serves the metadata, the type
+        checks, the counts and the output.
 
-    def __init__(self, input_doc):
-        '''Add variables for document as Excel and dict.'''
+        The columnar engine checks tapes longer than chunk_size rows in chunks across processes workers, both read from the config by
+        default. The streaming engine does not load the rows of xlsx tapes, it checks and counts them one at a time.
+
+        tape_id - identifier of the tape across its revisions. When given, only the rows that changed since the last revision
+        validated with the same identifier are validated again.
+        max_errors - number of problems the type checks stop at, eg. for tapes of the wrong template. 0 for no limit. Read from the
+        config by default.
+        '''
+        if engine not in self._ENGINES:
+            raise daedalus.exceptions.UnknownEngine('No such validation engine: %r' % engine)
+        self.engine = engine
+        self.processes = daedalus.config.VALIDATION_PROCESSES if processes is None else processes
+        self.chunk_size = daedalus.config.VALIDATION_CHUNK_SIZE if chunk_size is None else chunk_size
         self.input_excel = input_doc
-        self.input_dict = json.loads(excel_to_json(self.input_excel))['sheets'][0]['rows']
+        self.tape_id = tape_id
+        self.max_errors = daedalus.config.VALIDATION_MAX_ERRORS if max_errors is None else max_errors
+        # Whether the type checks stopped at max_errors.
+        self.stopped = False
+        if engine == 'streaming' and is_xlsx(input_doc):
+            self.workbook = StreamingWorkbook(input_doc)
+            self.input_dict = None
+        else:
+            # xls tapes can't be streamed, the streaming engine checks them row by row all the same once read whole. The rows are read
+            # without styles, with which xlrd counts the blank rows that only carry formatting too.
+            self.workbook = Workbook(input_doc)
+            self.input_dict = self.workbook.rows(0)
         self.metadata = {}
         self.validators = []
         self.mandatory_fields = []
+        self.plan = None
+        # Rules across the rows, checked as the rows are.
+        self.rules = None
+        self.template = None
+        self.date_columns = {}
+        # Property, unit and leased counts, when the type checks made them on the way.
+        self.totals = None
 
     def _get_excel_tuple(self, excel_string): # pylint: disable=no-self-use
         '''Extract coordinate 0-based tuple from Excel numbering.'''
@@ -64,62 +97,84 @@ class TapeValidation(object): # pylint: disable=too-few-public-methods
         return ret
 
     def _read_excel_metadata(self):
-        '''Reads the metadata from the 'Map' sheet and saves it as dict. Also creates validators dict.'''
-        # Reinitialise vars.
-        self.metadata = {}
-        self.validators = []
-        self.mandatory_fields = []
+        '''Reads the metadata from the 'Map' sheet and saves it as dict. Also creates validators dict.
+
+        The validation plan compiled from the Map sheet is reused for every tape of the same template.
+        '''
         # Find the sheet called 'Map'
-        input_json = json.loads(excel_to_json(self.input_excel))
-        input_hidden_dict = []
-        for sheet in input_json['sheets']:
-            if sheet['name'] == u'Map':
-                input_hidden_dict = sheet['rows']
-                break
+        with timing.stage('read_metadata'):
+            input_hidden_dict = self.workbook.rows(u'Map')
+        self.template = validation_plan.template_key(input_hidden_dict)
+        plan = validation_plan.__PLAN_CACHE__.get(self.template)
+        if plan is None:
+            plan = self._compile_plan(input_hidden_dict)
+            validation_plan.__PLAN_CACHE__.put(self.template, plan)
+        self.plan = self._bind_date_columns(plan)
+        self.metadata = dict(self.plan.metadata)
+        self.validators = self.plan.validators
+        self.mandatory_fields = self.plan.mandatory_fields
+        self.rules = cross_row.CrossRowRules(self.plan, self._EXCEL_ROW_OFFSET, self._EXCEL_COL_OFFSET)
+
+    def _bind_date_columns(self, plan):
+        '''Plan of this tape, its date columns checked by validators inferring their format. The formats are sampled from the rows
+        when they are at hand, while validating otherwise.'''
+        self.date_columns = {}
+        date_validators = {}
+        for order, column_type in enumerate(plan.column_types):
+            if column_type != u'DATE':
+                continue
+            column = plan.columns[order][0]
+            date_validators[order] = validation.DateColumn()
+            if self.input_dict is not None:
+                date_validators[order].sample(cells[column] for cells in self.input_dict[plan.metadata['base_row']:] if column < len(cells))
+            self.date_columns[column + self._EXCEL_COL_OFFSET] = date_validators[order]
+        return plan.bind(date_validators)
+
+    def date_formats(self):
+        '''Format inferred for the text dates of every date column that has any, by column.'''
+        formats = {}
+        for column, date_column in self.date_columns.items():
+            date_column.settle()
+            if date_column.format is not None:
+                formats[column] = date_column.format
+        return formats
+
+    def _compile_plan(self, input_hidden_dict):
+        '''Compiles the validation plan of the rows of a 'Map' sheet.'''
+        metadata = {}
+        column_types = []
+        required = []
         try:
             # Row where the actual data start (eg. after data examples). 1st row is empty and is skipped in JSON.
-            self.metadata['base_row'] = int(input_hidden_dict[0][2]) - self._EXCEL_ROW_OFFSET
+            metadata['base_row'] = int(input_hidden_dict[0][2]) - self._EXCEL_ROW_OFFSET
             # Column where actual data start (eg. offset by 'Example Single Unit').
-            self.metadata['base_column'] = string.ascii_uppercase.index(input_hidden_dict[0][3])
+            metadata['base_column'] = string.ascii_uppercase.index(input_hidden_dict[0][3])
             # Column for validator error comments.
-            self.metadata['comment_column'] = string.ascii_uppercase.index(input_hidden_dict[0][4])
+            metadata['comment_column'] = string.ascii_uppercase.index(input_hidden_dict[0][4])
             # Position of unit count column.
-            self.metadata['unit_count_column'] = string.ascii_uppercase.index(input_hidden_dict[0][5])
+            metadata['unit_count_column'] = string.ascii_uppercase.index(input_hidden_dict[0][5])
             # Position of leased count column.
-            self.metadata['leased_count_column'] = string.ascii_uppercase.index(input_hidden_dict[0][6])
+            metadata['leased_count_column'] = string.ascii_uppercase.index(input_hidden_dict[0][6])
             # Position of numbering column.
-            self.metadata['identifier_column'] = string.ascii_uppercase.index(input_hidden_dict[0][7])
+            metadata['identifier_column'] = string.ascii_uppercase.index(input_hidden_dict[0][7])
             # Coordinates of the total property count cell.
-            self.metadata['property_count_field'] = self._get_excel_tuple(input_hidden_dict[0][8])
+            metadata['property_count_field'] = self._get_excel_tuple(input_hidden_dict[0][8])
             # Coordinates of the total unit count cell.
-            self.metadata['unit_count_field'] = self._get_excel_tuple(input_hidden_dict[0][9])
+            metadata['unit_count_field'] = self._get_excel_tuple(input_hidden_dict[0][9])
             # Coordinates of the total leased count cell.
-            self.metadata['leased_count_field'] = self._get_excel_tuple(input_hidden_dict[0][10])
+            metadata['leased_count_field'] = self._get_excel_tuple(input_hidden_dict[0][10])
             # Coordinates of the total corporate debt cell.
-            self.metadata['corporate_debt_field'] = self._get_excel_tuple(input_hidden_dict[0][11])
+            metadata['corporate_debt_field'] = self._get_excel_tuple(input_hidden_dict[0][11])
             # Coordinates of the status field.
-            self.metadata['status_field'] = self._get_excel_tuple(input_hidden_dict[0][12])
-            # Read data types for each column, set the validator function and whether it's mandatory.
+            metadata['status_field'] = self._get_excel_tuple(input_hidden_dict[0][12])
+            # Read data types for each column and whether it's mandatory.
             for i in range(0, len(input_hidden_dict)):
-                validator_id = input_hidden_dict[i][0]
-                self.validators.append(self._VALIDATOR_MAP[validator_id])
-                if input_hidden_dict[i][1]:
-                    self.mandatory_fields.append(True)
-                else:
-                    self.mandatory_fields.append(False)
+                column_types.append(input_hidden_dict[i][0])
+                required.append(input_hidden_dict[i][1])
         except (ValueError, IndexError):
             log_manager.info('Invalid Excel metadata. Aborting.')
             sys.exit(0)
-
-    def _required_field(self, field, column):
-        '''Check if a required field is not empty.'''
-        if field == u'':
-            if self.mandatory_fields[column]:
-                return (False, 'Required cell is empty.')
-            else:
-                # Empty optional cells use this special output.
-                return (False, None)
-        return (True, None)
+        return validation_plan.ValidationPlan(metadata, column_types, required)
 
     def _calculate_unit_count(self):
         '''Get total number of property units.'''
@@ -157,104 +212,330 @@ class TapeValidation(object): # pylint: disable=too-few-public-methods
         '''Perform type validation for relevant cells of the input Excel document. Return list of problems.'''
         # Extract field metadata from Excel document first.
         self._read_excel_metadata()
+        if self.tape_id is not None:
+            return self._cut_off(self._check_revision(), counted=True)
+        if self.engine == 'columnar' and self.max_errors:
+            return self._check_blocks()
+        if self.engine == 'columnar':
+            totals = {}
+            problems = columnar.check_columns_parallel(self.input_dict, self.plan, self.metadata['base_row'], self.metadata['identifier_column'],
+                                                       self._EXCEL_ROW_OFFSET, self._EXCEL_COL_OFFSET, self.processes, self.chunk_size,
+                                                       totals)
+            self.totals = self._reported_totals(totals)
+            return cross_row.merge(problems, self._cross_row_problems())
+        # The rows engine and the streaming one go over the rows in memory or off the document the same way.
+        return self._check_rows(self.workbook.iter_rows(0))
+
+    def _cut_off(self, problems, counted=False):
+        '''The first max_errors problems. Marks the validation as stopped when there are more, and its totals as not counted
+        unless the type checks counted every row all the same. The type checks stop past max_errors problems, so that a tape with
+        exactly as many is not taken for a stopped one.'''
+        if not self.max_errors or len(problems) <= self.max_errors:
+            return problems
+        self.stopped = True
+        if not counted:
+            self.totals = dict.fromkeys(['property_count', 'unit_count', 'leased_count'], self._NOT_COUNTED)
+        return problems[:self.max_errors]
+
+    def _check_blocks(self):
+        '''Columnar type validation of _FAIL_FAST_BLOCK rows at a time, up to the block where max_errors problems are passed.'''
+        base_row = self.metadata['base_row']
+        data_rows = max(len(self.input_dict) - base_row, 0)
+        problems, block_totals = [], []
+        for start in range(0, data_rows, self._FAIL_FAST_BLOCK):
+            stop = min(start + self._FAIL_FAST_BLOCK, data_rows)
+            block_totals.append({})
+            block_problems = columnar.check_columns(self.input_dict, self.plan, base_row, self.metadata['identifier_column'],
+                                                    self._EXCEL_ROW_OFFSET, self._EXCEL_COL_OFFSET, start, stop, totals=block_totals[-1])
+            problems.extend(cross_row.merge(block_problems, self._cross_row_problems(start, stop)))
+            if len(problems) > self.max_errors:
+                break
+        self.totals = self._reported_totals(columnar.merge_totals(block_totals))
+        return self._cut_off(problems)
+
+    def _cross_row_problems(self, start=0, stop=None):
+        '''Cross row problems of the data rows from start to stop, counted from base_row, all of them by default. The rows before
+        start must have been checked already.'''
+        base_row = self.metadata['base_row']
+        stop = len(self.input_dict) - base_row if stop is None else stop
+        problems = []
+        with timing.stage('cross_row'):
+            for row in xrange(base_row + start, base_row + stop):
+                problems.extend(self.rules.check(row, self.input_dict[row]))
+        return problems
+
+    def _misnumbered(self, row, cells):
+        '''Check for proper numbering in # field. Excel uses 1-based system.'''
+        try:
+            return int(cells[self.metadata['identifier_column']]) != row - self.metadata['base_row'] + 1
+        except ValueError:
+            return False
+
+    def _cell_problems(self, cells):
+        '''Type validation of the cells of one data row. Returns its (column, error) problems.'''
+        problems = []
+        for column, validate_func, mandatory in self.plan.columns:
+            data_cell = cells[column]
+            if data_cell == u'':
+                # Empty optional cells are fine, skip validation of empty cells.
+                if mandatory:
+                    problems.append((column, 'Required cell is empty.'))
+                continue
+            # Check if all records are of valid type.
+            result, error = validate_func(data_cell)
+            if not result:
+                problems.append((column, error))
+        return problems
+
+    def _check_row(self, row, cells, problems):
+        '''Type validation of one data row, adds its problems to the list.'''
+        excel_row = row + self._EXCEL_ROW_OFFSET
+        if self._misnumbered(row, cells):
+            problems.append(((excel_row, self.metadata['identifier_column']), 'Invalid numbering.'))
+        for column, error in self._cell_problems(cells):
+            problems.append(((excel_row, column + self._EXCEL_COL_OFFSET), error))
+        problems.extend(self.rules.check(row, cells))
+
+    def _row_counts(self, cells):
+        '''Units and leased units of one data row, each None when its cell is invalid as _calculate_* see it.'''
+        unit = cells[self.metadata['unit_count_column']] if self.metadata['unit_count_column'] < len(cells) else u''
+        leased = cells[self.metadata['leased_count_column']] if self.metadata['leased_count_column'] < len(cells) else u''
+        unit_count = int(unit) if isinstance(unit, (float, int)) else None
+        if leased == u'':
+            leased_count = None
+        else:
+            leased_count = int(isinstance(leased, basestring) and leased.upper() in columnar.__LEASED_STATUSES__)
+        return unit_count, leased_count
+
+    def _reported_totals(self, totals): # pylint: disable=no-self-use
+        '''Totals as written to the document, with the errors of the _calculate_* methods for the counts of invalid cells.'''
+        return {'property_count': totals['property_count'],
+                'unit_count': 'Error in unit fields.' if totals['unit_count'] is None else totals['unit_count'],
+                'leased_count': 'Error in leased fields.' if totals['leased_count'] is None else totals['leased_count']}
+
+    def _check_rows(self, rows):
+        '''Type validation of the rows one at a time, in a single pass that also counts the properties, units and leased units the
+        same as the _calculate_* methods. Keeps nothing of the rows, so they can be read off the document as they come.'''
         problems = []
-        # Check all cell fields for validity. Iterate from start of actual data.
-        for row in range(self.metadata['base_row'], len(self.input_dict)):
-            # Check for proper numbering in # field. Excel uses 1-based system.
-            try:
-                if int(self.input_dict[row][self.metadata['identifier_column']]) != row - self.metadata['base_row'] + 1:
-                    problems.append(((row + self._EXCEL_ROW_OFFSET, self.metadata['identifier_column']), 'Invalid numbering.'))
-            except ValueError:
-                pass
-            for col in range(0, len(self.validators)):
-                data_cell = self.input_dict[row][self.metadata['base_column'] + col]
-                result, error = self._required_field(data_cell, col)
-                if not result:
-                    if error:
-                        problems.append(((row + self._EXCEL_ROW_OFFSET, self.metadata['base_column'] + col + self._EXCEL_COL_OFFSET), error))
-                    # Skip validation of empty cells.
-                    continue
-                # Check if all records are of valid type.
-                validate_func = self.validators[col]
-                result, error = validate_func(data_cell)
-                if not result:
-                    problems.append(((row + self._EXCEL_ROW_OFFSET, self.metadata['base_column'] + col + self._EXCEL_COL_OFFSET), error))
+        property_count, unit_count, leased_count = 0, 0, 0
+        for row, cells in enumerate(rows):
+            if row < self.metadata['base_row']:
+                continue
+            self._check_row(row, cells, problems)
+            if self.max_errors and len(problems) > self.max_errors:
+                return self._cut_off(problems)
+            property_count += 1
+            row_units, row_leased = self._row_counts(cells)
+            unit_count = None if unit_count is None or row_units is None else unit_count + row_units
+            leased_count = None if leased_count is None or row_leased is None else leased_count + row_leased
+        self.totals = self._reported_totals({'property_count': property_count, 'unit_count': unit_count, 'leased_count': leased_count})
         return problems
 
+    def _check_revision(self):
+        '''Type validation of a revised tape, going over only the rows that changed since the last version validated under the same
+        tape_id. Counts are adjusted for the changed rows only. Returns the same problems as validating the whole tape.'''
+        base_row = self.metadata['base_row']
+        identifier_column = self.metadata['identifier_column']
+        tape = revision.__REVISIONS__.get(self.tape_id)
+        if tape is None or tape.template != self.template:
+            tape = revision.Revision(self.template)
+        hashes, misnumbered, changed, cross_row_problems = [], set(), {}, {}
+        for row, cells in enumerate(self.workbook.iter_rows(0)):
+            if row < base_row:
+                continue
+            row_hash = revision.row_hash(cells)
+            hashes.append(row_hash)
+            if self._misnumbered(row, cells):
+                misnumbered.add(row - base_row)
+            # Cross row rules depend on the other rows, so they are checked again on every revision.
+            cross_row_problems[row - base_row] = self.rules.check(row, cells)
+            if row_hash not in tape.results and row_hash not in changed:
+                changed[row_hash] = cells
+        with timing.stage('revalidate'):
+            results = self._changed_results(changed)
+        tape.update(hashes, results)
+        revision.__REVISIONS__.put(self.tape_id, tape)
+        self.totals = self._reported_totals(tape.totals())
+        log_manager.info('Revalidated %d of %d rows of tape %s.' % (len(changed), len(hashes), self.tape_id))
+
+        problems = []
+        for position, row_hash in enumerate(hashes):
+            excel_row = base_row + position + self._EXCEL_ROW_OFFSET
+            if position in misnumbered:
+                problems.append(((excel_row, identifier_column), 'Invalid numbering.'))
+            for column, error in tape.results[row_hash][0]:
+                problems.append(((excel_row, column + self._EXCEL_COL_OFFSET), error))
+            problems.extend(cross_row_problems[position])
+        return problems
+
+    def _changed_results(self, changed):
+        '''Revision results of the changed rows by hash, validated with the engine of this validation.'''
+        hashes = changed.keys()
+        rows = [changed[row_hash] for row_hash in hashes]
+        if self.engine == 'columnar' and rows:
+            cell_problems = [[] for _ in rows]
+            for (position, column), error in columnar.check_columns(rows, self.plan, 0, self.metadata['identifier_column'],
+                                                                    numbering=False):
+                cell_problems[position].append((column, error))
+        else:
+            cell_problems = [self._cell_problems(cells) for cells in rows]
+        return dict((row_hash, (problems,) + self._row_counts(cells)) for row_hash, problems, cells in zip(hashes, cell_problems, rows))
+
+    def _make_totals(self):
+        '''Counts the totals apart, unless the type checks counted them on the way.'''
+        if self.totals is None:
+            self.totals = {'property_count': self._calculate_property_count(), 'unit_count': self._calculate_unit_count(),
+                           'leased_count': self._calculate_leased_count()}
+
+    def _column_types(self):
+        '''Column type by column, as the problems number them.'''
+        return dict((column + self._EXCEL_COL_OFFSET, column_type)
+                    for (column, _, _), column_type in zip(self.plan.columns, self.plan.column_types))
+
+    def _report(self, index):
+        '''JSON report of the type validation errors, see report.to_json.'''
+        self._make_totals()
+        return report.to_json(index, self._column_types(), self.totals, self.date_formats(), self.stopped)
+
+    def sample(self, size=None, confidence=0.95, seed=None):
+        '''JSON estimate of the share of invalid rows of the tape from a uniform random sample of size data rows, read from the
+        config by default, see sampling.to_json. Only the rows sampled are type checked, each on its own: the duplicates of the
+        rows left out of the sample can't be told, so duplicate properties are not looked for.'''
+        size = daedalus.config.VALIDATION_SAMPLE_SIZE if size is None else size
+        self._read_excel_metadata()
+        self.rules = cross_row.CrossRowRules(self.plan, self._EXCEL_ROW_OFFSET, self._EXCEL_COL_OFFSET, duplicates=False)
+        rows = self.workbook.iter_rows(0) if self.input_dict is None else self.input_dict
+        sampled, data_rows = sampling.sample_rows(rows, self.metadata['base_row'], size, seed)
+        problems = []
+        for row, cells in sampled:
+            self._check_row(row, cells, problems)
+        return sampling.to_json(report.ProblemIndex(problems), self._column_types(), len(sampled), data_rows, confidence,
+                                self.date_formats())
+
     def _alter_document(self, problems):
         '''Transform the Excel document relative to type validation errors. Return the modified Excel document.'''
         cell_updates = []
-        error_rows = []
-        if problems:
-            for (row, col), error in problems:
+        index = problems if isinstance(problems, report.ProblemIndex) else report.ProblemIndex(problems)
+        if index:
+            # Problems give 1-based Excel rows, the document is written 0-based like the metadata fields.
+            for (row, col), error in index:
                 # First item in row gets right border.
-                cell_updates.append(((row, 0), None, self._BD_RIGHT_RED))
+                cell_updates.append(((row - 1, 0), None, self._BD_RIGHT_RED))
                 # Invalidated field gets full border.
-                cell_updates.append(((row, col), None, self._BD_RED))
-            # Iterate over unique rows from problems list.
-            for cur_row in list(set([row for (row, col), error in problems])):
-                row_problems = ['%d: %s' % (col, error) for ((row, col), error) in problems if row == cur_row]
-                if row_problems:
-                    # Add col and the error message to the comment field.
-                    cell_updates.append(((cur_row, self.metadata['comment_column']), '; '.join(row_problems), None))
-                    error_rows.append(cur_row)
+                cell_updates.append(((row - 1, col), None, self._BD_RED))
+            # Add col and the error message to the comment field of every row with problems.
+            for row, comment in index.comments().items():
+                cell_updates.append(((row - 1, self.metadata['comment_column']), comment, None))
             # Add row numbers of invalid cells to the status field and updated status field to red.
-            cell_updates.append((self.metadata['status_field'], ', '.join([str(x) for x in error_rows]), self._BG_RED))
+            status = ', '.join([str(x) for x in index.rows])
+            if self.stopped:
+                status += ' (validation stopped after %d errors)' % self.max_errors
+            cell_updates.append((self.metadata['status_field'], status, self._BG_RED))
         else:
             # Return the same document, only alter status field.
             cell_updates = [(self.metadata['status_field'], 'Valid', self._BG_GREEN)]
         # Add total counts.
-        cell_updates.append((self.metadata['property_count_field'], self._calculate_property_count(), None))
-        cells.append((self.metadata['unit_count_field'], self._calculate_unit_count(), None))
-        cells.append((self.metadata['leased_count_field'], self._calculate_leased_count(), None))
+        self._make_totals()
+        cell_updates.append((self.metadata['property_count_field'], self.totals['property_count'], None))
+        cell_updates.append((self.metadata['unit_count_field'], self.totals['unit_count'], None))
+        cell_updates.append((self.metadata['leased_count_field'], self.totals['leased_count'], None))
         # Transform the input document.
         output_data = self._write_to_excel(cell_updates)
         return output_data
 
     def _write_to_excel(self, alter_cells):
-        '''Given input Excel document, the cells and their styles to be altered, produce a new Excel document.'''
-        # Read-only copy to duplicate and get old values from.
-        rb = open_workbook(file_contents=self.input_excel, formatting_info=True)
-        r_sheet = rb.sheet_by_index(0)
-        # Writable copy (can't read values from this one).
-        wb = copy(rb)
-        w_sheet = wb.get_sheet(0)
-        # Save new cell styles.
-        for ((row, col), value, style) in alter_cells:
-            xfstyle = None
-            if style == _BG_RED:
-                xfstyle = xlwt.easyxf("background: pattern solid, color red; font: color white;")
-            elif style == _BG_GREEN:
-                xfstyle = xlwt.easyxf("background: pattern solid, color green; font: color white;")
-            elif style == _BD_RED:
-                xfstyle = xlwt.easyxf("border: pattern solid, color green, size 1px;")
-            elif style == _BD_RIGHT_RED:
-                xfstyle = xlwt.easyxf("border-right: pattern solid, color green, size 5px;")
-            # See if we need to set a value.
-            if value == None:
-                value = r_sheet.cell(row, col).value
-            w_sheet.write(row, col, value, xfstyle)
-        # Save the workbook to a stream object.
-        output_stream = StringIO.StringIO()
-        wb.save(output_stream)
-        return output_stream.getvalue()
-
-    def run(self):
-        '''Run the tape validation process.'''
-        # Perform type validation.
-        log_manager.info('Tape validating document.')
-        errors = self._check_type()
-        if errors:
-            log_manager.info('Document failed tape validation. List of errors:\n%s.' % str(errors))
-        else:
-            log_manager.info('Document successfully tape validated.')
-        # Transform the Excel document to reflect on its validity.
-        output_data = self._alter_document(errors)
-        return output_data
+        '''Given input Excel document, the cells and their styles to be altered, produce a new Excel document.
+
+        xlsx documents are patched in place, only the rows with altered cells and the styles they need are written again. xls
+        documents are copied whole with xlutils.
+        '''
+        with timing.stage('write_excel'):
+            # The validated sheet, which is not the first one of the document after empty sheets.
+            sheet_name = self.workbook.sheet_names()[0]
+            if is_xlsx(self.input_excel):
+                return xlsx_patch.patch_workbook(self.input_excel, alter_cells, self._XLSX_STYLES, sheet_name)
+            # Read-only copy to duplicate and get old values from, parsed again with the styles of the xls document so that the copy
+            # keeps them.
+            rb = Workbook(self.input_excel, formatting_info=True).book
+            r_sheet = rb.sheet_by_name(sheet_name)
+            # Writable copy (can't read values from this one).
+            wb = copy(rb)
+            w_sheet = wb.get_sheet(rb.sheet_names().index(r_sheet.name))
+            # Save new cell styles.
+            for ((row, col), value, style) in alter_cells:
+                xfstyle = Style.default_style
+                if style == self._BG_RED:
+                    xfstyle = easyxf("pattern: pattern solid, fore_colour red; font: colour white;")
+                elif style == self._BG_GREEN:
+                    xfstyle = easyxf("pattern: pattern solid, fore_colour green; font: colour white;")
+                elif style == self._BD_RED:
+                    xfstyle = easyxf("borders: left thin, right thin, top thin, bottom thin, "
+                                     "left_colour red, right_colour red, top_colour red, bottom_colour red;")
+                elif style == self._BD_RIGHT_RED:
+                    xfstyle = easyxf("borders: right thick, right_colour red;")
+                # See if we need to set a value.
+                if value == None:
+                    value = r_sheet.cell(row, col).value
+                w_sheet.write(row, col, value, xfstyle)
+            # Save the workbook to a stream object.
+            output_stream = StringIO.StringIO()
+            wb.save(output_stream)
+            return output_stream.getvalue()
+
+    def run(self, output_format='excel'):
+        '''Run the tape validation process.
+
+        output_format - 'excel' for the document with its problems marked, 'report' for a JSON report of them without writing the
+        document again, 'sample' for a JSON estimate of them from a sample of the rows, see sample.
+        '''
+        if output_format not in self._OUTPUT_FORMATS:
+            raise daedalus.exceptions.BadFileFormat('No such validation output format: %r' % output_format)
+        try:
+            if output_format == 'sample':
+                log_manager.info('Tape validating a sample of the document.')
+                with timing.stage('sample'):
+                    return self.sample()
+            # Perform type validation.
+            log_manager.info('Tape validating document.')
+            with timing.stage('type_check'):
+                errors = report.ProblemIndex(self._check_type())
+            if errors:
+                log_manager.info('Document failed tape validation with %d errors in %d rows.' % (len(errors), len(errors.rows)))
+                if self.stopped:
+                    log_manager.info('Tape validation stopped at the limit of %d errors.' % self.max_errors)
+            else:
+                log_manager.info('Document successfully tape validated.')
+            date_formats = self.date_formats()
+            if date_formats:
+                log_manager.info('Inferred date formats by column: %s.' % date_formats)
+            if output_format == 'report':
+                with timing.stage('report'):
+                    return self._report(errors)
+            # Transform the Excel document to reflect on its validity.
+            with timing.stage('alter_document'):
+                output_data = self._alter_document(errors)
+            return output_data
+        finally:
+            # Read-only workbooks keep the document open until closed.
+            if isinstance(self.workbook, StreamingWorkbook):
+                self.workbook.close()
+
 
+def validate(input_excel, engine=None, tape_id=None, summary=None, output_format='excel', max_errors=None): # pylint: disable=too-many-arguments
+    '''Main entrypoint of the validator.
 
-def validate(input_excel):
-    '''Main entrypoint of the validator.'''
-    validator = TapeValidation(input_excel)
-    output_data = validator.run()
+    engine - 'columnar' to type check a column at a time, 'rows' to check cell by cell, 'streaming' to check xlsx rows as they are
+    read. All find the same problems. Read from the config by default.
+    tape_id - identifier of the tape across its revisions, to only validate the rows that changed since the last one.
+    summary - dict to fill in with what the validation found besides the document, the inferred 'date_formats' by column.
+    output_format - 'excel' for the document with its problems marked, 'report' for a JSON report of the problems and totals only,
+    'sample' for a JSON estimate of the share of invalid rows from a random sample of them.
+    max_errors - number of problems to stop validating at, 0 for no limit. Read from the config by default.
+    '''
+    engine = daedalus.config.VALIDATION_ENGINE if engine is None else engine
+    with timing.stage('parse'):
+        validator = TapeValidation(input_excel, engine, tape_id=tape_id, max_errors=max_errors)
+    output_data = validator.run(output_format)
+    if summary is not None:
+        summary['date_formats'] = validator.date_formats()
     return output_data
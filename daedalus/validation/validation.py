@@ -1,11 +1,15 @@
 # pylint: disable=anomalous-backslash-in-string
 '''This module contains agnostic validation functions.'''
 
+import calendar
+import collections
 import re
 
-from datetime import datetime
+from datetime import date, datetime
 from xlrd import xldate_as_tuple
 
+from daedalus.common.memoized import memoized
+
 # Enum values used in the spreadsheet.
 _LEASING_STATUS = [u'LEASED', u'LEASED - M2M', u'RENO', u'REHAB', u'VACANT - ADVERT', u'VACANT - PENDING', u'VACANT - TRANSITION', u'N/A']
 _CLASS_OF_SPACE = [u'A', u'B', u'C']
@@ -20,18 +24,178 @@ _US_STATES_LONG = [u'ALASKA', u'ALABAMA', u'ARKANSAS', u'AMERICAN SAMOA', u'ARIZ
                    u'OHIO', u'OKLAHOMA', u'OREGON', u'PENNSYLVANIA', u'PUERTO RICO', u'RHODE ISLAND', u'SOUTH CAROLINA', u'SOUTH DAKOTA' 'TENNESSEE', u'TEXAS',
                    u'UTAH', u'VIRGINIA', u'VIRGIN ISLANDS', u'VERMONT', u'WASHINGTON', u'WISCONSIN', u'WEST VIRGINIA', u'WYOMING']
 
+# Upper cased enum values for constant time lookups.
+_LEASING_STATUS_LOOKUP = frozenset(_LEASING_STATUS)
+_CLASS_OF_SPACE_LOOKUP = frozenset(_CLASS_OF_SPACE)
+_OWNER_ESTIMATE_SOURCES_LOOKUP = frozenset(_OWNER_ESTIMATE_SOURCES)
+_US_STATES_LOOKUP = frozenset(_US_STATES_SHORT + _US_STATES_LONG)
+
+# Formats tried in order for dates written as text.
+_DATE_FORMATS = ('%d/%m/%Y', '%d/%b/%Y', '%Y/%m/%d', '%Y/%b/%d', '%d-%m-%Y', '%d-%b-%Y', '%Y-%m-%d', '%Y-%b-%d')
+# Regexes of the directives in the date formats, to match text dates without strptime. Narrower than strptime's, never wider.
+_DATE_DIRECTIVES = {'%d': '(?P<day>\d{1,2})', '%m': '(?P<month>\d{1,2})', '%b': '(?P<abbreviation>[A-Za-z]{3})', '%Y': '(?P<year>\d{4})'}
+_MONTH_ABBREVIATIONS = dict((name.lower(), number) for number, name in enumerate(calendar.month_abbr) if name)
+# Text dates a date column samples before settling on their most common format.
+_DATE_SAMPLE_SIZE = 20
+
+# Regexes compiled once at import rather than for every cell.
+_YEAR_REGEX = re.compile('^\d{4}(.0)?$')
+_ADDRESS_REGEX = re.compile('^[ ]*\w[ \-,\'\w]+$')
+_CITY_REGEX = re.compile('^[ \-\'\w]+$')
+_COUNTY_REGEX = _CITY_REGEX
+_ZIP_REGEX = re.compile('^\d{5}((.0)?|(-\d{4}))?$')
+_PERCENTAGE_REGEX = re.compile('^\d+(.\d+)?%$')
+_INTEGER_PART_REGEX = re.compile('^\d+$')
+
+_VALID = (True, None)
+_INVALID_FORMAT = (False, 'Invalid character or format.')
+
 
 def _check_regex_field(regex, field):
-    '''Check if specified regex matches given field.'''
-    regex_object = re.compile(regex)
+    '''Check if specified regex, a pattern or compiled regex, matches given field.'''
     # Need to stringify the field, because it might be a number.
-    result = re.match(regex_object, str(field))
-    if not result:
-        return (False, 'Invalid character or format.')
-    return (True, None)
+    if not re.match(regex, str(field)):
+        return _INVALID_FORMAT
+    return _VALID
+
+
+def regex_validator(regex):
+    '''Validator closure matching the stringified field against a compiled regex.'''
+    match = regex.match
+    def check(field):
+        '''Check the field against the bound regex.'''
+        # Need to stringify the field, because it might be a number.
+        if not match(str(field)):
+            return _INVALID_FORMAT
+        return _VALID
+    return check
+
+
+@memoized
+def percentage_validator(precision):
+    '''Validator closure for percentage fields with precision decimals, any if None.'''
+    # Due to formatting issues need to concatenate %$ separately.
+    match = re.compile('^\d+\.\d{%d}' % precision + '%$').match if precision else _PERCENTAGE_REGEX.match
+    def check(field):
+        '''Check for a valid percentage field.'''
+        # Eg. 8.00%, 8%, 0.08
+        try:
+            value = float(field)
+        except ValueError:
+            if not match(str(field)):
+                return _INVALID_FORMAT
+            value = float(field[:-1])
+        # Check for 0-100 bounds.
+        if not 0.0 <= value <= 100.0:
+            return (False, 'Percentage outside 0-100 bounds.')
+        return _VALID
+    return check
+
+
+@memoized
+def dollar_validator(precision):
+    '''Validator closure for dollar fields with precision decimals, any if None.'''
+    match = re.compile('^\d+(\.\d{%d})$' % precision).match if precision is not None else None
+    def check(field):
+        '''Check for a valid dollar field.'''
+        # Eg. $3,950, $3,950.00, 3950.0
+        try:
+            float(field)
+        except ValueError:
+            value = field
+            # Check for valid currency mark.
+            if field.startswith('$'):
+                value = field[1:]
+            elif field.endswith('USD'):
+                value = field[:-3]
+            # Replace kilo delimiters.
+            value = value.replace(',', '')
+            # Try to convert it again without all the extra chars.
+            try:
+                float(value)
+            except ValueError:
+                return (False, 'Invalid dollar value.')
+            if match is not None and not match(str(value)):
+                return (False, 'Invalid precision.')
+        return _VALID
+    return check
+
+
+@memoized
+def integer_validator(min_value, max_value):
+    '''Validator closure for integer fields within optional bounds.'''
+    def check(field):
+        '''Check for integer field.'''
+        try:
+            value = int(field)
+        except ValueError:
+            return (False, 'Not an integer: %s.' % field)
+        # Perform bounds check.
+        if min_value is not None and min_value > value:
+            return (False, 'Integer outside of min bounds: %d.' % value)
+        if max_value is not None and max_value < value:
+            return (False, 'Integer outside of max bounds: %d.' % value)
+        return _VALID
+    return check
+
+
+@memoized
+def float_validator(min_value, max_value, precision):
+    '''Validator closure for float fields within optional bounds and with precision decimals, any if None.'''
+    if precision is not None:
+        match = (re.compile('^\d+\.\d{%d}$' % precision) if precision else _INTEGER_PART_REGEX).match
+    else:
+        match = None
+    def check(field):
+        '''Check for float field.'''
+        try:
+            value = float(field)
+        except ValueError:
+            return (False, 'Not a float: %s.' % field)
+        # Check for precision.
+        if match is not None and not match(str(field)):
+            return (False, 'Precision does not match.')
+        # Perform bounds check.
+        if min_value is not None and min_value > value:
+            return (False, 'Float outside of min bounds: %f.' % value)
+        if max_value is not None and max_value < value:
+            return (False, 'Float outside of max bounds: %f.' % value)
+        return _VALID
+    return check
 
 
 # Cell type validation functions.
+def _text_date_format(field):
+    '''First of the date formats strptime reads the text with, or None.'''
+    for date_format in _DATE_FORMATS:
+        try:
+            datetime.strptime(field, date_format)
+            return date_format
+        except ValueError:
+            pass
+    return None
+
+
+@memoized
+def date_matcher(date_format):
+    '''Returns a function telling whether a text is a date in one of the date formats, several times faster than strptime. Texts it
+    turns down may still be dates strptime reads, eg. with a space before the day.'''
+    regex = re.compile('%s\Z' % re.sub('%[dmbY]', lambda directive: _DATE_DIRECTIVES[directive.group(0)], date_format))
+    def matcher(field):
+        '''Whether the text matches the date format and names a day of the calendar.'''
+        match = regex.match(field)
+        if match is None:
+            return False
+        parts = match.groupdict()
+        month = int(parts['month']) if 'month' in parts else _MONTH_ABBREVIATIONS.get(parts['abbreviation'].lower())
+        try:
+            date(int(parts['year']), month, int(parts['day']))
+        except (TypeError, ValueError):
+            return False
+        return True
+    return matcher
+
+
 def valid_date(field):
     '''Check for a valid date field.'''
     # Excel uses floats for storing dates. If that alone wasn't a bad idea, there are two base date systems. We assume we are using the default, 1900-one here.
@@ -40,158 +204,136 @@ def valid_date(field):
         xldate_as_tuple(field, 0)
     except ValueError:
         # Try parsing it directly using datetime.strptime instead.
-        date_formats = ['%d/%m/%Y', '%d/%b/%Y', '%Y/%m/%d', '%Y/%b/%d', '%d-%m-%Y', '%d-%b-%Y', '%Y-%m-%d', '%Y-%b-%d']
-        for date_format in date_formats:
-            try:
-                datetime.strptime(field, date_format)
-                return (True, None)
-            except ValueError:
-                pass
-        return (False, 'Invalid date.')
+        if _text_date_format(field) is None:
+            return (False, 'Invalid date.')
     return (True, None)
 
 
+class DateColumn(object):
+    '''Date validator of one column of a tape, giving the same results as valid_date.
+
+    Infers the format of the column from its first text dates, then checks the text dates after them against that format with
+    date_matcher, only trying every format when one does not match.
+    '''
+
+    def __init__(self, sample_size=_DATE_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self.format = None
+        self._matcher = None
+        self._formats = collections.Counter()
+
+    def _tally(self, date_format):
+        '''Counts the format of a sampled text date, settling on a format once the sample is complete.'''
+        self._formats[date_format] += 1
+        if sum(self._formats.values()) >= self.sample_size:
+            self.settle()
+
+    def settle(self):
+        '''Settles on the most common format of the text dates sampled so far, if any.'''
+        if self.format is None and self._formats:
+            self.format = self._formats.most_common(1)[0][0]
+            self._matcher = date_matcher(self.format)
+
+    def sample(self, values):
+        '''Infers the format from the first text dates among the values, eg. the cells of the column when they are all at hand.'''
+        for value in values:
+            if self.format is not None:
+                break
+            if isinstance(value, basestring):
+                date_format = _text_date_format(value)
+                if date_format is not None:
+                    self._tally(date_format)
+        self.settle()
+
+    def __call__(self, field):
+        if self._matcher is not None and isinstance(field, basestring) and self._matcher(field):
+            return _VALID
+        try:
+            xldate_as_tuple(field, 0)
+        except ValueError:
+            date_format = _text_date_format(field)
+            if date_format is None:
+                return (False, 'Invalid date.')
+            if self.format is None:
+                self._tally(date_format)
+        return _VALID
+
+
 def valid_percentage(field, precision=None):
     '''Check for a valid percentage field.'''
-    # Eg. 8.00%, 8%, 0.08
-    try:
-        value = float(field)
-    except ValueError:
-        # Due to formatting issues need to concatenate %$ separately.
-        percentage_regex = ('^\d+\.\d{%d}' % precision + '%$') if precision else '^\d+(.\d+)?%$'
-        result, errors = _check_regex_field(percentage_regex, field)
-        if not result:
-            return (False, errors)
-        value = float(field[:-1])
-    # Check for 0-100 bounds.
-    if not 0.0 <= value <= 100.0:
-        return (False, 'Percentage outside 0-100 bounds.')
-    return (True, None)
+    return percentage_validator(precision)(field)
 
 
 def valid_dollar(field, precision=None):
     '''Check for a valid dollar field.'''
-    # Eg. $3,950, $3,950.00, 3950.0
-    try:
-        float(field)
-    except ValueError:
-        value = field
-        # Check for valid currency mark.
-        if field.startswith('$'):
-            value = field[1:]
-        elif field.endswith('USD'):
-            value = field[:-3]
-        # Replace kilo delimiters.
-        value = value.replace(',', '')
-        # Try to convert it again without all the extra chars.
-        try:
-            float(value)
-        except ValueError:
-            return (False, 'Invalid dollar value.')
-        if precision is not None:
-            dollar_regex = '^\d+(\.\d{%d})$' % precision
-            result, _ = _check_regex_field(dollar_regex, value)
-            if not result:
-                return (False, 'Invalid precision.')
-    return (True, None)
+    return dollar_validator(precision)(field)
 
 
 def valid_year(field):
     '''Check if year built field is valid.'''
     # Excel saves most numbers as float, try to check that too.
     # Eg. 2001, 2001.0
-    year_regex = '^\d{4}(.0)?$'
-    return _check_regex_field(year_regex, field)
+    return _check_regex_field(_YEAR_REGEX, field)
 
 
 def valid_address(field):
     '''Check if address field is valid.'''
     # Eg. 789 Main Str Unit C
-    address_regex = '^[ ]*\w[ \-,\'\w]+$'
-    return _check_regex_field(address_regex, field)
+    return _check_regex_field(_ADDRESS_REGEX, field)
 
 
 def valid_city(field):
     '''Check if city field is valid.'''
     # Eg. New Reno
-    city_regex = '^[ \-\'\w]+$'
-    return _check_regex_field(city_regex, field)
+    return _check_regex_field(_CITY_REGEX, field)
 
 
 def valid_county(field):
     '''Check if county field is valid.'''
     # Eg. McPherson County
-    county_regex = '^[ \-\'\w]+$'
-    return _check_regex_field(county_regex, field)
+    return _check_regex_field(_COUNTY_REGEX, field)
 
 
 def valid_zip_code(field):
     '''Check if ZIP code field is valid.'''
     # Excel saves most numbers as float, try to check that too.
     # Eg. 56789, 56789.0, 45562-2544
-    zip_regex = '^\d{5}((.0)?|(-\d{4}))?$'
-    return _check_regex_field(zip_regex, field)
+    return _check_regex_field(_ZIP_REGEX, field)
 
 
 def valid_us_state(field):
     '''Check for a valid enum in a state field.'''
-    if field.upper() not in _US_STATES_SHORT and field.upper() not in _US_STATES_LONG:
+    if field.upper() not in _US_STATES_LOOKUP:
         return (False, 'No such US state: %s.' % field)
     return (True, None)
 
 
 def valid_estimate_source(field):
     '''Check for a valid enum in a owner estimate source field.'''
-    if field.upper() not in _OWNER_ESTIMATE_SOURCES:
+    if field.upper() not in _OWNER_ESTIMATE_SOURCES_LOOKUP:
         return (False, 'No such owner estimate source: %s.' % field)
     return (True, None)
 
 
 def valid_leasing_status(field):
     '''Check for a valid enum in a leasing status field.'''
-    if field.upper() not in _LEASING_STATUS:
+    if field.upper() not in _LEASING_STATUS_LOOKUP:
         return (False, 'No such leasing status: %s.' % field)
     return (True, None)
 
 
 def valid_class_of_space(field):
     '''Check for a valid enum in a leasing status field.'''
-    if field.upper() not in _CLASS_OF_SPACE:
+    if field.upper() not in _CLASS_OF_SPACE_LOOKUP:
         return (False, 'No such class of space %s.' % field)
     return (True, None)
 
 
 def valid_integer(field, min_value=None, max_value=None):
     '''Check for integer field.'''
-    try:
-        int(field)
-    except ValueError:
-        return (False, 'Not an integer: %s.' % field)
-    value = int(field)
-    # Perform bounds check.
-    if min_value is not None and min_value > value:
-        return (False, 'Integer outside of min bounds: %d.' % value)
-    if max_value is not None and max_value < value:
-        return (False, 'Integer outside of max bounds: %d.' % value)
-    return (True, None)
+    return integer_validator(min_value, max_value)(field)
 
 
 def valid_float(field, min_value=None, max_value=None, precision=None):
     '''Check for float field.'''
-    try:
-        float(field)
-    except ValueError:
-        return (False, 'Not a float: %s.' % field)
-    value = float(field)
-    # Check for precision.
-    if precision is not None:
-        float_regex = ('^\d+\.\d{%d}$' % precision) if precision else '^\d+$'
-        result, _ = _check_regex_field(float_regex, field)
-        if not result:
-            return (False, 'Precision does not match.')
-    # Perform bounds check.
-    if min_value is not None and min_value > value:
-        return (False, 'Float outside of min bounds: %f.' % value)
-    if max_value is not None and max_value < value:
-        return (False, 'Float outside of max bounds: %f.' % value)
-    return (True, None)
+    return float_validator(min_value, max_value, precision)(field)
@@ -0,0 +1,39 @@
+'''US state of ZIP codes by their first three digits, from the USPS prefix assignments, with no lookup service needed.'''
+
+# (first prefix, last prefix, state) of the 3-digit ZIP prefixes of each state. Prefixes not in a range are unassigned or military.
+__ZIP3_RANGES__ = [
+    (5, 5, 'NY'), (6, 7, 'PR'), (8, 8, 'VI'), (9, 9, 'PR'), (10, 27, 'MA'), (28, 29, 'RI'), (30, 38, 'NH'), (39, 49, 'ME'),
+    (50, 54, 'VT'), (55, 55, 'MA'), (56, 59, 'VT'), (60, 69, 'CT'), (70, 89, 'NJ'), (100, 149, 'NY'), (150, 196, 'PA'),
+    (197, 199, 'DE'), (200, 200, 'DC'), (201, 201, 'VA'), (202, 205, 'DC'), (206, 219, 'MD'), (220, 246, 'VA'), (247, 268, 'WV'),
+    (270, 289, 'NC'), (290, 299, 'SC'), (300, 319, 'GA'), (320, 339, 'FL'), (341, 342, 'FL'), (344, 344, 'FL'), (346, 347, 'FL'),
+    (349, 349, 'FL'), (350, 369, 'AL'), (370, 385, 'TN'), (386, 397, 'MS'), (398, 399, 'GA'), (400, 427, 'KY'), (430, 459, 'OH'),
+    (460, 479, 'IN'), (480, 499, 'MI'), (500, 528, 'IA'), (530, 549, 'WI'), (550, 567, 'MN'), (569, 569, 'DC'), (570, 577, 'SD'),
+    (580, 588, 'ND'), (590, 599, 'MT'), (600, 629, 'IL'), (630, 658, 'MO'), (660, 679, 'KS'), (680, 693, 'NE'), (700, 714, 'LA'),
+    (716, 729, 'AR'), (730, 731, 'OK'), (733, 733, 'TX'), (734, 749, 'OK'), (750, 799, 'TX'), (800, 816, 'CO'), (820, 831, 'WY'),
+    (832, 838, 'ID'), (840, 847, 'UT'), (850, 865, 'AZ'), (870, 884, 'NM'), (885, 885, 'TX'), (889, 898, 'NV'), (900, 961, 'CA'),
+    (967, 968, 'HI'), (969, 969, 'GU'), (970, 979, 'OR'), (980, 994, 'WA'), (995, 999, 'AK')
+]
+
+# (first ZIP code, last ZIP code, state) of the territories sharing a prefix with a state or another territory.
+__ZIP_EXCEPTIONS__ = [(96799, 96799, 'AS'), (96950, 96952, 'MP')]
+
+def _table(ranges):
+    '''State of each of the 1000 3-digit prefixes, None for the ones not assigned to a state.'''
+    table = [None] * 1000
+    for first, last, state in ranges:
+        table[first:last + 1] = [state] * (last - first + 1)
+    return tuple(table)
+
+# Indexed by the prefix as a number, eg. __ZIP3_TABLE__[945] == 'CA'.
+__ZIP3_TABLE__ = _table(__ZIP3_RANGES__)
+
+# States of the table.
+__STATES__ = frozenset(state for _, _, state in __ZIP3_RANGES__ + __ZIP_EXCEPTIONS__)
+
+def zip_state(zip_code):
+    '''State of a 5-digit ZIP code string, or None for a ZIP code of no state.'''
+    number = int(zip_code)
+    for first, last, state in __ZIP_EXCEPTIONS__:
+        if first <= number <= last:
+            return state
+    return __ZIP3_TABLE__[number // 100]
@@ -7,6 +7,9 @@ import daedalus.config
 import daedalus.queueing.mixins
 
 from daedalus.queueing import queue_manager
-from daedalus.valuation.valuation import valuate
+from daedalus.valuation.valuation import valuate, valuate_many, valuate_segments
+from daedalus.valuation.break_even import goal_seek
+from daedalus.valuation.monte_carlo import simulate
+from daedalus.valuation.sensitivity import sensitivity_grid
 
-__all__ = ['valuate']
+__all__ = ['goal_seek', 'sensitivity_grid', 'simulate', 'valuate', 'valuate_many', 'valuate_segments']
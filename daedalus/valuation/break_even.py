@@ -0,0 +1,68 @@
+'''Goal seek for the break-even offer price that makes a portfolio hit its target.'''
+from __future__ import division
+
+import daedalus.exceptions
+import numpy
+
+from daedalus.valuation import cash_flow, valuation
+
+# Targets that can be solved for.
+__TARGETS__ = ['surplus', 'total_irr', 'cash_flow_irr']
+
+def _stack(parameters, key):
+    '''One float64 array of a parameter across a batch of portfolios.'''
+    return numpy.array([float(parameter[key]) for parameter in parameters], dtype=numpy.float64)
+
+def _deal_value_for_noi(annual_rents, operating_income_percent, noi):
+    '''Deal value whose NOI equals the given one, NaN when no positive price gets there.'''
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        deal_values = annual_rents * operating_income_percent / noi
+    return numpy.where(noi > 0, deal_values, numpy.nan)
+
+def solve_offers(parameters, target='surplus', holding_period=cash_flow.__HOLDING_PERIOD__):
+    '''Solves the deal value that hits the target for a batch of portfolios at once. Returns a float64 array, NaN where unreachable.
+
+    parameters - list of portfolio parameters as returned by valuation._portfolio_parameters.
+    target - 'surplus' for Surplus or Deficit of zero, 'total_irr' for Total IRR equal to Target IRR, 'cash_flow_irr' for the cash
+             flow model IRR equal to Target IRR.
+
+    The rule of thumb metrics are linear in the NOI, so their NOI target inverts to a deal value directly. The cash flow model
+    reaches the target IRR when the purchase price equals the cash flows discounted at that rate, so it is closed form too.
+    '''
+    if target not in __TARGETS__:
+        raise daedalus.exceptions.BadGoal('No such goal seek target: %r' % target)
+
+    return_factor = float(valuation.__EMPIRICAL_RETURN_FACTOR__)
+    return_coefficient = float(valuation.__EMPIRICAL_COST_FACTOR__)
+    hpa_factor = float(valuation.__HPA_FACTOR__)
+    target_irr = _stack(parameters, 'target_irr')
+    annual_rents = valuation._calculate_rent_baseline(_stack(parameters, 'total_monthly_rents'), # pylint: disable=protected-access
+                                                      _stack(parameters, 'assumed_occupancy'))
+    operating_income_percent = _stack(parameters, 'operating_income_percent')
+
+    if target == 'surplus':
+        # NOI * return_factor + return_coefficient - target_irr = 0
+        return _deal_value_for_noi(annual_rents, operating_income_percent, (target_irr - return_coefficient) / return_factor)
+    elif target == 'total_irr':
+        # NOI * return_factor + return_coefficient + hpa_factor - 1 = target_irr
+        return _deal_value_for_noi(annual_rents, operating_income_percent, (target_irr + 1.0 - hpa_factor - return_coefficient) / return_factor)
+
+    # Cash flows after the purchase do not depend on the price, so the price is their present value at the target rate.
+    future_flows = cash_flow.cash_flows(numpy.zeros(len(parameters)), annual_rents, operating_income_percent,
+                                        _stack(parameters, 'total_current_valuation'), hpa_factor, holding_period)
+    times = numpy.arange(holding_period + 1)
+    deal_values = (future_flows * (1.0 + target_irr[:, numpy.newaxis]) ** -times).sum(axis=-1)
+    return numpy.where(deal_values > 0, deal_values, numpy.nan)
+
+def goal_seek(portfolios, target='surplus', holding_period=cash_flow.__HOLDING_PERIOD__):
+    '''Main entrypoint of the goal seek. Returns the solved deal value for each portfolio, None where the target is unreachable.
+
+    portfolios - list of JSON dicts, each shaped like the data_as_json argument of valuation.valuate.
+    target - see solve_offers.
+    holding_period - years held before the exit sale, for the cash_flow_irr target.
+    '''
+    parameters = [valuation._portfolio_parameters(portfolio) for portfolio in portfolios] # pylint: disable=protected-access
+    if not parameters:
+        return []
+    deal_values = solve_offers(parameters, target, holding_period)
+    return [None if numpy.isnan(value) else float(value) for value in deal_values]
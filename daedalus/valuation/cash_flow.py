@@ -0,0 +1,90 @@
+'''Multi-period cash flow model of a portfolio and an IRR solver vectorized across every offer.'''
+from __future__ import division
+
+import numpy
+
+# Years the portfolio is held before the exit sale when the caller does not say otherwise.
+__HOLDING_PERIOD__ = 5
+
+# Solver settings: NPV tolerance relative to the size of the cash flows, and the rate bracket searched.
+__TOLERANCE__ = 1e-12
+__MAX_ITERATIONS__ = 100
+__RATE_BRACKET__ = (-0.99, 10.0)
+
+def cash_flows(deal_values, annual_rents, operating_income_percent, exit_value, appreciation, holding_period=__HOLDING_PERIOD__): # pylint: disable=too-many-arguments
+    '''Yearly cash flows for buying at each deal value, holding and selling at the end. Returns an array of shape (deals, years + 1).
+
+    The other arguments are scalars or arrays that broadcast against deal_values, eg. one value per portfolio.
+
+    deal_values - purchase prices, paid at year 0.
+    annual_rents - rents of the first year, occupancy already applied. Rents grow with appreciation every year.
+    operating_income_percent - share of the rents kept as net operating income.
+    exit_value - portfolio value today, sold at exit_value * appreciation ** holding_period.
+    appreciation - yearly appreciation factor, eg. 1.0141.
+    '''
+    assert holding_period >= 1
+
+    deal_values = numpy.asarray(deal_values, dtype=numpy.float64)
+    years = numpy.arange(1, holding_period + 1)
+    income = numpy.asarray(annual_rents * operating_income_percent)[..., numpy.newaxis] * appreciation ** (years - 1)
+    flows = numpy.empty(deal_values.shape + (holding_period + 1,), dtype=numpy.float64)
+    flows[..., 0] = -deal_values
+    flows[..., 1:] = income
+    flows[..., -1] += exit_value * appreciation ** holding_period
+    return flows
+
+def _npv(flows, rates):
+    '''Net present value and its derivative with respect to the rate, for each row of flows at its own rate.'''
+    times = numpy.arange(flows.shape[-1])
+    discount = (1.0 + rates[..., numpy.newaxis]) ** -times
+    npv = (flows * discount).sum(axis=-1)
+    derivative = (-times * flows * discount / (1.0 + rates[..., numpy.newaxis])).sum(axis=-1)
+    return npv, derivative
+
+def solve_irr(flows, tolerance=__TOLERANCE__, max_iterations=__MAX_ITERATIONS__):
+    '''Solves the IRR of every row of flows at once with a Newton iteration safeguarded by bisection.
+
+    Each row keeps a bracket around its root. A Newton step that leaves the bracket, or has no usable derivative, is replaced with
+    the bracket midpoint, so every row converges even when Newton alone would diverge. Rows whose NPV does not change sign over
+    __RATE_BRACKET__ have no IRR in range and come back as NaN.
+
+    Returns (rates, diagnostics) where diagnostics holds per row 'converged', 'iterations' and the final NPV 'residual'.
+    '''
+    flows = numpy.asarray(flows, dtype=numpy.float64)
+    shape = flows.shape[:-1]
+    low = numpy.full(shape, __RATE_BRACKET__[0])
+    high = numpy.full(shape, __RATE_BRACKET__[1])
+    npv_low, _ = _npv(flows, low)
+    npv_high, _ = _npv(flows, high)
+    bracketed = numpy.sign(npv_low) != numpy.sign(npv_high)
+
+    scale = numpy.abs(flows).sum(axis=-1)
+    rates = numpy.where(bracketed, 0.1, numpy.nan)
+    converged = ~bracketed
+    iterations = numpy.zeros(shape, dtype=numpy.int64)
+    residual = numpy.full(shape, numpy.nan)
+
+    for _ in range(max_iterations):
+        active = ~converged
+        if not active.any():
+            break
+        iterations[active] += 1
+        npv, derivative = _npv(flows, numpy.where(active, rates, 0.0))
+        residual = numpy.where(active, npv, residual)
+        done = active & ((numpy.abs(npv) <= tolerance * scale) | (high - low <= tolerance))
+        converged |= done
+        active &= ~done
+
+        # Shrink the bracket onto the side that still holds the sign change.
+        same_side = numpy.sign(npv) == numpy.sign(npv_low)
+        low = numpy.where(active & same_side, rates, low)
+        npv_low = numpy.where(active & same_side, npv, npv_low)
+        high = numpy.where(active & ~same_side, rates, high)
+
+        with numpy.errstate(divide='ignore', invalid='ignore'):
+            newton = rates - npv / derivative
+        usable = numpy.isfinite(newton) & (newton > low) & (newton < high)
+        rates = numpy.where(active, numpy.where(usable, newton, (low + high) / 2.0), rates)
+
+    rates = numpy.where(bracketed & converged, rates, numpy.nan)
+    return rates, {'converged': bracketed & converged, 'iterations': iterations, 'residual': residual}
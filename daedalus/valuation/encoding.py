@@ -0,0 +1,84 @@
+'''Output encodings for offer matrices.'''
+
+import daedalus.common.mimetype
+import daedalus.exceptions
+import json
+import numpy
+import StringIO
+
+# Decimals kept when no precision is given, same as pandas' to_json default.
+__DEFAULT_PRECISION__ = 10
+
+# Most decimals a precision can ask for, pandas' to_json writes no more.
+__MAX_PRECISION__ = 15
+
+# Encodings an offer matrix can be written in, and the simple type of each payload.
+__ENCODINGS__ = {
+    'json': 'json',     # pandas default orient, one {row: value} dict per column
+    'columnar': 'json', # single header plus one array per column
+    'npy': 'npy'        # NumPy structured array, one field per column
+}
+
+def _is_text(series):
+    '''True for columns of labels rather than numbers.'''
+    return series.dtype == object and all(isinstance(value, basestring) for value in series)
+
+def _float_column(series, precision=None):
+    '''Column as float64, None becoming NaN, optionally rounded.'''
+    values = numpy.array([numpy.nan if value is None else value for value in series], dtype=numpy.float64)
+    if precision is not None:
+        values = numpy.round(values, precision)
+    return values
+
+def _columnar(offer_matrix, precision):
+    '''Single header and one array per column, NaN written as null.'''
+    data = []
+    for column in offer_matrix.columns:
+        series = offer_matrix[column]
+        if _is_text(series) or series.dtype == bool:
+            data.append(series.tolist())
+        else:
+            data.append([None if numpy.isnan(value) else value for value in _float_column(series, precision).tolist()])
+    return json.dumps({'columns': list(offer_matrix.columns), 'data': data}, separators=(',', ':'))
+
+def _npy(offer_matrix, precision):
+    '''NumPy .npy payload of a structured array with one field per column.'''
+    fields = []
+    for column in offer_matrix.columns:
+        series = offer_matrix[column]
+        if _is_text(series):
+            fields.append((str(column), 'S%d' % max([1] + [len(value) for value in series])))
+        elif series.dtype == bool:
+            fields.append((str(column), '?'))
+        else:
+            fields.append((str(column), '<f8'))
+    records = numpy.zeros(len(offer_matrix), dtype=fields)
+    for column, (name, kind) in zip(offer_matrix.columns, fields):
+        series = offer_matrix[column]
+        records[name] = series.tolist() if kind != '<f8' else _float_column(series, precision)
+    output_stream = StringIO.StringIO()
+    numpy.save(output_stream, records)
+    return output_stream.getvalue()
+
+def content_type(encoding):
+    '''Mimetype of the payload written by an encoding.'''
+    try:
+        return daedalus.common.mimetype.simple_to_mimetype(__ENCODINGS__[encoding])
+    except KeyError:
+        raise daedalus.exceptions.BadFileFormat('Unknown offer matrix encoding: %r' % encoding)
+
+def encode(offer_matrix, encoding='json', precision=None):
+    '''Writes an offer matrix dataframe in the given encoding.
+
+    Floats are rounded to precision decimals. JSON encodings keep __DEFAULT_PRECISION__ decimals when it is not given, npy keeps
+    full float64 precision.
+    '''
+    if encoding not in __ENCODINGS__:
+        raise daedalus.exceptions.BadFileFormat('Unknown offer matrix encoding: %r' % encoding)
+    if encoding == 'columnar':
+        return _columnar(offer_matrix, __DEFAULT_PRECISION__ if precision is None else precision)
+    elif encoding == 'npy':
+        return _npy(offer_matrix, precision)
+    if precision is not None:
+        return offer_matrix.to_json(double_precision=precision)
+    return offer_matrix.to_json()
@@ -0,0 +1,97 @@
+'''Monte Carlo simulation of offer IRRs over uncertain return, cost, appreciation and occupancy assumptions.'''
+from __future__ import division
+
+import daedalus.exceptions
+import functools
+import multiprocessing
+import numpy
+import pandas
+
+from daedalus.valuation import valuation, vectorized
+
+# Distributions drawn when the caller does not override them. Occupancy defaults to the deal sheet's assumption.
+__DEFAULT_DISTRIBUTIONS__ = {
+    'return_factor': ('normal', float(valuation.__EMPIRICAL_RETURN_FACTOR__), 0.3),
+    'cost_factor': ('normal', float(valuation.__EMPIRICAL_COST_FACTOR__), 0.005),
+    'hpa_factor': ('normal', float(valuation.__HPA_FACTOR__), 0.02)
+}
+
+# Number of draws evaluated together, bounds the size of the offers x draws arrays.
+__CHUNK_SIZE__ = 10000
+
+def _draw(random_state, distribution, size):
+    '''Draws samples from a distribution given as (kind, parameters...).'''
+    kind, parameters = distribution[0], distribution[1:]
+    if kind == 'fixed':
+        return numpy.repeat(float(parameters[0]), size)
+    elif kind == 'normal':
+        return random_state.normal(parameters[0], parameters[1], size)
+    elif kind == 'uniform':
+        return random_state.uniform(parameters[0], parameters[1], size)
+    elif kind == 'triangular':
+        return random_state.triangular(parameters[0], parameters[1], parameters[2], size)
+    raise daedalus.exceptions.BadDistribution('No such distribution: %r' % kind)
+
+def _simulate_chunk(offer_over_valuation, parameters, distributions, seed, chunk):
+    '''Evaluates Total IRR for every offer over one chunk of draws. Returns an offers x draws array.
+
+    The random state is seeded from (seed, chunk index) so the draws do not depend on how chunks are spread over processes.
+    '''
+    chunk_index, size = chunk
+    random_state = numpy.random.RandomState([seed, chunk_index])
+    return_factor = _draw(random_state, distributions['return_factor'], size)
+    cost_factor = _draw(random_state, distributions['cost_factor'], size)
+    hpa_factor = _draw(random_state, distributions['hpa_factor'], size)
+    occupancy = numpy.clip(_draw(random_state, distributions['occupancy'], size), 0.0, 1.0)
+
+    total_value = float(parameters['total_current_valuation'])
+    annual_rents = valuation._calculate_rent_baseline(float(parameters['total_monthly_rents']), occupancy) # pylint: disable=protected-access
+    columns = vectorized.offer_columns(numpy.asarray(offer_over_valuation)[:, numpy.newaxis], total_value, float(parameters['current_offer']),
+                                       annual_rents,
+                                       total_value * float(parameters['baseline_to_valuation']), float(parameters['operating_income_percent']),
+                                       float(parameters['target_irr']), return_factor, cost_factor, hpa_factor)
+    return columns['Total IRR']
+
+def simulate(data_as_json, big_matrix=False, draws=10000, seed=0, distributions=None, percentiles=(10, 50, 90), processes=1): # pylint: disable=too-many-arguments
+    '''Main entrypoint of the simulation. Returns JSON with IRR percentile bands per offer.
+
+    data_as_json - the data as a JSON dict, same layout as for valuation.valuate.
+    big_matrix - boolean, same offer rows as valuation.valuate.
+    draws - number of scenarios drawn.
+    seed - integer seed, the same seed always gives the same bands.
+    distributions - overrides for return_factor, cost_factor, hpa_factor and occupancy, each as (kind, parameters...) with kind one of
+                    fixed, normal, uniform or triangular. Raises BadDistribution for any other assumption.
+    percentiles - Total IRR percentiles reported for each offer, as P<n> columns.
+    processes - number of worker processes the draws are spread over.
+    '''
+    if not isinstance(draws, (int, long)) or not isinstance(processes, (int, long)) or draws < 1 or processes < 1:
+        raise daedalus.exceptions.DaedalusError('Invalid draws or processes: %r, %r' % (draws, processes))
+    unknown = sorted(set(distributions or {}) - set(__DEFAULT_DISTRIBUTIONS__) - set(['occupancy']))
+    if unknown:
+        raise daedalus.exceptions.BadDistribution('No such simulated assumption: %r' % unknown)
+
+    parameters = valuation._portfolio_parameters(data_as_json) # pylint: disable=protected-access
+    chosen = dict(__DEFAULT_DISTRIBUTIONS__, occupancy=('fixed', float(parameters['assumed_occupancy'])))
+    chosen.update(distributions or {})
+
+    offer_matrix = valuation._build_offer_matrix(big_matrix) # pylint: disable=protected-access
+    offer_over_valuation = [float(value) for value in offer_matrix['Offer Over Valuation']]
+    chunks = [(index, min(__CHUNK_SIZE__, draws - start)) for index, start in enumerate(range(0, draws, __CHUNK_SIZE__))]
+    simulate_chunk = functools.partial(_simulate_chunk, offer_over_valuation, parameters, chosen, seed)
+
+    if processes > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            results = pool.map(simulate_chunk, chunks)
+        finally:
+            pool.close()
+            pool.join()
+    else:
+        results = [simulate_chunk(chunk) for chunk in chunks]
+    total_irr = numpy.concatenate(results, axis=1)
+
+    bands = pandas.DataFrame({'Offer Name': offer_matrix['Offer Name']}, columns=['Offer Name'])
+    for percentile, band in zip(percentiles, numpy.percentile(total_irr, percentiles, axis=1)):
+        bands['P%d' % percentile] = band
+    bands['Mean'] = total_irr.mean(axis=1)
+    return bands.to_json()
@@ -0,0 +1,78 @@
+'''Multi-dimensional sensitivity analysis of the offer matrix over arbitrary deal parameter axes.'''
+from __future__ import division
+
+import daedalus.exceptions
+import json
+import numpy
+
+from daedalus.valuation import valuation, vectorized
+
+# Names of the deal parameters a sensitivity grid can sweep, one dimension of the grid each.
+__AXES__ = ['bips', 'occupancy', 'operating_income_percent', 'target_irr', 'hpa_factor']
+
+# Metrics returned when the caller does not ask for specific ones.
+__DEFAULT_METRICS__ = ['Surplus or Deficit', 'Total IRR']
+
+def _axis_shape(position, size, dimensions):
+    '''Shape that lays an axis of the given size along one dimension so it broadcasts against the others.'''
+    shape = [1] * dimensions
+    shape[position] = size
+    return tuple(shape)
+
+def sensitivity_arrays(parameters, axes, metrics=None):
+    '''Evaluates the offer metrics over the cartesian product of the given axes.
+
+    parameters - portfolio parameters as returned by valuation._portfolio_parameters.
+    axes - list of (name, values) pairs, names from __AXES__. Each axis becomes one dimension of the result, in the order given.
+    metrics - offer matrix columns to return, __DEFAULT_METRICS__ otherwise.
+
+    Axes that are not given are held at the portfolio's own value, bips at 0 (priced at valuation). Returns a dict of metric name to
+    an array with one dimension per axis.
+    '''
+    metrics = metrics or __DEFAULT_METRICS__
+    for metric in metrics:
+        if metric not in vectorized.__OFFER_COLUMNS__:
+            raise daedalus.exceptions.BadSensitivityAxis('No such offer metric: %r' % metric)
+
+    sweep = {
+        'bips': 0.0,
+        'occupancy': float(parameters['assumed_occupancy']),
+        'operating_income_percent': float(parameters['operating_income_percent']),
+        'target_irr': float(parameters['target_irr']),
+        'hpa_factor': float(valuation.__HPA_FACTOR__)
+    }
+    names = [name for name, _ in axes]
+    for name in names:
+        if name not in __AXES__:
+            raise daedalus.exceptions.BadSensitivityAxis('No such sensitivity axis: %r' % name)
+    if len(set(names)) != len(names):
+        raise daedalus.exceptions.BadSensitivityAxis('Sensitivity axes must be unique: %r' % names)
+
+    shape = tuple(len(values) for _, values in axes)
+    for position, (name, values) in enumerate(axes):
+        sweep[name] = numpy.asarray(values, dtype=numpy.float64).reshape(_axis_shape(position, len(values), len(axes)))
+
+    total_value = float(parameters['total_current_valuation'])
+    annual_rents = valuation._calculate_rent_baseline(float(parameters['total_monthly_rents']), sweep['occupancy']) # pylint: disable=protected-access
+    columns = vectorized.offer_columns(1.0 + sweep['bips'] / 10000.0, total_value, 0.0,
+                                       annual_rents,
+                                       total_value * float(parameters['baseline_to_valuation']), sweep['operating_income_percent'],
+                                       sweep['target_irr'], float(valuation.__EMPIRICAL_RETURN_FACTOR__),
+                                       float(valuation.__EMPIRICAL_COST_FACTOR__), sweep['hpa_factor'])
+    # Metrics that do not depend on every axis come back smaller, expand them to the full grid.
+    return {metric: numpy.broadcast_to(columns[metric], shape) for metric in metrics}
+
+def sensitivity_grid(data_as_json, axes, metrics=None):
+    '''Main entrypoint of the sensitivity analysis. Returns JSON with the axis labels and one N-d nested list per metric.
+
+    data_as_json - the data as a JSON dict, same layout as for valuation.valuate.
+    axes - list of (name, values) pairs, see sensitivity_arrays.
+    metrics - offer matrix columns to return.
+    '''
+    parameters = valuation._portfolio_parameters(data_as_json) # pylint: disable=protected-access
+    arrays = sensitivity_arrays(parameters, axes, metrics)
+    grid = {
+        'axes': [{'name': name, 'values': [float(value) for value in values]} for name, values in axes],
+        'metrics': {metric: values.tolist() for metric, values in arrays.items()}
+    }
+    return json.dumps(grid, separators=(',', ':'))
@@ -3,6 +3,8 @@
 import daedalus.common.service
 import daedalus.config
 import daedalus.queueing.mixins
+import daedalus.valuation.encoding
+import json
 
 class ValuationConsumer(daedalus.queueing.mixins.ConsumerMixin):
     '''Answers jobs on the valuation queue.'''
@@ -12,8 +14,33 @@ class ValuationConsumer(daedalus.queueing.mixins.ConsumerMixin):
     def process_task(self, request, response):
         incoming_file = request.body
 
-        response.set_header('content_type', 'application/json')
-        response.body = daedalus.valuation.valuate(incoming_file)
+        encoding = 'json'
+        # Batch jobs carry a list of portfolios and answer with a JSON list of offer matrices in the same order.
+        if isinstance(incoming_file, dict) and 'portfolios' in incoming_file:
+            results = daedalus.valuation.valuate_many(incoming_file['portfolios'], big_matrix=incoming_file.get('big_matrix', False))
+            response.body = '[%s]' % ','.join(results)
+        # Sensitivity jobs carry one portfolio and the axes to sweep, and answer with the labelled N-d grid.
+        elif isinstance(incoming_file, dict) and 'axes' in incoming_file:
+            response.body = daedalus.valuation.sensitivity_grid(incoming_file['portfolio'], incoming_file['axes'], incoming_file.get('metrics'))
+        # Simulation jobs carry one portfolio and the number of draws, and answer with IRR percentile bands per offer.
+        elif isinstance(incoming_file, dict) and 'draws' in incoming_file:
+            response.body = daedalus.valuation.simulate(incoming_file['portfolio'], big_matrix=incoming_file.get('big_matrix', False),
+                                                        draws=incoming_file['draws'], seed=incoming_file.get('seed', 0),
+                                                        distributions=incoming_file.get('distributions'),
+                                                        processes=daedalus.config.VALUATION_PROCESSES)
+        # Goal seek jobs carry one portfolio and the target, and answer with just the solved offer.
+        elif isinstance(incoming_file, dict) and 'solve' in incoming_file:
+            deal_value = daedalus.valuation.goal_seek([incoming_file['portfolio']], target=incoming_file['solve'])[0]
+            response.body = json.dumps({'Deal Value': deal_value}, separators=(',', ':'))
+        # Segment jobs carry one portfolio and the column to segment on, and answer with an offer matrix per segment.
+        elif isinstance(incoming_file, dict) and 'segment_by' in incoming_file:
+            response.body = daedalus.valuation.valuate_segments(incoming_file['portfolio'], incoming_file['segment_by'],
+                                                                big_matrix=incoming_file.get('big_matrix', False))
+        # Plain valuations can ask for a compact output encoding, everything else answers in JSON.
+        else:
+            encoding = request.get_header('encoding') or 'json'
+            response.body = daedalus.valuation.valuate(incoming_file, encoding=encoding, precision=request.get_header('precision'))
+        response.set_header('content_type', daedalus.valuation.encoding.content_type(encoding))
 
 def main():
     '''Starts the demon that is responsible for listening to rabbitmq.'''
@@ -1,11 +1,20 @@
 '''Generates a valuation for a given portfolio.'''
 from __future__ import division
 
+import daedalus.config
 import daedalus.exceptions
 import decimal
+import hashlib
+import json
+import numpy
+import operator
 import pandas
 
+from daedalus.common import log_manager, timing
+from daedalus.common.lru_cache import LRUCache
 from daedalus.common.types import is_decimal, is_list_of_decimals
+from daedalus.valuation import cash_flow, vectorized
+from daedalus.valuation import encoding as encoding_module
 
 # Look up for Excel column name text
 __COLUMN_LABEL__ = {
@@ -15,6 +24,12 @@ __COLUMN_LABEL__ = {
     'rent': 'Monthly Rent'        # Alternative label: Rent
 }
 
+# Engines available for computing the offer matrix
+__ENGINES__ = ['decimal', 'numpy']
+
+# Data sheet aggregates by a hash of the summed columns, so what-if valuations of the same tape skip summing it again
+__AGGREGATE_CACHE__ = LRUCache(daedalus.config.VALUATION_CACHE_SIZE)
+
 # Industry rules of thumb
 __EMPIRICAL_COST_FACTOR__ = decimal.Decimal('-0.035')
 __EMPIRICAL_RETURN_FACTOR__ = decimal.Decimal('3.0')
@@ -28,9 +43,10 @@ def _calculate_occupancy(current_leases, units):
     return current_leases / units if units != 0 else 0
 
 def _calculate_rent_baseline(monthly_rents, occupancy, month_in_year=12):
-    '''Computes baseline annual revenue from total monthly rents including occupancy assumption.'''
-    assert is_decimal(monthly_rents)
-    assert is_decimal(occupancy)
+    '''Computes baseline annual revenue from total monthly rents including occupancy assumption. Decimals, or floats and float64
+    arrays of stacked portfolios, grids and draws.'''
+    assert is_decimal(monthly_rents) or isinstance(monthly_rents, (float, numpy.ndarray))
+    assert is_decimal(occupancy) or isinstance(occupancy, (float, numpy.ndarray))
     assert 1 <= month_in_year <= 12
 
     return monthly_rents * month_in_year * occupancy
@@ -108,20 +124,63 @@ def _parse_incoming_data(data_as_json, deal_sheet_number=0, data_sheet_number=1)
     '''Pulls out the needed sheets from the JSON data.'''
     # parse the JSON for the data we need
     sheet_list = data_as_json['sheets']
-    deal_sheet = sheet_list[deal_sheet_number]
-    data_sheet = sheet_list[data_sheet_number]
-
-    # pull each sheet into the appropriate dataframe
-    data_frame = pandas.DataFrame(data=data_sheet['rows'], columns=data_sheet['columns'], dtype=decimal.Decimal)
-    loan_frame = pandas.DataFrame(data=deal_sheet['rows'], columns=deal_sheet['columns'], dtype=decimal.Decimal)
+    return sheet_list[deal_sheet_number], sheet_list[data_sheet_number]
 
-    return data_frame, loan_frame
-
-def _get_from_frame(key, loan_frame):
-    '''Pulls a value from the dataframe for quick and easy access.'''
+def _column_index(label, sheet):
+    '''Position of a labelled column in a sheet.'''
+    try:
+        return sheet['columns'].index(label)
+    except ValueError:
+        raise daedalus.exceptions.BadDataFrameKey('Cannot find a value for: %r' % label)
+
+def _cell_number(value, label):
+    '''Number of a data sheet cell, None for an empty cell: a JSON null or the u'' xlrd reads. Raises BadCellValue for text.'''
+    if value is None or value == u'':
+        return None
+    if not isinstance(value, (int, long, float)):
+        raise daedalus.exceptions.BadCellValue('Not a number in %r: %r' % (label, value))
+    return value
+
+def _sum_columns(sheet, labels):
+    '''Sums the labelled columns in a single walk over the rows, keeping only the running totals. Returns totals and row count.'''
+    indices = [_column_index(label, sheet) for label in labels]
+    totals = [0] * len(indices)
+    row_count = 0
+    for row in sheet['rows']:
+        row_count += 1
+        for position, index in enumerate(indices):
+            # Empty cells are skipped, as the dataframe sum skipped nulls.
+            value = _cell_number(row[index], labels[position])
+            if value is not None:
+                totals[position] += value
+    return totals, row_count
+
+def _data_sheet_hash(data_sheet):
+    '''Hash of the rent and valuation columns of a data sheet, the only cells the aggregates are made of. Only those two cells of
+    each row are read, and they are hashed in one go rather than serialised row by row.'''
+    cells = operator.itemgetter(_column_index(__COLUMN_LABEL__['rent'], data_sheet), _column_index(__COLUMN_LABEL__['valuation'], data_sheet))
+    return hashlib.sha1(repr([cells(row) for row in data_sheet['rows']])).hexdigest()
+
+def _data_sheet_aggregates(data_sheet):
+    '''Totals and counts derived from the portfolio data sheet, cached under the hash of the columns they sum.'''
+    key = _data_sheet_hash(data_sheet)
+    aggregates = __AGGREGATE_CACHE__.get(key)
+    if aggregates is None:
+        (total_monthly_rents, total_current_valuation), property_count = _sum_columns(
+            data_sheet, [__COLUMN_LABEL__['rent'], __COLUMN_LABEL__['valuation']])
+        aggregates = {
+            'total_monthly_rents': decimal.Decimal(total_monthly_rents),
+            'total_current_valuation': decimal.Decimal(total_current_valuation),
+            'property_count': property_count
+        }
+        __AGGREGATE_CACHE__.put(key, aggregates)
+    return dict(aggregates)
+
+def _get_from_sheet(key, deal_sheet):
+    '''Pulls a deal parameter from the first row of the deal sheet.'''
     try:
-        return decimal.Decimal(loan_frame[key][0])
-    except (KeyError, IndexError):
+        return decimal.Decimal(deal_sheet['rows'][0][_column_index(key, deal_sheet)])
+    except IndexError:
         raise daedalus.exceptions.BadDataFrameKey('Cannot find a value for: %r' % key)
 
 def _build_offer_matrix(big_matrix=False):
@@ -136,42 +195,15 @@ def _build_offer_matrix(big_matrix=False):
             if i % 100 == 0:
                 big_matrix_name = "plus " + str(i/100) + "percent"
             offer_names.append(big_matrix_name)
-            offer_over_valuation.append(_bips_over(i))
+            offer_over_valuation.append(_bips_over(decimal.Decimal(i)))
 
     offer_data_set = zip(offer_names, offer_over_valuation)
     return pandas.DataFrame(data=offer_data_set, columns=['Offer Name', 'Offer Over Valuation'], dtype=decimal.Decimal)
 
 
-def valuate(data_as_json, big_matrix=False):
-    '''Main entrypoint of the valuator.
-
-    data_as_json - the data as a JSON dict.
-    big_matrix - boolean, create a full sensativity analysis using 400 bips to 700 bips in 10 bip increments, simple matrix otherwise.
-    deal_sheet_number - zero-based integer index indicating which worksheet in the Excel file to pull deal parameters from.
-    data_sheet_number - index indicating which worksheet to pull portfolio data from.
-    '''
-
-    data_frame, loan_frame = _parse_incoming_data(data_as_json, deal_sheet_number=0, data_sheet_number=1)
-
-    # DEAL PARAMETERS
-    current_offer = _get_from_frame('Current Offer', loan_frame)
-    assumed_occupancy = _get_from_frame('Assumed Occupancy', loan_frame)
-    operating_income_percent = _get_from_frame('Assumed Operating Income Percent', loan_frame)
-    baseline_to_valuation = _get_from_frame('Baseline Real Value to Valuation', loan_frame)
-    target_irr = _get_from_frame('Target IRR', loan_frame)
-
-    # CALC BASIC METRICS
-
-    # Rents and valuation total
-    total_monthly_rents = decimal.Decimal(data_frame[__COLUMN_LABEL__['rent']].sum())
-    baseline_annual_rents = _calculate_rent_baseline(total_monthly_rents, assumed_occupancy)
-    total_current_valuation = decimal.Decimal(data_frame[__COLUMN_LABEL__['valuation']].sum())
-
-    # Baseline real value
-    baseline_real_value = total_current_valuation * baseline_to_valuation
-
-    # Build offer matrix
-    offer_matrix = _build_offer_matrix(big_matrix)
+def _offer_matrix_decimal(offer_matrix, total_current_valuation, current_offer, baseline_annual_rents, baseline_real_value,
+                          operating_income_percent, target_irr): # pylint: disable=too-many-arguments
+    '''Fills the offer matrix using arbitrary precision decimals.'''
     offer_matrix['Deal Value'] = _list_of_deal_value(offer_matrix['Offer Over Valuation'], total_current_valuation)
     offer_matrix.loc[1, 'Deal Value'] = current_offer
     offer_matrix['Profit vs Baseline Value'] = _list_of_profit(offer_matrix['Deal Value'], baseline_real_value)
@@ -184,5 +216,193 @@ def valuate(data_as_json, big_matrix=False):
 
     # Stupid hack to swap Decimal('NaN') for None because Pandas doesn't know that Decimal('NaN') is the same as np.nan
     offer_matrix['Offer Over Valuation'][1] = None
+    return offer_matrix
+
+def _offer_matrix_numpy(offer_matrix, total_current_valuation, current_offer, baseline_annual_rents, baseline_real_value,
+                        operating_income_percent, target_irr): # pylint: disable=too-many-arguments
+    '''Fills the offer matrix using float64 arrays in a single vectorized pass.'''
+    offer_over_valuation = [float(value) for value in offer_matrix['Offer Over Valuation']]
+    columns = vectorized.offer_columns(offer_over_valuation, float(total_current_valuation), float(current_offer), float(baseline_annual_rents),
+                                       float(baseline_real_value), float(operating_income_percent), float(target_irr),
+                                       float(__EMPIRICAL_RETURN_FACTOR__), float(__EMPIRICAL_COST_FACTOR__), float(__HPA_FACTOR__))
+    offer_matrix['Offer Over Valuation'] = offer_over_valuation
+    for column in vectorized.__OFFER_COLUMNS__:
+        offer_matrix[column] = columns[column]
+    return offer_matrix
+
+def _portfolio_parameters(data_as_json):
+    '''Pulls the deal parameters and data sheet totals that the offer matrix is computed from.'''
+    with timing.stage('parse'):
+        deal_sheet, data_sheet = _parse_incoming_data(data_as_json, deal_sheet_number=0, data_sheet_number=1)
+
+    with timing.stage('aggregate'):
+        parameters = _data_sheet_aggregates(data_sheet)
+    parameters.update({
+        'current_offer': _get_from_sheet('Current Offer', deal_sheet),
+        'assumed_occupancy': _get_from_sheet('Assumed Occupancy', deal_sheet),
+        'operating_income_percent': _get_from_sheet('Assumed Operating Income Percent', deal_sheet),
+        'baseline_to_valuation': _get_from_sheet('Baseline Real Value to Valuation', deal_sheet),
+        'target_irr': _get_from_sheet('Target IRR', deal_sheet)
+    })
+    return parameters
+
+def _add_cash_flow_irr(offer_matrix, total_current_valuation, baseline_annual_rents, operating_income_percent, holding_period):
+    '''Adds the IRR of the multi-period cash flow model for every offer, solved together, and whether each one converged.'''
+    deal_values = [float(value) for value in offer_matrix['Deal Value']]
+    flows = cash_flow.cash_flows(deal_values, float(baseline_annual_rents), float(operating_income_percent), float(total_current_valuation),
+                                 float(__HPA_FACTOR__), holding_period)
+    rates, diagnostics = cash_flow.solve_irr(flows)
+    if not diagnostics['converged'].all():
+        log_manager.warn('Cash flow IRR did not converge for offers: %r' % list(offer_matrix['Offer Name'][~diagnostics['converged']]))
+    offer_matrix['Cash Flow IRR'] = rates
+    offer_matrix['IRR Converged'] = diagnostics['converged']
+    return offer_matrix
+
+def _valuate_frame(data_as_json, big_matrix=False, engine='decimal', cash_flow_irr=False, holding_period=cash_flow.__HOLDING_PERIOD__):
+    '''Builds the offer matrix dataframe for a portfolio using the requested engine.'''
+    if engine not in __ENGINES__:
+        raise daedalus.exceptions.UnknownEngine('No such valuation engine: %r' % engine)
+
+    parameters = _portfolio_parameters(data_as_json)
+
+    # CALC BASIC METRICS
 
-    return offer_matrix.to_json()
+    # Rents and valuation total
+    baseline_annual_rents = _calculate_rent_baseline(parameters['total_monthly_rents'], parameters['assumed_occupancy'])
+    total_current_valuation = parameters['total_current_valuation']
+
+    # Baseline real value
+    baseline_real_value = total_current_valuation * parameters['baseline_to_valuation']
+
+    # Build offer matrix
+    with timing.stage('matrix_build'):
+        offer_matrix = _build_offer_matrix(big_matrix)
+        fill_offer_matrix = _offer_matrix_numpy if engine == 'numpy' else _offer_matrix_decimal
+        offer_matrix = fill_offer_matrix(offer_matrix, total_current_valuation, parameters['current_offer'], baseline_annual_rents,
+                                         baseline_real_value, parameters['operating_income_percent'], parameters['target_irr'])
+    if cash_flow_irr:
+        with timing.stage('cash_flow_irr'):
+            offer_matrix = _add_cash_flow_irr(offer_matrix, total_current_valuation, baseline_annual_rents, parameters['operating_income_percent'],
+                                              holding_period)
+    return offer_matrix
+
+def engines_agree(data_as_json, big_matrix=False, relative_tolerance=vectorized.__RELATIVE_TOLERANCE__):
+    '''Valuates a portfolio with both engines and checks the numpy results against the Decimal ones.
+
+    Every column must agree within relative_tolerance of its largest magnitude, see vectorized.within_tolerance.
+    '''
+    decimal_matrix = _valuate_frame(data_as_json, big_matrix, engine='decimal')
+    float_matrix = _valuate_frame(data_as_json, big_matrix, engine='numpy')
+    return vectorized.within_tolerance(decimal_matrix, float_matrix, relative_tolerance)
+
+def valuate(data_as_json, big_matrix=False, engine='decimal', cash_flow_irr=False, holding_period=cash_flow.__HOLDING_PERIOD__, # pylint: disable=too-many-arguments
+            encoding='json', precision=None):
+    '''Main entrypoint of the valuator.
+
+    data_as_json - the data as a JSON dict.
+    big_matrix - boolean, create a full sensativity analysis using 400 bips to 700 bips in 10 bip increments, simple matrix otherwise.
+    engine - 'decimal' for arbitrary precision list arithmetic, 'numpy' for float64 array arithmetic within vectorized.__RELATIVE_TOLERANCE__.
+    cash_flow_irr - boolean, also solve the IRR of a yearly cash flow model for every offer (Cash Flow IRR and IRR Converged columns).
+    holding_period - years held before the exit sale in the cash flow model.
+    encoding - 'json' for the pandas column dicts, 'columnar' for a single header and one array per column, 'npy' for a binary NumPy
+               structured array. See encoding.content_type for the matching mimetype.
+    precision - number of decimals floats are rounded to in the output, full precision otherwise.
+    '''
+    offer_matrix = _valuate_frame(data_as_json, big_matrix, engine, cash_flow_irr, holding_period)
+    with timing.stage('encode'):
+        return encoding_module.encode(offer_matrix, encoding, precision)
+
+def _stacked_offer_matrices(stacked, big_matrix=False):
+    '''Offer matrix JSON for each row of stacked parameters, all computed in one broadcast pass of the numpy engine.
+
+    stacked - dict of portfolio parameter name to a float64 array of shape (portfolios, 1).
+    '''
+    offer_matrix = _build_offer_matrix(big_matrix)
+    offer_over_valuation = [float(value) for value in offer_matrix['Offer Over Valuation']]
+    columns = vectorized.offer_columns(offer_over_valuation, stacked['total_current_valuation'], stacked['current_offer'],
+                                       _calculate_rent_baseline(stacked['total_monthly_rents'], stacked['assumed_occupancy']),
+                                       stacked['total_current_valuation'] * stacked['baseline_to_valuation'],
+                                       stacked['operating_income_percent'], stacked['target_irr'],
+                                       float(__EMPIRICAL_RETURN_FACTOR__), float(__EMPIRICAL_COST_FACTOR__), float(__HPA_FACTOR__))
+
+    results = []
+    for index in range(len(stacked['total_current_valuation'])):
+        portfolio_matrix = pandas.DataFrame({'Offer Name': offer_matrix['Offer Name'], 'Offer Over Valuation': offer_over_valuation},
+                                            columns=['Offer Name', 'Offer Over Valuation'])
+        for column in vectorized.__OFFER_COLUMNS__:
+            portfolio_matrix[column] = columns[column][index]
+        results.append(portfolio_matrix.to_json())
+    return results
+
+def valuate_many(portfolios, big_matrix=False):
+    '''Valuates a batch of portfolios in one vectorized pass.
+
+    portfolios - list of JSON dicts, each shaped like the data_as_json argument of valuate.
+    big_matrix - boolean, same offer rows as valuate, shared by every portfolio in the batch.
+
+    Deal parameters and data sheet totals are stacked into one array per parameter, so the offer matrices of all portfolios are
+    computed together with the numpy engine. Returns a list with one offer matrix JSON per portfolio, in the order given.
+    '''
+    if not portfolios:
+        return []
+
+    parameters = [_portfolio_parameters(portfolio) for portfolio in portfolios]
+    stacked = {key: numpy.array([float(parameter[key]) for parameter in parameters], dtype=numpy.float64)[:, numpy.newaxis]
+               for key in parameters[0]}
+    return _stacked_offer_matrices(stacked, big_matrix)
+
+def _segment_aggregates(data_sheet, segment_by):
+    '''Groups the data sheet by a column and sums rents and valuations per group in one vectorized pass.
+
+    Returns the group labels in order of first appearance and float64 arrays of monthly rents, valuations and row counts per group.
+    Rows without a label (None or NaN) are in no group. Raises BadCellValue for a rent or valuation cell holding text.
+    '''
+    segment_index = _column_index(segment_by, data_sheet)
+    rent_index = _column_index(__COLUMN_LABEL__['rent'], data_sheet)
+    valuation_index = _column_index(__COLUMN_LABEL__['valuation'], data_sheet)
+    rows = data_sheet['rows']
+
+    codes, labels = pandas.factorize([row[segment_index] for row in rows])
+    # Missing labels get the code -1, which bincount does not take.
+    labelled = codes >= 0
+    codes = codes[labelled]
+    # Empty cells are read as NaN and skipped and text raises, like the whole portfolio totals.
+    rents = numpy.array([_cell_number(row[rent_index], __COLUMN_LABEL__['rent']) for row in rows], dtype=numpy.float64)[labelled]
+    valuations = numpy.array([_cell_number(row[valuation_index], __COLUMN_LABEL__['valuation']) for row in rows],
+                             dtype=numpy.float64)[labelled]
+    # bincount takes no minlength of 0 before numpy 1.14.
+    if not len(labels):
+        empty = numpy.zeros(0, dtype=numpy.float64)
+        return [], empty, empty, numpy.zeros(0, dtype=numpy.intp)
+    return (list(labels), numpy.bincount(codes, weights=numpy.nan_to_num(rents), minlength=len(labels)),
+            numpy.bincount(codes, weights=numpy.nan_to_num(valuations), minlength=len(labels)),
+            numpy.bincount(codes, minlength=len(labels)))
+
+def valuate_segments(data_as_json, segment_by, big_matrix=False):
+    '''Valuates every segment of a portfolio, eg. per state or class of space, in one grouped pass.
+
+    data_as_json - the data as a JSON dict, same layout as for valuate.
+    segment_by - label of the data sheet column to segment on.
+    big_matrix - boolean, same offer rows as valuate.
+
+    The deal sheet applies to every segment, with the current offer split across segments in proportion to their valuation.
+    Returns JSON mapping each segment label to its offer matrix.
+    '''
+    deal_sheet, data_sheet = _parse_incoming_data(data_as_json, deal_sheet_number=0, data_sheet_number=1)
+    labels, rents, valuations, _ = _segment_aggregates(data_sheet, segment_by)
+    if not labels:
+        return '{}'
+
+    stacked = {key: numpy.repeat(float(_get_from_sheet(label, deal_sheet)), len(labels))
+               for key, label in [('current_offer', 'Current Offer'), ('assumed_occupancy', 'Assumed Occupancy'),
+                                  ('operating_income_percent', 'Assumed Operating Income Percent'),
+                                  ('baseline_to_valuation', 'Baseline Real Value to Valuation'), ('target_irr', 'Target IRR')]}
+    total_valuation = numpy.sum(valuations)
+    share = valuations / total_valuation if total_valuation else numpy.repeat(1.0 / len(labels), len(labels))
+    stacked['current_offer'] = stacked['current_offer'] * share
+    stacked['total_monthly_rents'] = rents
+    stacked['total_current_valuation'] = valuations
+    stacked = {key: value[:, numpy.newaxis] for key, value in stacked.items()}
+
+    offer_matrices = _stacked_offer_matrices(stacked, big_matrix)
+    return '{%s}' % ','.join('%s:%s' % (json.dumps(unicode(label)), offer_matrix) for label, offer_matrix in zip(labels, offer_matrices))
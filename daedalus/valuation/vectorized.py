@@ -0,0 +1,54 @@
+'''Float64 array engine for the offer matrix. Mirrors the Decimal list functions in valuation.py in a single vectorized pass.'''
+from __future__ import division
+
+import numpy
+
+# Relative tolerance between the float64 and Decimal engines, taken against the largest magnitude in each column.
+__RELATIVE_TOLERANCE__ = 1e-9
+
+# Offer matrix columns computed by the engine, in output order.
+__OFFER_COLUMNS__ = ['Deal Value', 'Profit vs Baseline Value', 'Gross Yield', 'NOI', 'Premium', 'Surplus or Deficit', 'Coupon IRR', 'Total IRR']
+
+def offer_columns(offer_over_valuation, total_value, current_offer, annual_rents, baseline_real_value, operating_income_percent, target_irr,
+                  return_factor, return_coefficient, hpa_factor): # pylint: disable=too-many-arguments
+    '''Computes every offer matrix column as float64 arrays.
+
+    All arguments are broadcast against each other, so scalars price a single portfolio and arrays with extra leading axes price
+    many portfolios or scenarios at once. Ratios that are NaN mark the row priced at current_offer instead of the valuation.
+    '''
+    ratios = numpy.asarray(offer_over_valuation, dtype=numpy.float64)
+    total_value = numpy.asarray(total_value, dtype=numpy.float64)
+
+    with numpy.errstate(divide='ignore', invalid='ignore'):
+        deal_value = numpy.where(numpy.isnan(ratios), current_offer, ratios * total_value)
+        gross_yield = numpy.where(deal_value != 0, annual_rents / deal_value, numpy.nan)
+        premium = numpy.where(total_value != 0, deal_value / total_value - 1.0, numpy.nan)
+    noi = gross_yield * operating_income_percent
+    coupon_irr = noi * return_factor + return_coefficient
+
+    return {
+        'Deal Value': deal_value,
+        'Profit vs Baseline Value': baseline_real_value - deal_value,
+        'Gross Yield': gross_yield,
+        'NOI': noi,
+        'Premium': premium,
+        'Surplus or Deficit': coupon_irr - target_irr,
+        'Coupon IRR': coupon_irr,
+        'Total IRR': coupon_irr + hpa_factor - 1.0
+    }
+
+def within_tolerance(decimal_matrix, float_matrix, relative_tolerance=__RELATIVE_TOLERANCE__):
+    '''Checks that two offer matrices agree column by column.
+
+    Each column passes when every element is within relative_tolerance of the largest magnitude in that column, which keeps
+    near-zero entries like the offer's profit from failing on float64 rounding noise. Missing values must line up exactly.
+    '''
+    for column in __OFFER_COLUMNS__:
+        expected = numpy.array([numpy.nan if value is None else float(value) for value in decimal_matrix[column]], dtype=numpy.float64)
+        actual = numpy.asarray(float_matrix[column], dtype=numpy.float64)
+        if expected.shape != actual.shape:
+            return False
+        scale = numpy.nanmax(numpy.abs(expected)) if not numpy.isnan(expected).all() else 0.0
+        if not numpy.allclose(actual, expected, rtol=0.0, atol=relative_tolerance * scale, equal_nan=True):
+            return False
+    return True
@@ -4,47 +4,44 @@ import daedalus.exceptions
 import json
 import StringIO
 import openpyxl
-import xlrd
 
-from daedalus.common import log_manager
+from daedalus.common import log_manager, timing
+from daedalus.xlstransform.workbook import Workbook
 
 def excel_to_json(data, pretty=False):
     '''Given an Excel representation of the data, it returns a JSON transformation of the data.'''
-    excel_dict = {'sheets': []}
-    workbook = xlrd.open_workbook(file_contents=data)
-    for sheet in workbook.sheets():
-        if sheet.nrows == 0:
-            continue
-        sheet_data = {'name': sheet.name, 'columns': sheet.row_values(0), 'rows': []}
-        for row_index in range(1, sheet.nrows):
-            sheet_data['rows'].append(sheet.row_values(row_index))
-        excel_dict['sheets'].append(sheet_data)
-    if pretty:
-        return json.dumps(excel_dict, indent=2, separators=(',', ': '), sort_keys=True)
-    else:
-        return json.dumps(excel_dict, separators=(',', ':'))
+    workbook = Workbook(data)
+    excel_dict = {'sheets': [{'name': name, 'columns': workbook.columns(name), 'rows': workbook.rows(name)}
+                             for name in workbook.sheet_names()]}
+    with timing.stage('encode_json'):
+        if pretty:
+            return json.dumps(excel_dict, indent=2, separators=(',', ': '), sort_keys=True)
+        else:
+            return json.dumps(excel_dict, separators=(',', ':'))
 
 def json_to_excel(data):
     '''Given a JSON representation of the data, it returns an Excel workbook.'''
-    workbook = openpyxl.Workbook()
-    jsondata = json.loads(data)
-    current_sheet = workbook.active
-    for sheet in jsondata['sheets']:
-        current_sheet.title = sheet['name']
+    with timing.stage('parse_json'):
+        jsondata = json.loads(data)
+    with timing.stage('write_excel'):
+        workbook = openpyxl.Workbook()
+        current_sheet = workbook.active
+        for sheet in jsondata['sheets']:
+            current_sheet.title = sheet['name']
 
-        current_sheet.append(sheet['columns']) # pylint: disable=E1101
-        for row in sheet['rows']:
-            if row is None:
-                current_sheet.append([]) # pylint: disable=E1101
-            elif isinstance(row, dict):
-                current_sheet.append(process_json_row(sheet['columns'], row)) # pylint: disable=E1101
-            else:
-                current_sheet.append(row) # pylint: disable=E1101
-        current_sheet = workbook.create_sheet()
-    workbook.remove_sheet(current_sheet) # Kill the last sheet (it's always empty)
-    data = StringIO.StringIO()
-    workbook.save(data)
-    return data.getvalue()
+            current_sheet.append(sheet['columns']) # pylint: disable=E1101
+            for row in sheet['rows']:
+                if row is None:
+                    current_sheet.append([]) # pylint: disable=E1101
+                elif isinstance(row, dict):
+                    current_sheet.append(process_json_row(sheet['columns'], row)) # pylint: disable=E1101
+                else:
+                    current_sheet.append(row) # pylint: disable=E1101
+            current_sheet = workbook.create_sheet()
+        workbook.remove_sheet(current_sheet) # Kill the last sheet (it's always empty)
+        data = StringIO.StringIO()
+        workbook.save(data)
+        return data.getvalue()
 
 def process_json_row(columns, row):
     '''Helper function to process a row formatted as a JSON object.'''
@@ -0,0 +1,132 @@
+'''In-memory model of an Excel document, parsed once and shared by everything that reads it.'''
+
+import datetime
+import StringIO
+import openpyxl
+import xlrd
+
+from openpyxl.utils.datetime import to_excel
+
+from daedalus.common import timing
+
+# First bytes of a zip container, ie. an xlsx document. Anything else is taken for a binary xls document.
+__ZIP_MAGIC__ = 'PK\x03\x04'
+
+def is_xlsx(data):
+    '''Whether the document bytes are an xlsx document rather than an xls one.'''
+    return data[:len(__ZIP_MAGIC__)] == __ZIP_MAGIC__
+
+class Workbook(object):
+    '''Excel document parsed once. Gives its sheets by name or position and their rows as lists, with the same values and the same
+    convention as excel_to_json: empty sheets are left out, the first row of a sheet is its columns and the rest its rows.
+    '''
+
+    def __init__(self, data, formatting_info=False):
+        '''Parses the document bytes. formatting_info keeps the cell styles of xls documents, eg. to write a styled copy of them with
+        xlutils. xlrd does not read the styles of xlsx documents.
+        '''
+        self.data = data
+        self.is_xlsx = is_xlsx(data)
+        with timing.stage('read_excel'):
+            self.book = xlrd.open_workbook(file_contents=data, formatting_info=formatting_info and not self.is_xlsx)
+        self._sheets = [sheet for sheet in self.book.sheets() if sheet.nrows > 0]
+        self._rows = {}
+
+    def sheet_names(self):
+        '''Names of the sheets that are not empty, in document order.'''
+        return [sheet.name for sheet in self._sheets]
+
+    def sheet(self, key):
+        '''Sheet by name or by position among the sheets that are not empty. Returns None for no such sheet.'''
+        if isinstance(key, (int, long)):
+            return self._sheets[key] if -len(self._sheets) <= key < len(self._sheets) else None
+        for sheet in self._sheets:
+            if sheet.name == key:
+                return sheet
+        return None
+
+    def columns(self, key):
+        '''Values of the first row of a sheet.'''
+        return self.sheet(key).row_values(0)
+
+    def rows(self, key):
+        '''Values of every row of a sheet but the first, read once and kept. Returns [] for no such sheet.'''
+        sheet = self.sheet(key)
+        if sheet is None:
+            return []
+        if sheet.name not in self._rows:
+            with timing.stage('read_excel'):
+                self._rows[sheet.name] = [sheet.row_values(row_index) for row_index in range(1, sheet.nrows)]
+        return self._rows[sheet.name]
+
+    def iter_rows(self, key):
+        '''Iterates the rows of a sheet but the first, as StreamingWorkbook does.'''
+        return iter(self.rows(key))
+
+def _xlrd_value(value):
+    '''Cell value as xlrd reads it: numbers as floats, dates as Excel serial dates, booleans as ints and empty cells as u''.'''
+    if value is None:
+        return u''
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, (int, long)):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time, datetime.timedelta)):
+        return float(to_excel(value))
+    return value
+
+class StreamingWorkbook(object):
+    '''xlsx document read a row at a time with openpyxl's read-only mode, so that only the current row is held in memory.
+
+    Gives the same sheets and row values as Workbook, except that the rows of a sheet are read again on every iteration.
+    '''
+
+    def __init__(self, data):
+        '''Opens the document bytes, reading the sheet list and shared strings but no rows.'''
+        self.data = data
+        self.book = openpyxl.load_workbook(StringIO.StringIO(data), read_only=True, data_only=True)
+
+    def _iter_sheet(self, sheet): # pylint: disable=no-self-use
+        '''Rows of a sheet as lists of xlrd values.
+
+        Rows can be wider than xlrd makes them, the extra cells empty. Trailing empty rows, eg. formatted but blank, are left out as
+        xlrd does, so empty rows are held back until a row with a value follows them.
+        '''
+        empty_rows = []
+        for row in sheet.iter_rows(values_only=True):
+            cells = [_xlrd_value(value) for value in row]
+            if all(cell == u'' for cell in cells):
+                empty_rows.append(cells)
+                continue
+            for empty_row in empty_rows:
+                yield empty_row
+            empty_rows = []
+            yield cells
+
+    def _sheets(self):
+        '''(sheet, rows iterator) of the sheets that are not empty, the first row already read off the iterator.'''
+        for sheet in self.book.worksheets:
+            rows = self._iter_sheet(sheet)
+            for columns in rows:
+                yield sheet, columns, rows
+                break
+
+    def sheet_names(self):
+        '''Names of the sheets that are not empty, in document order.'''
+        return [sheet.title for sheet, _, _ in self._sheets()]
+
+    def iter_rows(self, key):
+        '''Iterates the rows of a sheet but the first, by name or position among the sheets that are not empty. Yields nothing for
+        no such sheet.'''
+        for index, (sheet, _, rows) in enumerate(self._sheets()):
+            if key == index or key == sheet.title:
+                return rows
+        return iter([])
+
+    def rows(self, key):
+        '''Values of every row of a sheet but the first.'''
+        return list(self.iter_rows(key))
+
+    def close(self):
+        '''Closes the document, read-only workbooks keep it open until then.'''
+        self.book.close()
@@ -0,0 +1,355 @@
+'''Writes cells and styles into an xlsx document in place.
+
+Only the rows of the worksheet that hold a changed cell are rewritten, with the cell styles they need appended to the stylesheet.
+Every other part of the document is copied over still compressed, byte for byte, so the cost follows the number of changed cells and the size of the
+worksheet rather than the number of cells of the whole workbook.
+'''
+
+import copy
+import posixpath
+import re
+import StringIO
+import struct
+import zipfile
+
+from xml.etree import ElementTree
+from xml.sax.saxutils import escape
+
+from daedalus.exceptions import BadFileFormat
+
+__MAIN_NS__ = 'http://schemas.openxmlformats.org/spreadsheetml/2006/main'
+__RELATIONSHIPS_NS__ = 'http://schemas.openxmlformats.org/officeDocument/2006/relationships'
+__PACKAGE_RELATIONSHIPS_NS__ = 'http://schemas.openxmlformats.org/package/2006/relationships'
+
+_CELL = re.compile(r'<c\b[^>]*?(?:/>|>.*?</c>)', re.S)
+_ROW_NUMBER = re.compile(r'\sr="(\d+)"')
+_CELL_REFERENCE = re.compile(r'\sr="([A-Z]+)(\d+)"')
+_FORMULA = re.compile(r'<f\b')
+_COLOR = re.compile(r'<color\b[^>]*?(?:/>|>.*?</color>)', re.S)
+_DIMENSION = re.compile(r'<dimension ref="([A-Z]+)(\d+)(?::([A-Z]+)(\d+))?"')
+_CALC_CELL = re.compile(r'<c\b[^>]*/>')
+_CALC_SHEET = re.compile(r'\si="(\d+)"')
+
+# Stylesheet sections the cell styles are made of: (section tag, item tag).
+_STYLE_SECTIONS = [('fonts', 'font'), ('fills', 'fill'), ('borders', 'border'), ('cellXfs', 'xf')]
+
+def column_letters(col):
+    '''Excel letters of a 0-based column, eg. 0 -> 'A', 26 -> 'AA'.'''
+    letters = ''
+    col += 1
+    while col:
+        col, remainder = divmod(col - 1, 26)
+        letters = chr(ord('A') + remainder) + letters
+    return letters
+
+def column_index(letters):
+    '''0-based column of Excel column letters, eg. 'AA' -> 26.'''
+    col = 0
+    for letter in letters:
+        col = col * 26 + ord(letter) - ord('A') + 1
+    return col - 1
+
+def _set_attribute(tag, name, value):
+    '''Start tag with an attribute set to value, added when missing.'''
+    attribute = re.compile(r'\s%s="[^"]*"' % re.escape(name))
+    if attribute.search(tag):
+        return attribute.sub(' %s="%s"' % (name, value), tag, count=1)
+    end = len(tag) - 2 if tag.endswith('/>') else len(tag) - 1
+    return '%s %s="%s"%s' % (tag[:end], name, value, tag[end:])
+
+def _remove_attribute(tag, name):
+    '''Start tag without an attribute.'''
+    return re.sub(r'\s%s="[^"]*"' % re.escape(name), '', tag, count=1)
+
+def _int_attribute(tag, name, default=0):
+    '''Integer attribute of a start tag, default when missing.'''
+    match = re.search(r'\s%s="(\d+)"' % re.escape(name), tag)
+    return int(match.group(1)) if match else default
+
+def _split_element(element):
+    '''(start tag, content) of an element, content None for an empty element tag.'''
+    end = element.index('>') + 1
+    if element[end - 2] == '/':
+        return element[:end], None
+    return element[:end], element[end:element.rindex('<')]
+
+def _text(value):
+    '''Cell value as unicode text.'''
+    return value if isinstance(value, unicode) else str(value).decode('utf-8')
+
+class _Stylesheet(object):
+    '''Stylesheet of the document, with the cell styles the changed cells need appended to it.
+
+    Styles are given as dicts of 'fill' (ARGB colour of a solid fill), 'font_colour' (ARGB) and 'borders' ((side, style, ARGB colour)
+    of each side with a border). A styled cell keeps what its style does not set, eg. its number format or alignment.
+    '''
+
+    def __init__(self, text):
+        '''Finds the items of every section the cell styles are made of. Raises BadFileFormat for a stylesheet without one.'''
+        self.text = text
+        self.sections = {}
+        self.items = {}
+        self.added = {}
+        for section, item in _STYLE_SECTIONS:
+            match = re.search(r'<%s\b[^>]*>(.*?)</%s>' % (section, section), text, re.S)
+            if match is None:
+                raise BadFileFormat('xlsx stylesheet without %s.' % section)
+            self.sections[section] = match
+            self.items[section] = re.findall(r'<%s\b[^>]*?(?:/>|>.*?</%s>)' % (item, item), match.group(1), re.S)
+            self.added[section] = []
+        self._xfs = {}
+
+    def _add(self, section, element):
+        '''Appends an item to a section. Returns its index.'''
+        self.added[section].append(element)
+        return len(self.items[section]) + len(self.added[section]) - 1
+
+    def _item(self, section, index):
+        '''Item of a section by index, existing or added.'''
+        items = self.items[section]
+        return items[index] if index < len(items) else self.added[section][index - len(items)]
+
+    def xf(self, original, style_key, style):
+        '''Index of the cell style made of the original one with the style applied, added the first time it is asked for.'''
+        if (original, style_key) in self._xfs:
+            return self._xfs[(original, style_key)]
+        xf_start, xf_content = _split_element(self._item('cellXfs', original if original < len(self.items['cellXfs']) else 0))
+        if 'font_colour' in style:
+            font_start, font_content = _split_element(self._item('fonts', _int_attribute(xf_start, 'fontId')))
+            font_content = _COLOR.sub('', font_content or '') + '<color rgb="%s"/>' % style['font_colour']
+            font = self._add('fonts', '%s%s</font>' % (font_start.replace('/>', '>'), font_content))
+            xf_start = _set_attribute(_set_attribute(xf_start, 'fontId', font), 'applyFont', 1)
+        if 'fill' in style:
+            fill = self._add('fills', '<fill><patternFill patternType="solid"><fgColor rgb="%s"/><bgColor indexed="64"/>'
+                                      '</patternFill></fill>' % style['fill'])
+            xf_start = _set_attribute(_set_attribute(xf_start, 'fillId', fill), 'applyFill', 1)
+        if 'borders' in style:
+            sides = dict((side, (line, colour)) for side, line, colour in style['borders'])
+            border = self._add('borders', '<border>%s<diagonal/></border>' % ''.join(
+                '<%s style="%s"><color rgb="%s"/></%s>' % (side, sides[side][0], sides[side][1], side) if side in sides else
+                '<%s/>' % side for side in ['left', 'right', 'top', 'bottom']))
+            xf_start = _set_attribute(_set_attribute(xf_start, 'borderId', border), 'applyBorder', 1)
+        xf = xf_start if xf_content is None else '%s%s</xf>' % (xf_start, xf_content)
+        self._xfs[(original, style_key)] = self._add('cellXfs', xf)
+        return self._xfs[(original, style_key)]
+
+    def getvalue(self):
+        '''Stylesheet text with the added items, the section counts updated.'''
+        pieces, position = [], 0
+        for section, match in sorted(self.sections.items(), key=lambda item: item[1].start()):
+            if not self.added[section]:
+                continue
+            start_tag = self.text[match.start():match.start(1)]
+            count = len(self.items[section]) + len(self.added[section])
+            pieces.extend([self.text[position:match.start()], _set_attribute(start_tag, 'count', count), match.group(1)])
+            pieces.extend(self.added[section])
+            position = match.end(1)
+        pieces.append(self.text[position:])
+        return ''.join(pieces)
+
+def _cell(element, reference, value, style_key, style, stylesheet):
+    '''Cell element with its value and style changed. element is None for a cell missing from its row.'''
+    start, content = _split_element(element) if element is not None else ('<c r="%s"/>' % reference, None)
+    if style is not None:
+        start = _set_attribute(start, 's', stylesheet.xf(_int_attribute(start, 's'), style_key, style))
+    if value is None:
+        return start if content is None else '%s%s</c>' % (start, content)
+    start = _remove_attribute(start, 't').replace('/>', '>')
+    if isinstance(value, (int, long, float)) and not isinstance(value, bool):
+        return '%s<v>%s</v></c>' % (start, repr(value) if isinstance(value, float) else value)
+    text = escape(_text(value)).encode('utf-8')
+    return '%s<is><t xml:space="preserve">%s</t></is></c>' % (_set_attribute(start, 't', 'inlineStr'), text)
+
+def _row(element, number, updates, styles, stylesheet, formulas):
+    '''Row element with its updated cells changed or added in column order. Refs of the cells that lose a formula go in formulas.
+
+    element is None for a row missing from the sheet. updates are {col: (value, style key)} of the row.
+    '''
+    start, content = _split_element(element) if element is not None else ('<row r="%d"/>' % number, None)
+    # The span of a row is only a hint, and would be wrong with cells added past it.
+    start = _remove_attribute(start, 'spans').replace('/>', '>')
+    cells, tail, col = [], '', -1
+    if content:
+        position = 0
+        for match in _CELL.finditer(content):
+            cell = match.group(0)
+            reference = _CELL_REFERENCE.search(cell[:cell.index('>')])
+            col = column_index(reference.group(1)) if reference else col + 1
+            if reference is None:
+                cell = _set_attribute(cell[:cell.index('>') + 1], 'r', '%s%d' % (column_letters(col), number)) + cell[cell.index('>') + 1:]
+            cells.append((col, cell))
+            position = match.end()
+        tail = content[position:]
+    existing = dict(cells)
+    for col, (value, style_key) in updates.items():
+        reference = '%s%d' % (column_letters(col), number)
+        if value is not None and col in existing and _FORMULA.search(existing[col]):
+            formulas.add(reference)
+        existing[col] = _cell(existing.get(col), reference, value, style_key, styles.get(style_key), stylesheet)
+    return '%s%s%s</row>' % (start, ''.join(existing[col] for col in sorted(existing)), tail)
+
+def _row_tags(text, start, end):
+    '''(start, end) of the start tag of every row between start and end, found without going through the cells of the rows.'''
+    position = text.find('<row', start, end)
+    while position != -1:
+        tag_end = text.index('>', position) + 1
+        if text[position + 4] in ' \t\r\n/>':
+            yield position, tag_end
+        position = text.find('<row', tag_end, end)
+
+def _patch_sheet(text, updates, styles, stylesheet):
+    '''Worksheet text with the updated cells changed. Returns it and the refs of the cells that lost a formula.
+
+    Rows without an update are copied as they are, only the start tags of the rows before the last updated one are read. Rows
+    missing from the sheet are added in order.
+    '''
+    # Updates by the 1-based row number of the row elements.
+    by_row = {}
+    for (row, col), (value, style_key) in updates.items():
+        by_row.setdefault(row + 1, {})[col] = (value, style_key)
+    data_start = text.find('<sheetData')
+    if data_start == -1:
+        raise BadFileFormat('xlsx worksheet without sheetData.')
+    data_tag_end = text.index('>', data_start) + 1
+    pending = sorted(by_row)
+    formulas = set()
+    if text[data_tag_end - 2] == '/':
+        rows = ''.join(_row(None, number, by_row[number], styles, stylesheet, formulas) for number in pending)
+        return _patch_dimension('%s<sheetData>%s</sheetData>%s' % (text[:data_start], rows, text[data_tag_end:]), updates), formulas
+    data_end = text.rindex('</sheetData>')
+    pieces, position, number = [], 0, 0
+    for row_start, tag_end in _row_tags(text, data_tag_end, data_end):
+        if not pending:
+            break
+        found = _ROW_NUMBER.search(text, row_start, tag_end)
+        number = int(found.group(1)) if found else number + 1
+        if pending[0] > number:
+            continue
+        pieces.append(text[position:row_start])
+        while pending and pending[0] < number:
+            missing = pending.pop(0)
+            pieces.append(_row(None, missing, by_row[missing], styles, stylesheet, formulas))
+        row_end = tag_end if text[tag_end - 2] == '/' else text.index('</row>', tag_end) + len('</row>')
+        row = text[row_start:row_end]
+        if pending and pending[0] == number:
+            if found is None:
+                row = _set_attribute(text[row_start:tag_end], 'r', number) + text[tag_end:row_end]
+            row = _row(row, number, by_row[pending.pop(0)], styles, stylesheet, formulas)
+        pieces.append(row)
+        position = row_end
+    pieces.append(text[position:data_end])
+    pieces.extend(_row(None, number, by_row[number], styles, stylesheet, formulas) for number in pending)
+    pieces.append(text[data_end:])
+    return _patch_dimension(''.join(pieces), updates), formulas
+
+def _patch_dimension(text, updates):
+    '''Worksheet text with its used range grown to cover the updated cells.'''
+    dimension = _DIMENSION.search(text, 0, text.find('<sheetData'))
+    if dimension is None or not updates:
+        return text
+    last_letters, last_row = dimension.group(3) or dimension.group(1), dimension.group(4) or dimension.group(2)
+    last_col = max([column_index(last_letters)] + [col for _, col in updates])
+    last_row = max([int(last_row)] + [row + 1 for row, _ in updates])
+    reference = '<dimension ref="%s%s:%s%d"' % (dimension.group(1), dimension.group(2), column_letters(last_col), last_row)
+    return text[:dimension.start()] + reference + text[dimension.end():]
+
+def _patch_calc_chain(text, sheet_id, references):
+    '''Calculation chain without the cells of the sheet that lost their formula. Every cell left gets its sheet id, which is
+    otherwise implied by the cell before it.'''
+    pieces, position, current = [], 0, None
+    for match in _CALC_CELL.finditer(text):
+        cell = match.group(0)
+        sheet = _CALC_SHEET.search(cell)
+        current = sheet.group(1) if sheet else current
+        pieces.append(text[position:match.start()])
+        reference = re.search(r'\sr="([^"]*)"', cell)
+        if not (current == sheet_id and reference and reference.group(1) in references):
+            pieces.append(_set_attribute(cell, 'i', current) if current is not None else cell)
+        position = match.end()
+    pieces.append(text[position:])
+    return ''.join(pieces)
+
+def _part_path(base, target):
+    '''Path in the zip of a relationship target, relative to the part at base.'''
+    if target.startswith('/'):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(posixpath.dirname(base), target))
+
+def _relationships(archive, part):
+    '''{id: (type, path)} of the relationships of a part.'''
+    rels_path = posixpath.join(posixpath.dirname(part), '_rels', posixpath.basename(part) + '.rels')
+    rels = ElementTree.fromstring(archive.read(rels_path))
+    return dict((rel.get('Id'), (rel.get('Type'), _part_path(part, rel.get('Target'))))
+                for rel in rels.findall('{%s}Relationship' % __PACKAGE_RELATIONSHIPS_NS__))
+
+def _parts(archive, sheet_name=None):
+    '''Paths of the workbook's sheet named sheet_name (the first sheet when None), its stylesheet and calculation chain (None when
+    missing) and the sheet's id. Raises IndexError when the workbook has no such sheet.'''
+    workbook_path = [path for kind, path in _relationships(archive, '').values() if kind.endswith('/officeDocument')][0]
+    relationships = _relationships(archive, workbook_path)
+    book = ElementTree.fromstring(archive.read(workbook_path))
+    sheets = book.findall('{%s}sheets/{%s}sheet' % (__MAIN_NS__, __MAIN_NS__))
+    sheet = [sheet for sheet in sheets if sheet_name is None or sheet.get('name') == sheet_name][0]
+    by_type = dict((kind.rsplit('/', 1)[-1], path) for kind, path in relationships.values())
+    return (relationships[sheet.get('{%s}id' % __RELATIONSHIPS_NS__)][1], by_type.get('styles'), by_type.get('calcChain'),
+            sheet.get('sheetId'))
+
+def _write_member(target, info, data):
+    '''Adds a zip member with the name, date, attributes and compression of a member of the source document.'''
+    member = zipfile.ZipInfo(info.filename, info.date_time)
+    member.compress_type = info.compress_type
+    member.external_attr = info.external_attr
+    target.writestr(member, data)
+
+def _compressed(archive, info):
+    '''Bytes of a zip member as stored, without decompressing them.'''
+    archive.fp.seek(info.header_offset)
+    header = struct.unpack(zipfile.structFileHeader, archive.fp.read(zipfile.sizeFileHeader))
+    archive.fp.seek(header[zipfile._FH_FILENAME_LENGTH] + header[zipfile._FH_EXTRA_FIELD_LENGTH], 1)
+    return archive.fp.read(info.compress_size)
+
+def _copy_member(target, source, info):
+    '''Adds a member of the source document as it is stored, with its CRC and sizes, without compressing it again.'''
+    member = copy.copy(info)
+    # The CRC and sizes go in the local header, there is no data descriptor after the bytes.
+    member.flag_bits &= ~0x08
+    member.header_offset = target.fp.tell()
+    data = _compressed(source, info)
+    target.fp.write(member.FileHeader())
+    target.fp.write(data)
+    target.filelist.append(member)
+    target.NameToInfo[member.filename] = member
+    # The central directory is only written on close for a modified archive.
+    target._didModify = True
+
+def patch_workbook(data, cell_updates, styles, sheet_name=None):
+    '''Writes cells into the sheet named sheet_name of an xlsx document, the first sheet when None. Returns the new document bytes.
+
+    cell_updates - ((row, col), value, style key) of every cell to write, 0-based. A None value keeps the cell's value, a None style
+    its style. Later updates of a cell win. Text is written as inline strings, so the shared strings are left as they are.
+    styles - {style key: style} of the styles of the updates, see _Stylesheet.
+    Raises BadFileFormat for a document that is not an xlsx document or has no such sheet.
+    '''
+    updates = {}
+    for (row, col), value, style_key in cell_updates:
+        previous_value, previous_style = updates.get((row, col), (None, None))
+        updates[(row, col)] = (previous_value if value is None else value, previous_style if style_key is None else style_key)
+    try:
+        source = zipfile.ZipFile(StringIO.StringIO(data))
+        sheet_path, styles_path, calc_chain_path, sheet_id = _parts(source, sheet_name)
+    except (zipfile.BadZipfile, KeyError, IndexError, ElementTree.ParseError) as error:
+        raise BadFileFormat('Not an xlsx document: %s' % error)
+    stylesheet = _Stylesheet(source.read(styles_path))
+    sheet, formulas = _patch_sheet(source.read(sheet_path), updates, styles, stylesheet)
+    patched = {sheet_path: sheet, styles_path: stylesheet.getvalue()}
+    if formulas and calc_chain_path:
+        patched[calc_chain_path] = _patch_calc_chain(source.read(calc_chain_path), sheet_id, formulas)
+    output_stream = StringIO.StringIO()
+    target = zipfile.ZipFile(output_stream, 'w')
+    for info in source.infolist():
+        if info.filename in patched:
+            _write_member(target, info, patched[info.filename])
+        else:
+            _copy_member(target, source, info)
+    target.close()
+    return output_stream.getvalue()
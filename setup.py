@@ -45,7 +45,7 @@ setup(
         'Development Status :: 3 - Alpha',
         'Programming Language :: Python :: 2.7'
     ],
-    packages=find_packages(exclude=['contrib', 'docs', 'test*']),
+    packages=find_packages(exclude=['benchmarks', 'contrib', 'docs', 'test*']),
     install_requires=requirements,
     entry_points={
         'console_scripts': [
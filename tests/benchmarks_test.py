@@ -0,0 +1,50 @@
+import json
+import unittest
+
+from benchmarks import generators, suite
+from daedalus.validation.tape_validation import TapeValidation
+from daedalus.valuation import valuation
+from daedalus.xlstransform import transforms
+
+class GeneratorsTest(unittest.TestCase):
+    def test_tape_workbook_valid(self):
+        tape = TapeValidation(generators.tape_workbook(20))
+        self.assertEqual(tape._check_type(), [])
+        self.assertEqual(tape._calculate_property_count(), 20)
+        self.assertEqual(len(tape.validators), len(generators.__TAPE_COLUMNS__))
+
+    def test_tape_workbook_invalid_fraction(self):
+        tape = TapeValidation(generators.tape_workbook(20, invalid_fraction=1.0))
+        self.assertEqual(len(tape._check_type()), 20)
+
+    def test_tape_workbook_seed(self):
+        self.assertEqual(list(generators.tape_rows(5, seed=1)), list(generators.tape_rows(5, seed=1)))
+        self.assertNotEqual(list(generators.tape_rows(5, seed=1)), list(generators.tape_rows(5, seed=2)))
+
+    def test_valuation_workbook(self):
+        data = json.loads(transforms.excel_to_json(generators.valuation_workbook(10)))
+        self.assertEqual([sheet['name'] for sheet in data['sheets']], ['Deal', 'Data'])
+        self.assertEqual(len(data['sheets'][1]['rows']), 10)
+        self.assertIn('Total IRR', json.loads(valuation.valuate(data)))
+
+class SuiteTest(unittest.TestCase):
+    def test_run_case(self):
+        result = suite.run_case('valuate_numpy', 10, repeat=1)
+        self.assertEqual(result['rows'], 10)
+        self.assertGreater(result['seconds'], 0)
+        self.assertGreater(result['peak_rss_mb'], 0)
+        self.assertEqual(sorted(result['stages'].keys()), ['aggregate', 'encode', 'matrix_build', 'parse'])
+
+    def test_compare(self):
+        baseline = {'results': {'valuate': {'1000': {'seconds': 1.0}, '10000': {'error': 'NameError'}}}}
+        results = {'valuate': {'1000': {'seconds': 1.2}, '10000': {'seconds': 1.0}}, 'excel_to_json': {'1000': {'seconds': 1.0}}}
+        self.assertEqual(suite.compare(results, baseline), [('valuate', 1000, 1.0, 1.2)])
+        self.assertEqual(suite.compare(results, baseline, threshold=0.5), [])
+
+    def test_report(self):
+        results = {'valuate': {'1000': {'seconds': 0.5, 'rows_per_second': 2000.0, 'peak_rss_mb': 100.0, 'peak_growth_mb': 1.0},
+                               '10': {'rows': 10, 'error': 'NameError: foo'}}}
+        lines = suite.report(results).splitlines()
+        self.assertEqual(len(lines), 3)
+        self.assertIn('NameError: foo', lines[1])
+        self.assertIn('2000.0', lines[2])
@@ -0,0 +1,58 @@
+import daedalus.exceptions
+import json
+import numpy
+import unittest
+
+from daedalus.valuation import break_even, cash_flow, valuation, vectorized
+from daedalus.xlstransform import transforms
+from utils import valuation_workbook_two
+
+class GoalSeekTest(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+        self.parameters = valuation._portfolio_parameters(self.data)
+
+    def _offer_columns(self, deal_value):
+        total_value = float(self.parameters['total_current_valuation'])
+        return vectorized.offer_columns([numpy.nan], total_value, deal_value,
+                                        float(self.parameters['total_monthly_rents']) * 12 * float(self.parameters['assumed_occupancy']),
+                                        total_value * float(self.parameters['baseline_to_valuation']),
+                                        float(self.parameters['operating_income_percent']), float(self.parameters['target_irr']),
+                                        3.0, -0.035, 1.0141)
+
+    def test_surplus(self):
+        deal_value = break_even.goal_seek([self.data], target='surplus')[0]
+        self.assertAlmostEqual(self._offer_columns(deal_value)['Surplus or Deficit'][0], 0.0)
+
+    def test_total_irr(self):
+        self.data['sheets'][0]['rows'][0][4] = 0.02
+        deal_value = break_even.goal_seek([self.data], target='total_irr')[0]
+        self.assertAlmostEqual(self._offer_columns(deal_value)['Total IRR'][0], 0.02)
+
+    def test_cash_flow_irr(self):
+        deal_value = break_even.goal_seek([self.data], target='cash_flow_irr', holding_period=7)[0]
+        annual_rents = float(self.parameters['total_monthly_rents']) * 12 * float(self.parameters['assumed_occupancy'])
+        flows = cash_flow.cash_flows([deal_value], annual_rents, float(self.parameters['operating_income_percent']),
+                                     float(self.parameters['total_current_valuation']), 1.0141, holding_period=7)
+        rates, _ = cash_flow.solve_irr(flows)
+        self.assertAlmostEqual(rates[0], 0.12)
+
+    def test_unreachable(self):
+        # The rule of thumb IRR can't reach a target below its cost factor at any positive price.
+        self.data['sheets'][0]['rows'][0][4] = -0.05
+        self.assertEqual(break_even.goal_seek([self.data], target='surplus'), [None])
+
+    def test_batch(self):
+        other = json.loads(transforms.transform(valuation_workbook_two()))
+        other['sheets'][0]['rows'][0][4] = 0.06
+        batch = break_even.goal_seek([self.data, other])
+        self.assertEqual(batch[0], break_even.goal_seek([self.data])[0])
+        self.assertEqual(batch[1], break_even.goal_seek([other])[0])
+        self.assertGreater(batch[1], batch[0])
+
+    def test_empty(self):
+        self.assertEqual(break_even.goal_seek([]), [])
+
+    def test_unknown_target(self):
+        with self.assertRaises(daedalus.exceptions.BadGoal):
+            break_even.solve_offers([self.parameters], target='world_peace')
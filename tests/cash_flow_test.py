@@ -0,0 +1,43 @@
+import numpy
+import unittest
+
+from daedalus.valuation import cash_flow
+
+class CashFlowsTest(unittest.TestCase):
+    def test_good(self):
+        result = cash_flow.cash_flows([100.0, 120.0], 10.0, 0.5, 100.0, 1.1, holding_period=2)
+        numpy.testing.assert_allclose(result, [[-100.0, 5.0, 5.5 + 121.0], [-120.0, 5.0, 5.5 + 121.0]])
+
+    def test_bad_holding_period(self):
+        with self.assertRaises(AssertionError):
+            cash_flow.cash_flows([100.0], 10.0, 0.5, 100.0, 1.1, holding_period=0)
+
+class SolveIrrTest(unittest.TestCase):
+    def test_single_period(self):
+        rates, diagnostics = cash_flow.solve_irr([[-100.0, 110.0], [-100.0, 90.0]])
+        numpy.testing.assert_allclose(rates, [0.1, -0.1])
+        self.assertTrue(diagnostics['converged'].all())
+
+    def test_bond(self):
+        # A bond bought at par returns its coupon.
+        rates, _ = cash_flow.solve_irr([[-1000.0, 50.0, 50.0, 50.0, 1050.0]])
+        self.assertAlmostEqual(rates[0], 0.05)
+
+    def test_matches_npv(self):
+        flows = cash_flow.cash_flows(numpy.linspace(2e6, 4e6, 33), 100000.0, 0.55, 3e6, 1.0141, holding_period=7)
+        rates, diagnostics = cash_flow.solve_irr(flows)
+        self.assertTrue(diagnostics['converged'].all())
+        npv, _ = cash_flow._npv(flows, rates)
+        numpy.testing.assert_allclose(npv, 0.0, atol=1e-3)
+        self.assertTrue((numpy.diff(rates) < 0).all())
+
+    def test_no_root(self):
+        rates, diagnostics = cash_flow.solve_irr([[100.0, 10.0], [-100.0, 110.0]])
+        self.assertTrue(numpy.isnan(rates[0]))
+        self.assertFalse(diagnostics['converged'][0])
+        self.assertTrue(diagnostics['converged'][1])
+
+    def test_iterations_reported(self):
+        _, diagnostics = cash_flow.solve_irr([[-100.0, 110.0]])
+        self.assertGreater(diagnostics['iterations'][0], 0)
+        self.assertLess(diagnostics['iterations'][0], cash_flow.__MAX_ITERATIONS__)
@@ -0,0 +1,148 @@
+import daedalus.exceptions
+import unittest
+
+from benchmarks import generators
+from daedalus.validation import columnar, plan
+from daedalus.validation.tape_validation import TapeValidation
+from mock import patch
+from utils import validation_valid_excel, validation_invalid_type_excel, validation_invalid_required_excel
+
+class ColumnarEngineTest(unittest.TestCase):
+    def assert_engines_agree(self, tape):
+        rows, columnar_problems = TapeValidation(tape, 'rows'), TapeValidation(tape, 'columnar')
+        self.assertEqual(columnar_problems._check_type(), rows._check_type())
+
+    def test_fixtures(self):
+        for tape in [validation_valid_excel(), validation_invalid_type_excel(), validation_invalid_required_excel()]:
+            self.assert_engines_agree(tape)
+
+    def test_synthetic(self):
+        self.assert_engines_agree(generators.tape_workbook(300, seed=4, invalid_fraction=0.3))
+
+    def test_unknown_engine(self):
+        with self.assertRaises(daedalus.exceptions.UnknownEngine):
+            TapeValidation(validation_valid_excel(), 'abacus')
+
+class CheckColumnsTest(unittest.TestCase):
+    def setUp(self):
+        self.plan = plan.ValidationPlan({'base_column': 1}, [u'YEAR', u'ZIP_CODE', u'PERCENTAGE', u'INTEGER', u'US_STATE'], [1, 1, 1, 0, 1])
+        self.rows = [
+            [u'header', u'', u'', u'', u'', u''],
+            [1.0, 2001.0, 94105.0, 0.5, u'', u'CA'],
+            [3.0, 2001.5, 1234.0, 101.0, float('nan'), u'ca'],
+            [u'x', 999.0, u'94105-1234', u'8%', u'4', u''],
+            [4.0, u'2001', 94105.5, u'', 2.0, u'XX']
+        ]
+
+    def expected(self):
+        problems = []
+        for row in range(1, len(self.rows)):
+            cells = self.rows[row]
+            try:
+                if int(cells[0]) != row:
+                    problems.append(((row, 0), 'Invalid numbering.'))
+            except ValueError:
+                pass
+            for column, validator, mandatory in self.plan.columns:
+                if cells[column] == u'':
+                    if mandatory:
+                        problems.append(((row, column), 'Required cell is empty.'))
+                    continue
+                result, error = validator(cells[column])
+                if not result:
+                    problems.append(((row, column), error))
+        return problems
+
+    def test_edge_values(self):
+        result = columnar.check_columns(self.rows, self.plan, 1, 0)
+        self.assertEqual(result, self.expected())
+        self.assertEqual(len(result), 10)
+        self.assertTrue(all(type(row) is int for (row, _), _ in result))
+
+    def test_offsets(self):
+        result = columnar.check_columns(self.rows, self.plan, 1, 0, row_offset=2, col_offset=1)
+        self.assertEqual(result[0], ((4, 0), 'Invalid numbering.'))
+
+    def test_uneven_rows(self):
+        self.rows[2] = self.rows[2] + [u'extra']
+        self.assertEqual(columnar.check_columns(self.rows, self.plan, 1, 0), self.expected())
+        del self.rows[3][-1]
+        with self.assertRaises(IndexError):
+            columnar.check_columns(self.rows, self.plan, 1, 0)
+
+    def test_no_data(self):
+        self.assertEqual(columnar.check_columns(self.rows[:1], self.plan, 1, 0), [])
+
+class ParallelTest(unittest.TestCase):
+    def setUp(self):
+        self.tape = generators.tape_workbook(250, seed=5, invalid_fraction=0.3)
+        self.expected = TapeValidation(self.tape, 'rows')._check_type()
+
+    def test_chunks_match(self):
+        for chunk_size in [1, 7, 100, 250, 1000]:
+            validator = TapeValidation(self.tape, processes=3, chunk_size=chunk_size)
+            self.assertEqual(validator._check_type(), self.expected)
+
+    def test_chunk_numbering(self):
+        tape_plan = plan.ValidationPlan({'base_column': 1}, [u'INTEGER'], [1])
+        rows = [[u'header', u'']] + [[float(number), 1.0] for number in [1, 2, 4, 4, 5, 7]]
+        self.assertEqual(columnar.check_columns_parallel(rows, tape_plan, 1, 0, processes=2, chunk_size=2),
+                         [((3, 0), 'Invalid numbering.'), ((6, 0), 'Invalid numbering.')])
+        self.assertEqual(columnar.__SHARED__, {})
+
+    def test_invalid_settings(self):
+        rows = [[u'header', u''], [1.0, 1.0]]
+        tape_plan = plan.ValidationPlan({'base_column': 1}, [u'INTEGER'], [1])
+        for processes, chunk_size in [(0, 10), (2, 0), (-1, -1)]:
+            with self.assertRaises(daedalus.exceptions.DaedalusError):
+                columnar.check_columns_parallel(rows, tape_plan, 1, 0, processes=processes, chunk_size=chunk_size)
+
+    def test_defaults_from_config(self):
+        with patch('daedalus.config.VALIDATION_PROCESSES', 4), patch('daedalus.config.VALIDATION_CHUNK_SIZE', 10):
+            validator = TapeValidation(self.tape)
+        self.assertEqual((validator.processes, validator.chunk_size), (4, 10))
+
+class TotalsTest(unittest.TestCase):
+    def setUp(self):
+        self.plan = plan.ValidationPlan({'base_column': 1, 'unit_count_column': 1, 'leased_count_column': 2}, [u'INTEGER', u'LEASING_STATUS'],
+                                        [1, 1])
+        self.rows = [[u'header', u'', u''], [1.0, 2.0, u'Leased'], [2.0, 3.0, u'Vacant - Advert'], [3.0, 1.0, u'leased - m2m']]
+
+    def totals(self, rows, **kwargs):
+        totals = {}
+        columnar.check_columns_parallel(rows, self.plan, 1, 0, totals=totals, **kwargs)
+        return totals
+
+    def test_counts(self):
+        self.assertEqual(self.totals(self.rows), {'property_count': 3, 'unit_count': 6, 'leased_count': 2})
+        self.assertEqual(self.totals(self.rows[:1]), {'property_count': 0, 'unit_count': 0, 'leased_count': 0})
+
+    def test_invalid_cells(self):
+        self.rows[2][1:] = [u'three', u'']
+        self.assertEqual(self.totals(self.rows), {'property_count': 3, 'unit_count': None, 'leased_count': None})
+
+    def test_short_rows(self):
+        self.plan = plan.ValidationPlan(self.plan.metadata, [u'INTEGER'], [1])
+        self.rows[3] = self.rows[3][:2]
+        self.assertEqual(self.totals(self.rows), {'property_count': 3, 'unit_count': 6, 'leased_count': None})
+
+    def test_chunks(self):
+        rows = self.rows + [[4.0, 1.0, u'LEASED']] * 5
+        for chunk_size in [1, 2, 3]:
+            self.assertEqual(self.totals(rows, processes=2, chunk_size=chunk_size), self.totals(rows))
+
+    def test_merge(self):
+        self.assertEqual(columnar.merge_totals([{'property_count': 2, 'unit_count': 3, 'leased_count': None},
+                                                {'property_count': 1, 'unit_count': 1, 'leased_count': 1}]),
+                         {'property_count': 3, 'unit_count': 4, 'leased_count': None})
+
+    def test_same_as_calculate(self):
+        for tape in [validation_valid_excel(), validation_invalid_required_excel(), generators.tape_workbook(100, seed=1, invalid_fraction=0.5)]:
+            reference = TapeValidation(tape, 'rows')
+            reference._read_excel_metadata()
+            expected = {'property_count': reference._calculate_property_count(), 'unit_count': reference._calculate_unit_count(),
+                        'leased_count': reference._calculate_leased_count()}
+            for engine in ['rows', 'columnar', 'streaming']:
+                validator = TapeValidation(tape, engine)
+                validator._check_type()
+                self.assertEqual(validator.totals, expected)
@@ -4,6 +4,7 @@ import kombu
 import mock
 import unittest
 
+from daedalus.common import timing
 from daedalus.queueing import queue_manager
 from daedalus.queueing.mixins import ConsumerMixin
 
@@ -54,6 +55,33 @@ class ConsumerMixinTest(unittest.TestCase):
                             publish_mock.assert_called_with('I am YAML', serializer='yaml', routing_key='response')
                             message_mock.ack.assert_called_with()
 
+    @mock.patch('kombu.message.Message', auto_spec=True)
+    def test_handle_message_stage_timings(self, message_mock):
+        body = '''!RequestMessage
+        _headers:
+          job_id: 4
+          callback_url: http://localhost
+        '''
+        request_message_mock = daedalus.queueing.messages.RequestMessage.load(body)
+        response_message_mock = daedalus.queueing.messages.ResponseMessage()
+
+        def process_task(request_message, response_message):
+            with timing.stage('parse'):
+                pass
+            with timing.stage('encode'):
+                pass
+
+        with mock.patch.object(self.consumer, 'process_task', side_effect=process_task):
+            with mock.patch.object(self.consumer.producer, 'publish'):
+                with mock.patch('daedalus.queueing.messages.RequestMessage.load', return_value=request_message_mock):
+                    with mock.patch('daedalus.queueing.messages.ResponseMessage.from_request_message', return_value=response_message_mock):
+                        with mock.patch.object(response_message_mock, 'yamlize', return_value='I am YAML'):
+                            with mock.patch('daedalus.common.log_manager.info') as info_mock:
+                                self.consumer.handle_message(body, message_mock)
+        self.assertRegexpMatches(response_message_mock.get_header('stage_timings'), r'^parse;dur=[\d.]+, encode;dur=[\d.]+$')
+        logged = [call[0][0] for call in info_mock.call_args_list if call[0][0].startswith('Stage timings: ')]
+        self.assertEqual(sorted(json.loads(logged[0][len('Stage timings: '):]).keys()), ['encode', 'parse'])
+
     @mock.patch('kombu.message.Message', auto_spec=True)
     def test_handle_message_error(self, message_mock):
         body = '''!RequestMessage
@@ -0,0 +1,142 @@
+import json
+import StringIO
+import unittest
+
+import openpyxl
+
+from benchmarks import generators
+from daedalus.validation import cross_row, revision, zip_states
+from daedalus.validation.tape_validation import TapeValidation
+
+class ZipStatesTest(unittest.TestCase):
+    def test_zip_state(self):
+        for zip_code, state in [('94105', 'CA'), ('10001', 'NY'), ('02134', 'MA'), ('00601', 'PR'), ('20500', 'DC'), ('73301', 'TX'),
+                                ('88510', 'TX'), ('99501', 'AK'), ('96799', 'AS'), ('96950', 'MP'), ('96910', 'GU')]:
+            self.assertEqual(zip_states.zip_state(zip_code), state)
+
+    def test_unassigned(self):
+        self.assertEqual(zip_states.zip_state('00100'), None)
+        self.assertEqual(zip_states.zip_state('09012'), None)
+
+    def test_table(self):
+        self.assertEqual(len(zip_states.__ZIP3_TABLE__), 1000)
+        ranges = sorted(zip_states.__ZIP3_RANGES__)
+        for (_, last, _), (first, _, _) in zip(ranges, ranges[1:]):
+            self.assertTrue(last < first)
+
+class NormalizationTest(unittest.TestCase):
+    def test_address_key(self):
+        self.assertEqual(cross_row.address_key(u'12 Main Street'), cross_row.address_key(u' 12  MAIN st. '))
+        self.assertEqual(cross_row.address_key(u'56C Portland Avenue, Unit 4'), u'56C PORTLAND AVE UNIT 4')
+        self.assertNotEqual(cross_row.address_key(u'12 Main Street'), cross_row.address_key(u'12 Main Road'))
+        self.assertEqual(cross_row.address_key(u' - '), None)
+        self.assertEqual(cross_row.address_key(12.0), None)
+
+    def test_zip_code(self):
+        self.assertEqual(cross_row.zip_code(2134.0), '02134')
+        self.assertEqual(cross_row.zip_code(u'75932-4562'), '75932')
+        self.assertEqual(cross_row.zip_code(u'75932.0'), '75932')
+        self.assertEqual(cross_row.zip_code(u'ABCDE'), None)
+        self.assertEqual(cross_row.zip_code(12345.5), None)
+        self.assertEqual(cross_row.zip_code(u''), None)
+
+    def test_state_code(self):
+        self.assertEqual(cross_row.state_code(u'ca'), 'CA')
+        self.assertEqual(cross_row.state_code(u'New York'), 'NY')
+        self.assertEqual(cross_row.state_code(u'XX'), None)
+
+class Plan(object):
+    columns = [(1, None, True), (3, None, True), (6, None, True), (7, None, True)]
+    column_types = [u'INTEGER', u'ADDRESS', u'US_STATE', u'ZIP_CODE']
+
+class CrossRowRulesTest(unittest.TestCase):
+    def setUp(self):
+        self.rules = cross_row.CrossRowRules(Plan(), row_offset=2)
+
+    def row(self, identifier, address, state, zip_code):
+        return [u'', identifier, 1.0, address, u'Springfield', u'Sangamon', state, zip_code]
+
+    def test_valid(self):
+        self.assertEqual(self.rules.check(5, self.row(1.0, u'1 Main St', u'CA', 94105.0)), [])
+        self.assertEqual(self.rules.check(6, self.row(2.0, u'2 Main St', u'CA', 94105.0)), [])
+
+    def test_duplicate_identifier(self):
+        # Left to the numbering of the rows.
+        self.rules.check(5, self.row(1.0, u'1 Main St', u'CA', 94105.0))
+        self.assertEqual(self.rules.check(6, self.row(1.0, u'2 Main St', u'CA', 94105.0)), [])
+
+    def test_duplicate_property(self):
+        self.rules.check(5, self.row(1.0, u'1 Main Street', u'CA', 94105.0))
+        self.assertEqual(self.rules.check(6, self.row(2.0, u'1 MAIN ST', u'CA', u'94105-1234')), [((8, 3), 'Duplicate property of row 7.')])
+        # The same address in another ZIP code is another property.
+        self.assertEqual(self.rules.check(7, self.row(3.0, u'1 Main Street', u'CA', 94110.0)), [])
+
+    def test_no_duplicates(self):
+        rules = cross_row.CrossRowRules(Plan(), row_offset=2, duplicates=False)
+        self.assertEqual(rules.check(5, self.row(1.0, u'1 Main St', u'CA', 94105.0)), [])
+        self.assertEqual(rules.check(6, self.row(2.0, u'1 Main St', u'TX', 94105.0)), [((8, 7), 'ZIP code 94105 is in CA, not TX.')])
+
+    def test_zip_state(self):
+        self.assertEqual(self.rules.check(5, self.row(1.0, u'1 Main St', u'Texas', 94105.0)), [((7, 7), 'ZIP code 94105 is in CA, not TX.')])
+        # Invalid cells are left to their validators.
+        self.assertEqual(self.rules.check(6, self.row(2.0, u'2 Main St', u'XX', 94105.0)), [])
+        self.assertEqual(self.rules.check(7, self.row(3.0, u'3 Main St', u'TX', u'ABCDE')), [])
+
+    def test_missing_columns(self):
+        class ShortPlan(object):
+            columns = [(1, None, True), (7, None, True)]
+            column_types = [u'INTEGER', u'ZIP_CODE']
+        rules = cross_row.CrossRowRules(ShortPlan())
+        self.assertEqual(rules.check(5, self.row(1.0, u'1 Main St', u'TX', 94105.0)), [])
+        self.assertEqual(rules.check(6, self.row(2.0, u'1 Main St', u'TX', 94105.0)), [])
+
+    def test_merge(self):
+        problems = [((7, 3), 'a'), ((7, 5), 'b'), ((9, 1), 'c')]
+        self.assertEqual(cross_row.merge(problems, [((7, 1), 'x'), ((8, 1), 'y')]),
+                         [((7, 3), 'a'), ((7, 5), 'b'), ((7, 1), 'x'), ((8, 1), 'y'), ((9, 1), 'c')])
+
+def tape_with_duplicates(rows):
+    '''Synthetic tape with its 10th property copied over the 20th and its 40th state wrong.'''
+    book = openpyxl.load_workbook(StringIO.StringIO(generators.tape_workbook(rows)))
+    sheet = book[u'Portfolio']
+    base = generators.__TAPE_BASE_ROW__
+    for column in range(3, len(generators.__TAPE_COLUMNS__) + 2):
+        sheet.cell(base + 19, column).value = sheet.cell(base + 9, column).value
+    sheet.cell(base + 39, 7).value = u'CA' if sheet.cell(base + 39, 7).value != u'CA' else u'TX'
+    output_stream = StringIO.StringIO()
+    book.save(output_stream)
+    return output_stream.getvalue()
+
+class TapeCrossRowTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tape = tape_with_duplicates(1200)
+
+    def test_engines(self):
+        problems = TapeValidation(self.tape, 'rows')._check_type()
+        errors = [error for _, error in problems]
+        self.assertEqual(len([error for error in errors if error.startswith('Duplicate')]), 1)
+        self.assertIn('Duplicate property of row %d.' % (generators.__TAPE_BASE_ROW__ + 9), errors)
+        self.assertEqual(len([error for error in errors if error.startswith('ZIP code')]), 1)
+        for engine in ['columnar', 'streaming']:
+            self.assertEqual(TapeValidation(self.tape, engine)._check_type(), problems)
+        self.assertEqual(TapeValidation(self.tape, processes=2, chunk_size=500)._check_type(), problems)
+        self.assertEqual(TapeValidation(self.tape, max_errors=len(problems) + 1)._check_type(), problems)
+
+    def test_revision(self):
+        problems = TapeValidation(self.tape)._check_type()
+        try:
+            self.assertEqual(TapeValidation(self.tape, tape_id='cross-row')._check_type(), problems)
+            self.assertEqual(TapeValidation(self.tape, tape_id='cross-row')._check_type(), problems)
+        finally:
+            revision.__REVISIONS__.clear()
+
+    def test_sample(self):
+        # Each sampled row is checked on its own, duplicates can't be told from a sample.
+        result = json.loads(TapeValidation(self.tape).sample(1200))
+        errors = [error for _, _, error in result['errors']]
+        self.assertEqual(len([error for error in errors if error.startswith('ZIP code')]), 1)
+        self.assertFalse([error for error in errors if error.startswith('Duplicate')])
+
+    def test_generated_tapes_valid(self):
+        self.assertEqual(TapeValidation(generators.tape_workbook(500))._check_type(), [])
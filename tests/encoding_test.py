@@ -0,0 +1,59 @@
+import daedalus.exceptions
+import json
+import numpy
+import unittest
+
+from daedalus.valuation import encoding, valuation
+from daedalus.xlstransform import transforms
+from StringIO import StringIO
+from utils import valuation_workbook_two
+
+class EncodeTest(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+        self.offer_matrix = valuation._valuate_frame(self.data)
+
+    def test_json(self):
+        self.assertEqual(encoding.encode(self.offer_matrix), valuation.valuate(self.data))
+
+    def test_columnar(self):
+        result = json.loads(encoding.encode(self.offer_matrix, 'columnar'))
+        expected = json.loads(valuation.valuate(self.data))
+        self.assertEqual(result['columns'], list(self.offer_matrix.columns))
+        for column, values in zip(result['columns'], result['data']):
+            for row, value in enumerate(values):
+                if isinstance(value, float):
+                    self.assertAlmostEqual(value, expected[column][str(row)])
+                else:
+                    self.assertEqual(value, expected[column][str(row)])
+
+    def test_columnar_precision(self):
+        result = json.loads(encoding.encode(self.offer_matrix, 'columnar', precision=2))
+        gross_yield = result['data'][result['columns'].index('Gross Yield')]
+        self.assertEqual(gross_yield[0], 0.03)
+        self.assertIsNone(result['data'][result['columns'].index('Offer Over Valuation')][1])
+
+    def test_columnar_smaller(self):
+        self.assertLess(len(encoding.encode(self.offer_matrix, 'columnar')), len(encoding.encode(self.offer_matrix)))
+
+    def test_npy(self):
+        offer_matrix = valuation._valuate_frame(self.data, engine='numpy', cash_flow_irr=True)
+        result = numpy.load(StringIO(encoding.encode(offer_matrix, 'npy')))
+        self.assertEqual(list(result.dtype.names), list(offer_matrix.columns))
+        self.assertEqual(result['Offer Name'][1], 'Offer')
+        self.assertTrue(result['IRR Converged'].all())
+        numpy.testing.assert_array_equal(result['Deal Value'], offer_matrix['Deal Value'])
+
+    def test_unknown(self):
+        with self.assertRaises(daedalus.exceptions.BadFileFormat):
+            encoding.encode(self.offer_matrix, 'morse')
+
+class ContentTypeTest(unittest.TestCase):
+    def test_good(self):
+        self.assertEqual(encoding.content_type('json'), 'application/json')
+        self.assertEqual(encoding.content_type('columnar'), 'application/json')
+        self.assertEqual(encoding.content_type('npy'), 'application/octet-stream')
+
+    def test_unknown(self):
+        with self.assertRaises(daedalus.exceptions.BadFileFormat):
+            encoding.content_type('morse')
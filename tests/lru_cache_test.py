@@ -0,0 +1,77 @@
+import unittest
+
+from daedalus.common.lru_cache import LRUCache
+
+class LRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(2)
+        self.cache.put('a', 1)
+        self.cache.put('b', 2)
+
+    def test_get(self):
+        self.assertEqual(self.cache.get('a'), 1)
+        self.assertEqual(self.cache.get('b'), 2)
+
+    def test_get_miss(self):
+        self.assertIsNone(self.cache.get('c'))
+        self.assertEqual(self.cache.get('c', 'default'), 'default')
+
+    def test_evicts_least_recently_used(self):
+        self.cache.get('a')
+        self.cache.put('c', 3)
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertIn('c', self.cache)
+        self.assertEqual(len(self.cache), 2)
+
+    def test_put_existing(self):
+        self.cache.put('a', 10)
+        self.cache.put('c', 3)
+        self.assertEqual(self.cache.get('a'), 10)
+        self.assertNotIn('b', self.cache)
+
+    def test_clear(self):
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_bad_size(self):
+        with self.assertRaises(AssertionError):
+            LRUCache(0)
+
+class ByteBoundLRUCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.cache = LRUCache(None, max_bytes=10)
+        self.cache.put('a', 'aaaa')
+        self.cache.put('b', 'bbbb')
+
+    def test_total_bytes(self):
+        self.assertEqual(self.cache.total_bytes, 8)
+        self.cache.put('a', 'a')
+        self.assertEqual(self.cache.total_bytes, 5)
+
+    def test_evicts_past_max_bytes(self):
+        self.cache.get('a')
+        self.cache.put('c', 'cccc')
+        self.assertIn('a', self.cache)
+        self.assertNotIn('b', self.cache)
+        self.assertEqual(self.cache.total_bytes, 8)
+
+    def test_too_large(self):
+        self.cache.put('c', 'c' * 11)
+        self.assertEqual(len(self.cache), 0)
+        self.assertEqual(self.cache.total_bytes, 0)
+
+    def test_both_bounds(self):
+        cache = LRUCache(1, max_bytes=10)
+        cache.put('a', 'a')
+        cache.put('b', 'b')
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.total_bytes, 1)
+
+    def test_clear(self):
+        self.cache.clear()
+        self.assertEqual(self.cache.total_bytes, 0)
+
+    def test_no_bound(self):
+        with self.assertRaises(AssertionError):
+            LRUCache(None)
@@ -0,0 +1,69 @@
+import daedalus.exceptions
+import json
+import numpy
+import unittest
+
+from daedalus.valuation import monte_carlo, valuation
+from daedalus.xlstransform import transforms
+from utils import valuation_workbook_two
+
+class DrawTest(unittest.TestCase):
+    def setUp(self):
+        self.random_state = numpy.random.RandomState(0)
+
+    def test_fixed(self):
+        numpy.testing.assert_array_equal(monte_carlo._draw(self.random_state, ('fixed', 2.0), 3), [2.0, 2.0, 2.0])
+
+    def test_uniform(self):
+        result = monte_carlo._draw(self.random_state, ('uniform', 1.0, 2.0), 1000)
+        self.assertTrue(((result >= 1.0) & (result < 2.0)).all())
+
+    def test_triangular(self):
+        result = monte_carlo._draw(self.random_state, ('triangular', 0.5, 0.9, 1.0), 1000)
+        self.assertTrue(((result >= 0.5) & (result <= 1.0)).all())
+
+    def test_unknown(self):
+        with self.assertRaises(daedalus.exceptions.BadDistribution):
+            monte_carlo._draw(self.random_state, ('cauchy', 0.0), 10)
+
+class SimulateTest(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+
+    def test_good(self):
+        result = json.loads(monte_carlo.simulate(self.data, draws=25000, seed=3))
+        self.assertEqual(sorted(result.keys()), ['Mean', 'Offer Name', 'P10', 'P50', 'P90'])
+        self.assertEqual(len(result['P50']), 6)
+        for row in result['P50']:
+            self.assertLessEqual(result['P10'][row], result['P50'][row])
+            self.assertLessEqual(result['P50'][row], result['P90'][row])
+
+    def test_reproducible(self):
+        first = monte_carlo.simulate(self.data, draws=1000, seed=42)
+        second = monte_carlo.simulate(self.data, draws=1000, seed=42)
+        self.assertEqual(first, second)
+
+    def test_fixed_distributions_match_valuate(self):
+        fixed = {
+            'return_factor': ('fixed', 3.0),
+            'cost_factor': ('fixed', -0.035),
+            'hpa_factor': ('fixed', 1.0141)
+        }
+        result = json.loads(monte_carlo.simulate(self.data, draws=10, distributions=fixed, percentiles=(50,)))
+        offer_matrix = json.loads(valuation.valuate(self.data, engine='numpy'))
+        for row in result['P50']:
+            self.assertAlmostEqual(result['P50'][row], offer_matrix['Total IRR'][row])
+
+    def test_processes(self):
+        single = monte_carlo.simulate(self.data, draws=25000, seed=5)
+        pooled = monte_carlo.simulate(self.data, draws=25000, seed=5, processes=2)
+        self.assertEqual(single, pooled)
+
+    def test_invalid_draws_or_processes(self):
+        for draws, processes in [(0, 1), (10, 0), (-1, 1), ('10', 1)]:
+            with self.assertRaises(daedalus.exceptions.DaedalusError):
+                monte_carlo.simulate(self.data, draws=draws, processes=processes)
+
+    def test_unknown_assumption(self):
+        with self.assertRaises(daedalus.exceptions.BadDistribution):
+            monte_carlo.simulate(self.data, draws=10, distributions={'vacancy': ('fixed', 0.1)})
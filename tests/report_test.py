@@ -0,0 +1,73 @@
+import daedalus.exceptions
+import json
+import unittest
+
+from benchmarks import generators
+from daedalus.validation import report
+from daedalus.validation.tape_validation import TapeValidation, validate
+from mock import patch
+from utils import validation_valid_excel, validation_invalid_type_excel
+
+class ProblemIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.problems = [((24, 1), 'Invalid numbering.'), ((24, 7), 'Invalid date.'), ((26, 3), 'Required cell is empty.'),
+                         ((24, 9), 'Invalid date.')]
+        self.index = report.ProblemIndex(self.problems)
+
+    def test_order(self):
+        self.assertEqual(list(self.index), self.problems)
+        self.assertEqual(len(self.index), 4)
+        self.assertEqual(list(self.index.rows), [24, 26])
+
+    def test_rows(self):
+        self.assertEqual(self.index.rows[24], [(1, 'Invalid numbering.'), (7, 'Invalid date.'), (9, 'Invalid date.')])
+
+    def test_comments(self):
+        self.assertEqual(list(self.index.comments().items()),
+                         [(24, '1: Invalid numbering.; 7: Invalid date.; 9: Invalid date.'), (26, '3: Required cell is empty.')])
+
+    def test_counts(self):
+        self.assertEqual(self.index.counts({1: u'INTEGER', 3: u'CITY', 7: u'DATE', 9: u'DATE'}),
+                         {'NUMBERING': 1, 'REQUIRED': 1, u'DATE': 2})
+
+    def test_empty(self):
+        self.assertFalse(report.ProblemIndex())
+
+    def test_to_json(self):
+        totals = {'property_count': 3, 'unit_count': 5, 'leased_count': 'Error in leased fields.'}
+        result = json.loads(report.to_json(self.index, {7: u'DATE', 9: u'DATE'}, totals, {7: '%Y-%m-%d'}))
+        self.assertEqual(result, {'status': 'Invalid', 'stopped': False, 'error_rows': [24, 26],
+                                  'errors': [[24, 1, 'Invalid numbering.'], [24, 7, 'Invalid date.'], [26, 3, 'Required cell is empty.'],
+                                             [24, 9, 'Invalid date.']],
+                                  'error_counts': {'NUMBERING': 1, 'REQUIRED': 1, 'DATE': 2}, 'totals': totals,
+                                  'date_formats': {'7': '%Y-%m-%d'}})
+
+class ReportOutputTest(unittest.TestCase):
+    def test_report(self):
+        validation = TapeValidation(validation_invalid_type_excel())
+        result = json.loads(validation.run('report'))
+        problems = TapeValidation(validation_invalid_type_excel())._check_type()
+        self.assertEqual(result['status'], 'Invalid')
+        self.assertEqual(result['errors'], [[row, column, error] for (row, column), error in problems])
+        self.assertEqual(sum(result['error_counts'].values()), len(problems))
+        self.assertEqual(result['totals'], validation.totals)
+
+    def test_valid(self):
+        # The mock tapes all have states that don't match their ZIP codes.
+        tape = generators.tape_workbook(20)
+        validation = TapeValidation(tape)
+        validation._check_type()
+        result = json.loads(validate(tape, output_format='report'))
+        self.assertEqual((result['status'], result['errors'], result['error_counts']), ('Valid', [], {}))
+        self.assertEqual(result['totals'], validation.totals)
+        self.assertEqual(result['totals']['property_count'], 20)
+
+    def test_no_document_written(self):
+        validation = TapeValidation(generators.tape_workbook(20, invalid_fraction=0.5))
+        with patch.object(validation, '_write_to_excel') as write_mock:
+            validation.run('report')
+        self.assertFalse(write_mock.called)
+
+    def test_unknown_format(self):
+        with self.assertRaises(daedalus.exceptions.BadFileFormat):
+            TapeValidation(validation_valid_excel()).run('pdf')
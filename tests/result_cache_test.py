@@ -0,0 +1,104 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from mock import patch
+
+from daedalus.validation import result_cache
+
+class ResultKeyTest(unittest.TestCase):
+    def test_content(self):
+        self.assertEqual(result_cache.result_key('foo'), result_cache.result_key('foo'))
+        self.assertNotEqual(result_cache.result_key('foo'), result_cache.result_key('bar'))
+
+    def test_output_format(self):
+        self.assertNotEqual(result_cache.result_key('foo'), result_cache.result_key('foo', 'report'))
+
+    def test_version(self):
+        key = result_cache.result_key('foo')
+        with patch('daedalus.version.__version__', 'v9.9'):
+            self.assertNotEqual(result_cache.result_key('foo'), key)
+        with patch.object(result_cache, '__RULES_VERSION__', 99):
+            self.assertNotEqual(result_cache.result_key('foo'), key)
+
+class DiskCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.cache = result_cache.DiskCache(os.path.join(self.directory, 'results'), 100)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_get(self):
+        self.cache.put('a', 'aaaa')
+        self.assertEqual(self.cache.get('a'), 'aaaa')
+        self.assertEqual(self.cache.get('b', 'default'), 'default')
+
+    def test_survives_restart(self):
+        self.cache.put('a', 'aaaa')
+        cache = result_cache.DiskCache(self.cache.directory, 100)
+        self.assertEqual(cache.get('a'), 'aaaa')
+        cache.put('b', 'bb')
+        self.assertEqual(cache.total_bytes, 6)
+
+    def test_directory_made_on_first_put(self):
+        self.assertFalse(os.path.exists(self.cache.directory))
+        self.assertEqual(self.cache.get('a'), None)
+        self.cache.clear()
+        self.cache.put('a', 'aaaa')
+        self.assertEqual(os.listdir(self.cache.directory), ['a'])
+
+    def test_overwrite(self):
+        self.cache.put('a', 'a' * 40)
+        self.cache.put('a', 'a' * 40)
+        self.assertEqual(self.cache.total_bytes, 40)
+        self.cache.put('b', 'b' * 40)
+        self.assertEqual(self.cache.get('a'), 'a' * 40)
+
+    def test_evicts_least_recently_used(self):
+        for index, key in enumerate(['a', 'b', 'c']):
+            self.cache.put(key, key * 40)
+            os.utime(os.path.join(self.cache.directory, key), (index, index))
+        self.cache.put('d', 'd' * 40)
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(self.cache.get('b'), None)
+        self.assertEqual(self.cache.get('c'), 'c' * 40)
+        self.assertEqual(self.cache.get('d'), 'd' * 40)
+        self.assertEqual(self.cache.total_bytes, 80)
+
+    def test_clear(self):
+        self.cache.put('a', 'aaaa')
+        self.cache.clear()
+        self.assertEqual(self.cache.get('a'), None)
+        self.assertEqual(os.listdir(self.cache.directory), [])
+
+class ResultCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_memory(self):
+        cache = result_cache.ResultCache(1000)
+        self.assertEqual(cache.get('a'), None)
+        cache.put('a', 'output', {'date_formats': {9: '%Y-%m-%d'}})
+        self.assertEqual(cache.get('a'), ('output', {'date_formats': {9: '%Y-%m-%d'}}))
+
+    def test_disabled(self):
+        cache = result_cache.ResultCache(0, self.directory, 0)
+        cache.put('a', 'output', {})
+        self.assertEqual(cache.get('a'), None)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_disk_only(self):
+        cache = result_cache.ResultCache(0, self.directory, 1000)
+        cache.put('a', 'output', {})
+        self.assertEqual(cache.get('a'), ('output', {}))
+
+    def test_disk(self):
+        result_cache.ResultCache(1000, self.directory, 1000).put('a', 'output', {})
+        cache = result_cache.ResultCache(1000, self.directory, 1000)
+        self.assertEqual(cache.get('a'), ('output', {}))
+        self.assertIn('a', cache.memory)
@@ -0,0 +1,64 @@
+import unittest
+
+from daedalus.validation import revision
+from daedalus.validation.tape_validation import TapeValidation
+from mock import patch
+from utils import validation_valid_excel, validation_invalid_type_excel, validation_invalid_required_excel
+
+class RowHashTest(unittest.TestCase):
+    def test_trailing_empty_cells(self):
+        self.assertEqual(revision.row_hash([1.0, u'a', u'', u'']), revision.row_hash([1.0, u'a']))
+
+    def test_types(self):
+        self.assertNotEqual(revision.row_hash([1.0]), revision.row_hash([1]))
+        self.assertNotEqual(revision.row_hash([u'1']), revision.row_hash([1.0]))
+
+class RevisionTest(unittest.TestCase):
+    def test_update(self):
+        tape = revision.Revision('template')
+        tape.update(['a', 'b', 'c'], {'a': ([], 2, 1), 'b': ([(3, 'Bad.')], 3, 0), 'c': ([], None, 1)})
+        self.assertEqual(tape.totals(), {'property_count': 3, 'unit_count': None, 'leased_count': 2})
+        tape.update(['a', 'b', 'd'], {'d': ([], 4, None)})
+        self.assertEqual(tape.totals(), {'property_count': 3, 'unit_count': 9, 'leased_count': None})
+        self.assertEqual(sorted(tape.results), ['a', 'b', 'd'])
+        tape.update(['b', 'a'], {})
+        self.assertEqual(tape.totals(), {'property_count': 2, 'unit_count': 5, 'leased_count': 1})
+        self.assertEqual(sorted(tape.results), ['a', 'b'])
+
+class IncrementalValidationTest(unittest.TestCase):
+    def setUp(self):
+        revision.__REVISIONS__.clear()
+
+    def tearDown(self):
+        revision.__REVISIONS__.clear()
+
+    def assert_same_as_full(self, tape, engine):
+        full = TapeValidation(tape, engine)
+        problems = full._check_type()
+        incremental = TapeValidation(tape, engine, tape_id='tape')
+        self.assertEqual(incremental._check_type(), problems)
+        self.assertEqual(incremental.totals, {'property_count': full._calculate_property_count(), 'unit_count': full._calculate_unit_count(),
+                                              'leased_count': full._calculate_leased_count()})
+
+    def test_revisions(self):
+        # Each fixture is a revision of the same template, validated in turn under one tape_id.
+        for engine in ['columnar', 'rows']:
+            for tape in [validation_valid_excel(), validation_invalid_type_excel(), validation_invalid_required_excel(),
+                         validation_valid_excel()]:
+                self.assert_same_as_full(tape, engine)
+
+    def test_unchanged_rows_skipped(self):
+        TapeValidation(validation_invalid_type_excel(), tape_id='tape')._check_type()
+        validation = TapeValidation(validation_invalid_type_excel(), tape_id='tape')
+        with patch.object(validation, '_changed_results', wraps=validation._changed_results) as changed_mock:
+            problems = validation._check_type()
+        changed_mock.assert_called_with({})
+        self.assertEqual(problems, TapeValidation(validation_invalid_type_excel())._check_type())
+
+    def test_other_template(self):
+        TapeValidation(validation_valid_excel(), tape_id='tape')._check_type()
+        revision.__REVISIONS__.get('tape').template = 'another template'
+        validation = TapeValidation(validation_valid_excel(), tape_id='tape')
+        with patch.object(validation, '_changed_results', wraps=validation._changed_results) as changed_mock:
+            validation._check_type()
+        self.assertEqual(len(changed_mock.call_args[0][0]), validation.totals['property_count'])
@@ -0,0 +1,74 @@
+import json
+import unittest
+
+from daedalus.validation import report, sampling
+
+class SampleRowsTest(unittest.TestCase):
+    def setUp(self):
+        self.rows = [['header']] * 2 + [[index] for index in range(100)]
+
+    def test_list(self):
+        sampled, data_rows = sampling.sample_rows(self.rows, 2, 10, seed=3)
+        self.assertEqual(data_rows, 100)
+        self.assertEqual(len(sampled), 10)
+        self.assertEqual(sampled, sorted(sampled))
+        self.assertTrue(all(self.rows[row] == cells and row >= 2 for row, cells in sampled))
+
+    def test_iterator(self):
+        sampled, data_rows = sampling.sample_rows(iter(self.rows), 2, 10, seed=3)
+        self.assertEqual(data_rows, 100)
+        self.assertEqual(len(set(row for row, _ in sampled)), 10)
+        self.assertTrue(all(self.rows[row] == cells and row >= 2 for row, cells in sampled))
+
+    def test_short(self):
+        for rows in [self.rows, iter(self.rows)]:
+            sampled, data_rows = sampling.sample_rows(rows, 2, 500)
+            self.assertEqual(sampled, [(row, self.rows[row]) for row in range(2, 102)])
+            self.assertEqual(data_rows, 100)
+
+    def test_uniform(self):
+        # Every row is about as likely to be sampled, by either method.
+        for make_rows in [list, iter]:
+            hits = [0] * 20
+            for seed in range(2000):
+                for row, _ in sampling.sample_rows(make_rows([[index] for index in range(20)]), 0, 5, seed)[0]:
+                    hits[row] += 1
+            self.assertTrue(all(400 < count < 600 for count in hits), hits)
+
+class WilsonIntervalTest(unittest.TestCase):
+    def test_bounds(self):
+        lower, upper = sampling.wilson_interval(10, 200, 100000)
+        self.assertTrue(lower < 0.05 < upper)
+        self.assertAlmostEqual(lower, 0.0275, places=3)
+        self.assertAlmostEqual(upper, 0.0896, places=3)
+
+    def test_no_errors(self):
+        lower, upper = sampling.wilson_interval(0, 200, 100000)
+        self.assertEqual(lower, 0.0)
+        self.assertTrue(0.0 < upper < 0.02)
+
+    def test_confidence(self):
+        narrow = sampling.wilson_interval(10, 200, 100000, 0.9)
+        wide = sampling.wilson_interval(10, 200, 100000, 0.99)
+        self.assertTrue(wide[0] < narrow[0] and narrow[1] < wide[1])
+
+    def test_whole_population(self):
+        self.assertEqual(sampling.wilson_interval(10, 200, 200), (0.05, 0.05))
+
+    def test_finite_population(self):
+        small, large = sampling.wilson_interval(10, 200, 400), sampling.wilson_interval(10, 200, 100000)
+        self.assertTrue(small[1] - small[0] < large[1] - large[0])
+
+    def test_no_trials(self):
+        self.assertEqual(sampling.wilson_interval(0, 0, 100), (0.0, 1.0))
+
+class ToJsonTest(unittest.TestCase):
+    def test_to_json(self):
+        index = report.ProblemIndex([((24, 7), 'Invalid date.'), ((26, 3), 'Required cell is empty.')])
+        result = json.loads(sampling.to_json(index, {7: u'DATE'}, 100, 1000))
+        self.assertEqual(result['status'], 'Invalid')
+        self.assertEqual(result['row_error_rate']['estimate'], 0.02)
+        self.assertEqual(result['error_rows']['estimate'], 20)
+        self.assertTrue(result['error_rows']['lower'] <= 20 <= result['error_rows']['upper'])
+        self.assertEqual(result['error_counts'], {'DATE': 1, 'REQUIRED': 1})
+        self.assertEqual(result['errors'], [[24, 7, 'Invalid date.'], [26, 3, 'Required cell is empty.']])
@@ -0,0 +1,58 @@
+import daedalus.exceptions
+import json
+import numpy
+import unittest
+
+from daedalus.valuation import sensitivity, valuation
+from daedalus.xlstransform import transforms
+from utils import valuation_workbook_two
+
+class SensitivityArraysTest(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+        self.parameters = valuation._portfolio_parameters(self.data)
+
+    def test_shape(self):
+        axes = [('bips', [400, 500, 600]), ('occupancy', [0.8, 0.9]), ('hpa_factor', [1.0, 1.01, 1.02, 1.03])]
+        result = sensitivity.sensitivity_arrays(self.parameters, axes)
+        self.assertEqual(sorted(result.keys()), sorted(sensitivity.__DEFAULT_METRICS__))
+        self.assertEqual(result['Total IRR'].shape, (3, 2, 4))
+        self.assertEqual(result['Surplus or Deficit'].shape, (3, 2, 4))
+
+    def test_matches_offer_matrix(self):
+        # The 'Counter @ 4pct' row of the small offer matrix is 400 bips over valuation at the portfolio's own parameters.
+        offer_matrix = json.loads(valuation.valuate(self.data, engine='numpy'))
+        result = sensitivity.sensitivity_arrays(self.parameters, [('bips', [0, 400, 800])], metrics=['Deal Value', 'Total IRR'])
+        self.assertAlmostEqual(result['Deal Value'][0], offer_matrix['Deal Value']['0'])
+        self.assertAlmostEqual(result['Total IRR'][1], offer_matrix['Total IRR']['4'])
+        self.assertAlmostEqual(result['Total IRR'][2], offer_matrix['Total IRR']['2'])
+
+    def test_target_irr_axis(self):
+        result = sensitivity.sensitivity_arrays(self.parameters, [('target_irr', [0.1, 0.2])], metrics=['Surplus or Deficit', 'Total IRR'])
+        self.assertAlmostEqual(result['Surplus or Deficit'][0] - result['Surplus or Deficit'][1], 0.1)
+        self.assertEqual(result['Total IRR'][0], result['Total IRR'][1])
+
+    def test_no_axes(self):
+        result = sensitivity.sensitivity_arrays(self.parameters, [])
+        self.assertEqual(result['Total IRR'].shape, ())
+
+    def test_unknown_axis(self):
+        with self.assertRaises(daedalus.exceptions.BadSensitivityAxis):
+            sensitivity.sensitivity_arrays(self.parameters, [('moon_phase', [1, 2])])
+
+    def test_duplicate_axis(self):
+        with self.assertRaises(daedalus.exceptions.BadSensitivityAxis):
+            sensitivity.sensitivity_arrays(self.parameters, [('bips', [1]), ('bips', [2])])
+
+    def test_unknown_metric(self):
+        with self.assertRaises(daedalus.exceptions.BadSensitivityAxis):
+            sensitivity.sensitivity_arrays(self.parameters, [('bips', [1])], metrics=['Happiness'])
+
+class SensitivityGridTest(unittest.TestCase):
+    def test_good(self):
+        data = json.loads(transforms.transform(valuation_workbook_two()))
+        result = json.loads(sensitivity.sensitivity_grid(data, [('bips', [400, 500]), ('operating_income_percent', [0.5, 0.55, 0.6])]))
+        self.assertEqual(result['axes'], [{'name': 'bips', 'values': [400.0, 500.0]},
+                                          {'name': 'operating_income_percent', 'values': [0.5, 0.55, 0.6]}])
+        self.assertEqual(len(result['metrics']['Total IRR']), 2)
+        self.assertEqual(len(result['metrics']['Total IRR'][0]), 3)
@@ -1,9 +1,84 @@
+import json
 import StringIO
 import unittest
 from mock import patch
 
+import openpyxl
+import xlrd
+import xlwt
+
 import daedalus.validation
-from utils import validation_valid_excel, validation_invalid_type_excel, validation_invalid_required_excel
+from benchmarks import generators
+from utils import validation_valid_excel, validation_invalid_type_excel, validation_invalid_required_excel, validation_cross_row_excel, xls_data
+
+def annotations(document):
+    '''What a validation wrote into a tape: its status and fill colour, its totals, its comments by row and the cells bordered as
+    invalid, by 1-based Excel row and 0-based column like the problems.'''
+    sheet = openpyxl.load_workbook(StringIO.StringIO(document)).worksheets[0]
+    # The totals go in merged cells, which openpyxl reads as empty.
+    values = xlrd.open_workbook(file_contents=document).sheet_by_index(0)
+    invalid = sorted((cell.row, cell.column - 1) for row in sheet.iter_rows() for cell in row
+                     if cell.border.top.color is not None and cell.border.top.color.rgb == 'FFFF0000')
+    return {'status': (values.cell_value(1, 1), sheet['B2'].fill.fgColor.rgb),
+            'totals': [values.cell_value(row, 4) for row in [7, 8, 9]],
+            'comments': dict((row, values.cell_value(row - 1, 0)) for row, _ in invalid),
+            'invalid': invalid}
+
+def with_problems(expected, problems):
+    '''Annotations expected of a tape with more problems, each after the problems of its row.'''
+    expected = dict(expected, comments=dict(expected['comments']), invalid=sorted(expected['invalid'] + [position for position, _ in problems]))
+    for (row, column), error in problems:
+        expected['comments'][row] += '; %d: %s' % (column, error)
+    return expected
+
+VALID_ZIP_PROBLEMS = [
+    ((24, 7), 'ZIP code 32524 is in FL, not IL.'), ((25, 7), 'ZIP code 26545 is in WV, not CA.'),
+    ((26, 7), 'ZIP code 75932 is in TX, not WA.'), ((27, 7), 'ZIP code 87694 is in NM, not VA.')]
+
+INVALID_TYPE_PROBLEMS = [
+    ((24, 1), 'Not an integer: FOO.'), ((24, 7), 'Invalid character or format.'), ((24, 8), 'Invalid character or format.'),
+    ((24, 9), 'Invalid date.'), ((24, 18), 'Invalid date.'), ((24, 19), 'Invalid date.'), ((25, 3), 'Invalid character or format.'),
+    ((25, 4), 'Invalid character or format.'), ((25, 5), 'Invalid character or format.'), ((25, 6), 'No such US state: NUL.'),
+    ((26, 10), 'Invalid dollar value.'), ((26, 11), 'Invalid dollar value.'), ((26, 20), 'Invalid dollar value.'),
+    ((26, 21), 'Invalid dollar value.'), ((26, 22), 'Invalid dollar value.'), ((26, 23), 'Invalid character or format.'),
+    ((26, 24), 'Invalid dollar value.'), ((26, 25), 'Invalid dollar value.'), ((26, 26), 'Invalid dollar value.'),
+    ((26, 27), 'Invalid dollar value.'), ((26, 28), 'Invalid dollar value.'), ((26, 29), 'Invalid dollar value.'),
+    ((26, 31), 'Invalid dollar value.'), ((26, 32), 'Invalid dollar value.'), ((27, 1), 'Invalid numbering.'),
+    ((27, 8), 'Invalid character or format.'), ((27, 23), 'Percentage outside 0-100 bounds.')]
+
+INVALID_TYPE_ANNOTATIONS = {
+    'status': ('24, 25, 26, 27', 'FFFF0000'),
+    'totals': [4, 24, 3],
+    'comments': {
+        24: '1: Not an integer: FOO.; 7: Invalid character or format.; 8: Invalid character or format.; 9: Invalid date.; '
+            '18: Invalid date.; 19: Invalid date.',
+        25: '3: Invalid character or format.; 4: Invalid character or format.; 5: Invalid character or format.; '
+            '6: No such US state: NUL.',
+        26: '10: Invalid dollar value.; 11: Invalid dollar value.; 20: Invalid dollar value.; 21: Invalid dollar value.; '
+            '22: Invalid dollar value.; 23: Invalid character or format.; 24: Invalid dollar value.; 25: Invalid dollar value.; '
+            '26: Invalid dollar value.; 27: Invalid dollar value.; 28: Invalid dollar value.; 29: Invalid dollar value.; '
+            '31: Invalid dollar value.; 32: Invalid dollar value.',
+        27: '1: Invalid numbering.; 8: Invalid character or format.; 23: Percentage outside 0-100 bounds.'},
+    'invalid': sorted(position for position, _ in INVALID_TYPE_PROBLEMS)}
+
+INVALID_REQUIRED_PROBLEMS = [
+    ((24, 3), 'Required cell is empty.'), ((24, 4), 'Required cell is empty.'), ((24, 5), 'Required cell is empty.'),
+    ((24, 6), 'Required cell is empty.'), ((24, 7), 'Required cell is empty.'), ((25, 10), 'Required cell is empty.'),
+    ((25, 21), 'Required cell is empty.'), ((25, 25), 'Required cell is empty.'), ((25, 26), 'Required cell is empty.'),
+    ((26, 1), 'Invalid numbering.'), ((26, 2), 'Required cell is empty.'), ((26, 9), 'Required cell is empty.'),
+    ((27, 16), 'Required cell is empty.'), ((27, 23), 'Required cell is empty.'), ((27, 29), 'Required cell is empty.'),
+    ((27, 30), 'Required cell is empty.')]
+
+INVALID_REQUIRED_ANNOTATIONS = {
+    'status': ('24, 25, 26, 27', 'FFFF0000'),
+    'totals': [4, 'Error in unit fields.', 'Error in leased fields.'],
+    'comments': {
+        24: '3: Required cell is empty.; 4: Required cell is empty.; 5: Required cell is empty.; 6: Required cell is empty.; '
+            '7: Required cell is empty.',
+        25: '10: Required cell is empty.; 21: Required cell is empty.; 25: Required cell is empty.; 26: Required cell is empty.',
+        26: '1: Invalid numbering.; 2: Required cell is empty.; 9: Required cell is empty.',
+        27: '16: Required cell is empty.; 23: Required cell is empty.; 29: Required cell is empty.; 30: Required cell is empty.'},
+    'invalid': sorted(position for position, _ in INVALID_REQUIRED_PROBLEMS)}
 
 class TapeValidationTest(unittest.TestCase):
     def setUp(self):
@@ -36,7 +111,13 @@ class TapeValidationTest(unittest.TestCase):
 
     def test_check_type_valid(self):
         result = self.valid._check_type()
-        expected_result = []
+        # The states of the mock tape don't match its ZIP codes.
+        expected_result = VALID_ZIP_PROBLEMS
+        self.assertEqual(result, expected_result)
+
+    def test_check_type_cross_row(self):
+        result = daedalus.validation.tape_validation.TapeValidation(validation_cross_row_excel())._check_type()
+        expected_result = [((25, 7), 'ZIP code 26545 is in WV, not CA.'), ((27, 3), 'Duplicate property of row 24.')]
         self.assertEqual(result, expected_result)
 
     def test_check_type_invalid_type(self):
@@ -49,8 +130,9 @@ class TapeValidationTest(unittest.TestCase):
             ((26, 21), 'Invalid dollar value.'), ((26, 22), 'Invalid dollar value.'), ((26, 23), 'Invalid character or format.'),
             ((26, 24), 'Invalid dollar value.'), ((26, 25), 'Invalid dollar value.'), ((26, 26), 'Invalid dollar value.'),
             ((26, 27), 'Invalid dollar value.'), ((26, 28), 'Invalid dollar value.'), ((26, 29), 'Invalid dollar value.'),
-            ((26, 31), 'Invalid dollar value.'), ((26, 32), 'Invalid dollar value.'), ((27, 1), 'Invalid numbering.'),
-            ((27, 8), 'Invalid character or format.'), ((27, 23), 'Percentage outside 0-100 bounds.')]
+            ((26, 31), 'Invalid dollar value.'), ((26, 32), 'Invalid dollar value.'), ((26, 7), 'ZIP code 75932 is in TX, not WA.'),
+            ((27, 1), 'Invalid numbering.'), ((27, 8), 'Invalid character or format.'), ((27, 23), 'Percentage outside 0-100 bounds.'),
+            ((27, 7), 'ZIP code 26545 is in WV, not IL.')]
         self.assertEqual(result, expected_result)
 
     def test_check_type_invalid_required(self):
@@ -59,43 +141,222 @@ class TapeValidationTest(unittest.TestCase):
             ((24, 3), 'Required cell is empty.'), ((24, 4), 'Required cell is empty.'), ((24, 5), 'Required cell is empty.'),
             ((24, 6), 'Required cell is empty.'), ((24, 7), 'Required cell is empty.'), ((25, 10), 'Required cell is empty.'),
             ((25, 21), 'Required cell is empty.'), ((25, 25), 'Required cell is empty.'), ((25, 26), 'Required cell is empty.'),
-            ((26, 1), 'Invalid numbering.'), ((26, 2), 'Required cell is empty.'), ((26, 9), 'Required cell is empty.'),
-            ((27, 16), 'Required cell is empty.'), ((27, 23), 'Required cell is empty.'), ((27, 29), 'Required cell is empty.'),
-            ((27, 30), 'Required cell is empty.')]
+            ((25, 7), 'ZIP code 26545 is in WV, not CA.'), ((26, 1), 'Invalid numbering.'), ((26, 2), 'Required cell is empty.'),
+            ((26, 9), 'Required cell is empty.'), ((26, 7), 'ZIP code 75932 is in TX, not WA.'), ((27, 16), 'Required cell is empty.'),
+            ((27, 23), 'Required cell is empty.'), ((27, 29), 'Required cell is empty.'), ((27, 30), 'Required cell is empty.'),
+            ((27, 3), 'Duplicate property of row 26.'), ((27, 7), 'ZIP code 75932 is in TX, not WA.')]
         self.assertEqual(result, expected_result)
 
     def test_alter_document_valid(self):
-        doc_problems = []
-        expected_result = {'cell_styles': [((1, 1), 1)], 'cells': [((7, 4), 4), ((8, 4), 25), ((9, 4), 3)]}
-        result = self.valid._alter_document(doc_problems)
-        self.assertEqual(result, expected_result)
+        result = annotations(self.valid._alter_document([]))
+        self.assertEqual(result, {'status': ('Valid', 'FF008000'), 'totals': [4, 25, 3], 'comments': {}, 'invalid': []})
 
     def test_alter_document_invalid_type(self):
-        doc_problems = [
-            ((24, 1), 'Not an integer: FOO.'), ((24, 7), 'Invalid character or format.'), ((24, 8), 'Invalid character or format.'),
-            ((24, 9), 'Invalid date.'), ((24, 18), 'Invalid date.'), ((24, 19), 'Invalid date.'), ((25, 3), 'Invalid character or format.'),
-            ((25, 4), 'Invalid character or format.'), ((25, 5), 'Invalid character or format.'), ((25, 6), 'No such US state: NUL.'),
-            ((26, 10), 'Invalid dollar value.'), ((26, 11), 'Invalid dollar value.'), ((26, 20), 'Invalid dollar value.'),
-            ((26, 21), 'Invalid dollar value.'), ((26, 22), 'Invalid dollar value.'), ((26, 23), 'Invalid character or format.'),
-            ((26, 24), 'Invalid dollar value.'), ((26, 25), 'Invalid dollar value.'), ((26, 26), 'Invalid dollar value.'),
-            ((26, 27), 'Invalid dollar value.'), ((26, 28), 'Invalid dollar value.'), ((26, 29), 'Invalid dollar value.'),
-            ((26, 31), 'Invalid dollar value.'), ((26, 32), 'Invalid dollar value.'), ((27, 1), 'Invalid numbering.'),
-            ((27, 8), 'Invalid character or format.'), ((27, 23), 'Percentage outside 0-100 bounds.')]
-        expected_result = {'cell_styles': [((1, 1), 0), ((24, 0), 3), ((24, 1), 2), ((24, 0), 3), ((24, 7), 2), ((24, 0), 3), ((24, 8), 2), ((24, 0), 3), ((24, 9), 2), ((24, 0), 3), ((24, 18), 2), ((24, 0), 3), ((24, 19), 2), ((25, 0), 3), ((25, 3), 2), ((25, 0), 3), ((25, 4), 2), ((25, 0), 3), ((25, 5), 2), ((25, 0), 3), ((25, 6), 2), ((26, 0), 3), ((26, 10), 2), ((26, 0), 3), ((26, 11), 2), ((26, 0), 3), ((26, 20), 2), ((26, 0), 3), ((26, 21), 2), ((26, 0), 3), ((26, 22), 2), ((26, 0), 3), ((26, 23), 2), ((26, 0), 3), ((26, 24), 2), ((26, 0), 3), ((26, 25), 2), ((26, 0), 3), ((26, 26), 2), ((26, 0), 3), ((26, 27), 2), ((26, 0), 3), ((26, 28), 2), ((26, 0), 3), ((26, 29), 2), ((26, 0), 3), ((26, 31), 2), ((26, 0), 3), ((26, 32), 2), ((27, 0), 3), ((27, 1), 2), ((27, 0), 3), ((27, 8), 2), ((27, 0), 3), ((27, 23), 2)], 'cells': [((24, 0), '1: Not an integer: FOO.; 7: Invalid character or format.; 8: Invalid character or format.; 9: Invalid date.; 18: Invalid date.; 19: Invalid date.'), ((25, 0), '3: Invalid character or format.; 4: Invalid character or format.; 5: Invalid character or format.; 6: No such US state: NUL.'), ((26, 0), '10: Invalid dollar value.; 11: Invalid dollar value.; 20: Invalid dollar value.; 21: Invalid dollar value.; 22: Invalid dollar value.; 23: Invalid character or format.; 24: Invalid dollar value.; 25: Invalid dollar value.; 26: Invalid dollar value.; 27: Invalid dollar value.; 28: Invalid dollar value.; 29: Invalid dollar value.; 31: Invalid dollar value.; 32: Invalid dollar value.'), ((27, 0), '1: Invalid numbering.; 8: Invalid character or format.; 23: Percentage outside 0-100 bounds.'), ((1, 1), '24, 25, 26, 27'), ((7, 4), 4), ((8, 4), 24), ((9, 4), 3)]}
-        result = self.invalid_type._alter_document(doc_problems)
-        self.assertEqual(result, expected_result)
+        result = annotations(self.invalid_type._alter_document(INVALID_TYPE_PROBLEMS))
+        self.assertEqual(result, INVALID_TYPE_ANNOTATIONS)
 
     def test_alter_document_invalid_required(self):
-        doc_problems = [
-            ((24, 3), 'Required cell is empty.'), ((24, 4), 'Required cell is empty.'), ((24, 5), 'Required cell is empty.'),
-            ((24, 6), 'Required cell is empty.'), ((24, 7), 'Required cell is empty.'), ((25, 10), 'Required cell is empty.'),
-            ((25, 21), 'Required cell is empty.'), ((25, 25), 'Required cell is empty.'), ((25, 26), 'Required cell is empty.'),
-            ((26, 1), 'Invalid numbering.'), ((26, 2), 'Required cell is empty.'), ((26, 9), 'Required cell is empty.'),
-            ((27, 16), 'Required cell is empty.'), ((27, 23), 'Required cell is empty.'), ((27, 29), 'Required cell is empty.'),
-            ((27, 30), 'Required cell is empty.')]
-        expected_result = {'cell_styles': [((1, 1), 0), ((24, 0), 3), ((24, 3), 2), ((24, 0), 3), ((24, 4), 2), ((24, 0), 3), ((24, 5), 2), ((24, 0), 3), ((24, 6), 2), ((24, 0), 3), ((24, 7), 2), ((25, 0), 3), ((25, 10), 2), ((25, 0), 3), ((25, 21), 2), ((25, 0), 3), ((25, 25), 2), ((25, 0), 3), ((25, 26), 2), ((26, 0), 3), ((26, 1), 2), ((26, 0), 3), ((26, 2), 2), ((26, 0), 3), ((26, 9), 2), ((27, 0), 3), ((27, 16), 2), ((27, 0), 3), ((27, 23), 2), ((27, 0), 3), ((27, 29), 2), ((27, 0), 3), ((27, 30), 2)], 'cells': [((24, 0), '3: Required cell is empty.; 4: Required cell is empty.; 5: Required cell is empty.; 6: Required cell is empty.; 7: Required cell is empty.'), ((25, 0), '10: Required cell is empty.; 21: Required cell is empty.; 25: Required cell is empty.; 26: Required cell is empty.'), ((26, 0), '1: Invalid numbering.; 2: Required cell is empty.; 9: Required cell is empty.'), ((27, 0), '16: Required cell is empty.; 23: Required cell is empty.; 29: Required cell is empty.; 30: Required cell is empty.'), ((1, 1), '24, 25, 26, 27'), ((7, 4), 4), ((8, 4), 'Error in unit fields.'), ((9, 4), 'Error in leased fields.')]}
-        result = self.invalid_required._alter_document(doc_problems)
-        self.assertEqual(result, expected_result)
+        result = annotations(self.invalid_required._alter_document(INVALID_REQUIRED_PROBLEMS))
+        self.assertEqual(result, INVALID_REQUIRED_ANNOTATIONS)
+
+class StreamingTest(unittest.TestCase):
+    def test_fixtures(self):
+        for tape in [validation_valid_excel(), validation_invalid_type_excel(), validation_invalid_required_excel()]:
+            rows = daedalus.validation.tape_validation.TapeValidation(tape, 'rows')
+            streaming = daedalus.validation.tape_validation.TapeValidation(tape, 'streaming')
+            self.assertEqual(streaming._check_type(), rows._check_type())
+            self.assertEqual(streaming.input_dict, None)
+            self.assertEqual(streaming.totals, {'property_count': rows._calculate_property_count(),
+                                                'unit_count': rows._calculate_unit_count(),
+                                                'leased_count': rows._calculate_leased_count()})
+
+    def test_xls(self):
+        # xls tapes are read whole and checked the same way.
+        validation = daedalus.validation.tape_validation.TapeValidation(xls_data(raw=True), 'streaming')
+        self.assertFalse(validation.input_dict is None)
+
+    def test_closed(self):
+        for output_format in ['excel', 'report', 'sample']:
+            validation = daedalus.validation.tape_validation.TapeValidation(validation_invalid_type_excel(), 'streaming')
+            with patch.object(validation.workbook, 'close') as close_mock:
+                validation.run(output_format)
+            close_mock.assert_called_once_with()
+
+    def test_excel_output(self):
+        tape = validation_invalid_type_excel()
+        rows = daedalus.validation.tape_validation.TapeValidation(tape, 'rows').run()
+        streaming = daedalus.validation.tape_validation.TapeValidation(tape, 'streaming').run()
+        self.assertEqual(annotations(streaming), annotations(rows))
+
+    def test_closed_on_error(self):
+        validation = daedalus.validation.tape_validation.TapeValidation(validation_valid_excel(), 'streaming')
+        with patch.object(validation.workbook, 'close') as close_mock:
+            with patch.object(validation, '_check_type', side_effect=ValueError):
+                with self.assertRaises(ValueError):
+                    validation.run('report')
+        close_mock.assert_called_once_with()
+
+    def test_config_engine(self):
+        with patch('daedalus.config.VALIDATION_ENGINE', 'streaming'):
+            with patch('daedalus.validation.tape_validation.TapeValidation') as validation_mock:
+                daedalus.validation.tape_validation.validate('foobar')
+        validation_mock.assert_called_with('foobar', 'streaming', tape_id=None, max_errors=None)
+
+class FusedTotalsTest(unittest.TestCase):
+    def test_no_extra_passes(self):
+        validation = daedalus.validation.tape_validation.TapeValidation(generators.tape_workbook(20))
+        problems = validation._check_type()
+        with patch.object(validation, '_calculate_unit_count') as unit_mock, patch.object(validation, '_calculate_leased_count') as leased_mock, \
+             patch.object(validation, '_calculate_property_count') as property_mock:
+            validation._alter_document(problems)
+        self.assertFalse(unit_mock.called or leased_mock.called or property_mock.called)
+
+class FailFastTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        # More rows than a block of the columnar engine.
+        cls.tape = generators.tape_workbook(1200, invalid_fraction=0.05)
+        cls.problems = daedalus.validation.tape_validation.TapeValidation(cls.tape)._check_type()
+
+    def test_engines(self):
+        for engine in ['rows', 'columnar', 'streaming']:
+            validation = daedalus.validation.tape_validation.TapeValidation(self.tape, engine, max_errors=10)
+            self.assertEqual(validation._check_type(), self.problems[:10])
+            self.assertTrue(validation.stopped)
+            self.assertEqual(validation.totals['unit_count'], validation._NOT_COUNTED)
+
+    def test_columnar_blocks(self):
+        validation = daedalus.validation.tape_validation.TapeValidation(self.tape, max_errors=10)
+        with patch('daedalus.validation.columnar.check_columns', wraps=daedalus.validation.columnar.check_columns) as check_mock:
+            validation._check_type()
+        self.assertEqual(check_mock.call_count, 1)
+
+    def test_not_reached(self):
+        full = daedalus.validation.tape_validation.TapeValidation(self.tape)
+        full._check_type()
+        for engine in ['rows', 'columnar']:
+            validation = daedalus.validation.tape_validation.TapeValidation(self.tape, engine, max_errors=len(self.problems) + 1)
+            self.assertEqual(validation._check_type(), self.problems)
+            self.assertFalse(validation.stopped)
+            self.assertEqual(validation.totals, full.totals)
+
+    def test_exactly_max_errors(self):
+        full = daedalus.validation.tape_validation.TapeValidation(self.tape)
+        full._check_type()
+        for engine in ['rows', 'columnar', 'streaming']:
+            validation = daedalus.validation.tape_validation.TapeValidation(self.tape, engine, max_errors=len(self.problems))
+            self.assertEqual(validation._check_type(), self.problems)
+            self.assertFalse(validation.stopped)
+            self.assertEqual(validation.totals, full.totals)
+
+    def test_report(self):
+        result = json.loads(daedalus.validation.tape_validation.validate(self.tape, output_format='report', max_errors=5))
+        self.assertTrue(result['stopped'])
+        self.assertEqual(len(result['errors']), 5)
+
+    def test_config(self):
+        with patch('daedalus.config.VALIDATION_MAX_ERRORS', 7):
+            self.assertEqual(len(daedalus.validation.tape_validation.TapeValidation(self.tape)._check_type()), 7)
+
+class SampleTest(unittest.TestCase):
+    def test_sample(self):
+        tape = generators.tape_workbook(1000, invalid_fraction=0.05)
+        problems = daedalus.validation.tape_validation.TapeValidation(tape)._check_type()
+        rate = len(set(row for (row, _), _ in problems)) / 1000.0
+        for engine in ['columnar', 'streaming']:
+            result = json.loads(daedalus.validation.tape_validation.TapeValidation(tape, engine).sample(200, seed=1))
+            self.assertEqual((result['sampled_rows'], result['data_rows']), (200, 1000))
+            self.assertTrue(result['row_error_rate']['lower'] <= rate <= result['row_error_rate']['upper'])
+            # The problems of the sample are those of the whole tape in the rows sampled.
+            sampled = set(row for row, _, _ in result['errors'])
+            self.assertEqual([[row, column, error] for (row, column), error in problems if row in sampled], result['errors'])
+
+    def test_whole_tape(self):
+        tape = generators.tape_workbook(50, invalid_fraction=0.1)
+        problems = daedalus.validation.tape_validation.TapeValidation(tape)._check_type()
+        result = json.loads(daedalus.validation.tape_validation.validate(tape, output_format='sample'))
+        rows = len(set(row for (row, _), _ in problems))
+        self.assertEqual(result['error_rows'], {'estimate': rows, 'lower': rows, 'upper': rows})
+
+class DateFormatTest(unittest.TestCase):
+    def test_text_dates(self):
+        tape = generators.tape_workbook(30, date_format='%d-%b-%Y')
+        for engine in ['rows', 'columnar', 'streaming']:
+            validation = daedalus.validation.tape_validation.TapeValidation(tape, engine)
+            self.assertEqual(validation._check_type(), [])
+            self.assertEqual(set(validation.date_formats().values()), set(['%d-%b-%Y']))
+            self.assertEqual(len(validation.date_formats()), 4)
+
+    def test_serial_dates(self):
+        validation = daedalus.validation.tape_validation.TapeValidation(generators.tape_workbook(5))
+        validation._check_type()
+        self.assertEqual(validation.date_formats(), {})
+
+    def test_summary(self):
+        summary = {}
+        daedalus.validation.tape_validation.validate(generators.tape_workbook(5, date_format='%Y-%m-%d'), summary=summary)
+        self.assertEqual(summary['date_formats'], {9: '%Y-%m-%d', 12: '%Y-%m-%d', 18: '%Y-%m-%d', 19: '%Y-%m-%d'})
+
+def xls_tape(tape):
+    '''xls copy of an xlsx tape, after an empty sheet and with a styled blank cell a few rows below the tape.'''
+    book = xlrd.open_workbook(file_contents=tape)
+    output = xlwt.Workbook()
+    output.add_sheet(u'Cover')
+    for sheet in book.sheets():
+        copied = output.add_sheet(sheet.name)
+        for row in range(sheet.nrows):
+            for col, value in enumerate(sheet.row_values(row)):
+                if value != u'':
+                    copied.write(row, col, value)
+        if sheet.name == u'Portfolio':
+            copied.write(sheet.nrows + 3, 2, u'', xlwt.easyxf('pattern: pattern solid, fore_colour yellow;'))
+    output_stream = StringIO.StringIO()
+    output.save(output_stream)
+    return output_stream.getvalue()
+
+class XlsTapeTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.tape = generators.tape_workbook(20, invalid_fraction=0.2)
+        cls.problems = daedalus.validation.tape_validation.TapeValidation(cls.tape)._check_type()
+
+    def test_check_type(self):
+        # Blank rows with only a style are not tape rows.
+        validation = daedalus.validation.tape_validation.TapeValidation(xls_tape(self.tape))
+        self.assertEqual(validation._check_type(), self.problems)
+        self.assertEqual(validation.totals['property_count'], 20)
+
+    def test_alter_document(self):
+        validation = daedalus.validation.tape_validation.TapeValidation(xls_tape(self.tape))
+        output = xlrd.open_workbook(file_contents=validation._alter_document(validation._check_type()), formatting_info=True)
+        self.assertEqual(output.sheet_by_name(u'Cover').nrows, 0)
+        sheet = output.sheet_by_name(u'Portfolio')
+        self.assertTrue(self.problems)
+        for (row, col), _ in self.problems:
+            self.assertIn(sheet.cell_value(row - 1, col), generators.__INVALID_VALUES__.values())
+            self.assertEqual(output.xf_list[sheet.cell_xf_index(row - 1, col)].border.top_line_style, 1)
+
+def xlsx_tape(tape):
+    '''xlsx tape after an empty sheet.'''
+    book = openpyxl.load_workbook(StringIO.StringIO(tape))
+    book.create_sheet(u'Cover', 0)
+    output_stream = StringIO.StringIO()
+    book.save(output_stream)
+    return output_stream.getvalue()
+
+class XlsxTapeTest(unittest.TestCase):
+    def test_alter_document(self):
+        tape = generators.tape_workbook(20, invalid_fraction=0.2)
+        validation = daedalus.validation.tape_validation.TapeValidation(xlsx_tape(tape))
+        problems = validation._check_type()
+        self.assertTrue(problems)
+        output = openpyxl.load_workbook(StringIO.StringIO(validation._alter_document(problems)))
+        self.assertEqual(output[u'Cover'].max_row, 1)
+        self.assertEqual(output[u'Cover']['B2'].value, None)
+        sheet = output[u'Portfolio']
+        self.assertEqual(sheet['B2'].fill.fgColor.rgb, 'FFFF0000')
+        for (row, col), _ in problems:
+            self.assertEqual(sheet.cell(row, col + 1).border.top.color.rgb, 'FFFF0000')
 
 class ValidationTest(unittest.TestCase):
     def test_parse_args(self):
@@ -105,24 +366,24 @@ class ValidationTest(unittest.TestCase):
         self.assertTrue(isinstance(args.outfile, StringIO.StringIO))
 
     def test_validate_valid(self):
-        doc_excel = validation_valid_excel()
-        expected_result = "{'cell_styles': [((1, 1), 1)], 'cells': [((7, 4), 4), ((8, 4), 25), ((9, 4), 3)]}"
-
-        result = daedalus.validation.validate(doc_excel)
-        self.assertEqual(result, expected_result)
+        result = annotations(daedalus.validation.validate(validation_valid_excel()))
+        # The states of the mock tape don't match its ZIP codes.
+        self.assertEqual(result, {'status': ('24, 25, 26, 27', 'FFFF0000'), 'totals': [4, 25, 3],
+                                  'comments': dict((row, '7: %s' % error) for (row, _), error in VALID_ZIP_PROBLEMS),
+                                  'invalid': sorted(position for position, _ in VALID_ZIP_PROBLEMS)})
 
     def test_validate_invalid_type(self):
-        doc_excel = validation_invalid_type_excel()
-        expected_result = "{'cell_styles': [((1, 1), 0), ((24, 0), 3), ((24, 1), 2), ((24, 0), 3), ((24, 7), 2), ((24, 0), 3), ((24, 8), 2), ((24, 0), 3), ((24, 9), 2), ((24, 0), 3), ((24, 18), 2), ((24, 0), 3), ((24, 19), 2), ((25, 0), 3), ((25, 3), 2), ((25, 0), 3), ((25, 4), 2), ((25, 0), 3), ((25, 5), 2), ((25, 0), 3), ((25, 6), 2), ((26, 0), 3), ((26, 10), 2), ((26, 0), 3), ((26, 11), 2), ((26, 0), 3), ((26, 20), 2), ((26, 0), 3), ((26, 21), 2), ((26, 0), 3), ((26, 22), 2), ((26, 0), 3), ((26, 23), 2), ((26, 0), 3), ((26, 24), 2), ((26, 0), 3), ((26, 25), 2), ((26, 0), 3), ((26, 26), 2), ((26, 0), 3), ((26, 27), 2), ((26, 0), 3), ((26, 28), 2), ((26, 0), 3), ((26, 29), 2), ((26, 0), 3), ((26, 31), 2), ((26, 0), 3), ((26, 32), 2), ((27, 0), 3), ((27, 1), 2), ((27, 0), 3), ((27, 8), 2), ((27, 0), 3), ((27, 23), 2)], 'cells': [((24, 0), u'1: Not an integer: FOO.; 7: Invalid character or format.; 8: Invalid character or format.; 9: Invalid date.; 18: Invalid date.; 19: Invalid date.'), ((25, 0), u'3: Invalid character or format.; 4: Invalid character or format.; 5: Invalid character or format.; 6: No such US state: NUL.'), ((26, 0), '10: Invalid dollar value.; 11: Invalid dollar value.; 20: Invalid dollar value.; 21: Invalid dollar value.; 22: Invalid dollar value.; 23: Invalid character or format.; 24: Invalid dollar value.; 25: Invalid dollar value.; 26: Invalid dollar value.; 27: Invalid dollar value.; 28: Invalid dollar value.; 29: Invalid dollar value.; 31: Invalid dollar value.; 32: Invalid dollar value.'), ((27, 0), '1: Invalid numbering.; 8: Invalid character or format.; 23: Percentage outside 0-100 bounds.'), ((1, 1), '24, 25, 26, 27'), ((7, 4), 4), ((8, 4), 24), ((9, 4), 3)]}"
-
-        result = daedalus.validation.validate(doc_excel)
+        result = annotations(daedalus.validation.validate(validation_invalid_type_excel()))
+        expected_result = with_problems(INVALID_TYPE_ANNOTATIONS, [((26, 7), 'ZIP code 75932 is in TX, not WA.'),
+                                                                   ((27, 7), 'ZIP code 26545 is in WV, not IL.')])
         self.assertEqual(result, expected_result)
 
     def test_validate_invalid_required(self):
-        doc_excel = validation_invalid_required_excel()
-        expected_result = "{'cell_styles': [((1, 1), 0), ((24, 0), 3), ((24, 3), 2), ((24, 0), 3), ((24, 4), 2), ((24, 0), 3), ((24, 5), 2), ((24, 0), 3), ((24, 6), 2), ((24, 0), 3), ((24, 7), 2), ((25, 0), 3), ((25, 10), 2), ((25, 0), 3), ((25, 21), 2), ((25, 0), 3), ((25, 25), 2), ((25, 0), 3), ((25, 26), 2), ((26, 0), 3), ((26, 1), 2), ((26, 0), 3), ((26, 2), 2), ((26, 0), 3), ((26, 9), 2), ((27, 0), 3), ((27, 16), 2), ((27, 0), 3), ((27, 23), 2), ((27, 0), 3), ((27, 29), 2), ((27, 0), 3), ((27, 30), 2)], 'cells': [((24, 0), '3: Required cell is empty.; 4: Required cell is empty.; 5: Required cell is empty.; 6: Required cell is empty.; 7: Required cell is empty.'), ((25, 0), '10: Required cell is empty.; 21: Required cell is empty.; 25: Required cell is empty.; 26: Required cell is empty.'), ((26, 0), '1: Invalid numbering.; 2: Required cell is empty.; 9: Required cell is empty.'), ((27, 0), '16: Required cell is empty.; 23: Required cell is empty.; 29: Required cell is empty.; 30: Required cell is empty.'), ((1, 1), '24, 25, 26, 27'), ((7, 4), 4), ((8, 4), 'Error in unit fields.'), ((9, 4), 'Error in leased fields.')]}"
-
-        result = daedalus.validation.validate(doc_excel)
+        result = annotations(daedalus.validation.validate(validation_invalid_required_excel()))
+        expected_result = with_problems(INVALID_REQUIRED_ANNOTATIONS, [((25, 7), 'ZIP code 26545 is in WV, not CA.'),
+                                                                       ((26, 7), 'ZIP code 75932 is in TX, not WA.'),
+                                                                       ((27, 3), 'Duplicate property of row 26.'),
+                                                                       ((27, 7), 'ZIP code 75932 is in TX, not WA.')])
         self.assertEqual(result, expected_result)
 
     def test_main(self):
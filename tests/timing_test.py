@@ -0,0 +1,46 @@
+import collections
+import unittest
+
+from daedalus.common import timing
+
+class TimingTest(unittest.TestCase):
+
+    def test_record(self):
+        with timing.record() as timings:
+            with timing.stage('parse'):
+                pass
+            with timing.stage('encode'):
+                pass
+            with timing.stage('parse'):
+                pass
+        self.assertEqual(list(timings.keys()), ['parse', 'encode'])
+        self.assertTrue(all(seconds >= 0.0 for seconds in timings.values()))
+
+    def test_stage_outside_record(self):
+        with timing.stage('parse'):
+            pass
+        with timing.record() as timings:
+            pass
+        self.assertEqual(timings, {})
+
+    def test_nested_record(self):
+        with timing.record() as outer:
+            with timing.stage('parse'):
+                pass
+            with timing.record() as inner:
+                with timing.stage('encode'):
+                    pass
+        self.assertEqual(list(outer.keys()), ['parse'])
+        self.assertEqual(list(inner.keys()), ['encode'])
+
+    def test_stage_records_on_error(self):
+        with timing.record() as timings:
+            with self.assertRaises(ValueError):
+                with timing.stage('parse'):
+                    raise ValueError('BOOM!')
+        self.assertIn('parse', timings)
+
+    def test_to_header(self):
+        timings = collections.OrderedDict([('parse', 0.0012), ('encode', 0.5)])
+        self.assertEqual(timing.to_header(timings), 'parse;dur=1.200, encode;dur=500.000')
+        self.assertEqual(timing.to_header({}), '')
@@ -80,3 +80,7 @@ def validation_invalid_type_excel():
 def validation_invalid_required_excel():
     with open(os.path.join(test_data, 'validation_mock_invalid_required.xlsx'), 'rb') as f:
         return f.read()
+
+def validation_cross_row_excel():
+    with open(os.path.join(test_data, 'validation_mock_cross_row.xlsx'), 'rb') as f:
+        return f.read()
@@ -31,3 +31,15 @@ class TestValidateHandler(unittest.TestCase):
                 self.validate_handler.post()
                 self.assertEqual(publish_mock.call_count, 1)
                 self.assertEqual(self.validate_handler.request_message.body, 'foobar')
+
+    def test_post_forwarded_headers(self):
+        self.request.headers['x-callback-url'] = 'http://localhost'
+        self.request.headers['x-tape-id'] = 'tape-7'
+        self.request.headers['x-output-format'] = 'report'
+        self.request.headers['x-max-errors'] = '100'
+        with mock.patch.object(self.validate_handler, 'publish'):
+            with mock.patch('uuid.uuid4', return_value='666'):
+                self.validate_handler.post()
+        self.assertEqual(self.validate_handler.request_message.get_header('tape_id'), 'tape-7')
+        self.assertEqual(self.validate_handler.request_message.get_header('output_format'), 'report')
+        self.assertEqual(self.validate_handler.request_message.get_header('max_errors'), '100')
@@ -1,11 +1,18 @@
 import mock
 import unittest
 
+import daedalus.exceptions
 import daedalus.validation.service
 
+from daedalus.validation import result_cache
+
 class TestValidationConsumer(unittest.TestCase):
     def setUp(self):
         self.validation_consumer = daedalus.validation.service.ValidationConsumer()
+        result_cache.__RESULTS__.clear()
+
+    def tearDown(self):
+        result_cache.__RESULTS__.clear()
 
     def test_queue_name(self):
         self.assertEqual(self.validation_consumer.queue_name, 'validation')
@@ -14,11 +21,145 @@ class TestValidationConsumer(unittest.TestCase):
     def test_process_task(self, validate_mock):
         request_mock = mock.MagicMock()
         request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
+
+        response_mock = mock.MagicMock()
+
+        self.validation_consumer.process_task(request_mock, response_mock)
+        validate_mock.assert_called_with('foobar', summary={})
+        self.assertEqual(response_mock.body, 'bazquux')
+
+    @mock.patch('daedalus.validation.validate', return_value='bazquux')
+    def test_process_task_revision(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.side_effect = lambda key: {'tape_id': 'tape-7'}.get(key)
+
+        response_mock = mock.MagicMock()
+
+        self.validation_consumer.process_task(request_mock, response_mock)
+        validate_mock.assert_called_with('foobar', tape_id='tape-7', summary={})
+        self.assertEqual(response_mock.body, 'bazquux')
+
+    def test_process_task_date_formats(self):
+        def validate(body, summary):
+            summary['date_formats'] = {9: '%Y-%m-%d'}
+            return 'bazquux'
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
+        response_mock = mock.MagicMock()
+
+        with mock.patch('daedalus.validation.validate', side_effect=validate):
+            self.validation_consumer.process_task(request_mock, response_mock)
+        response_mock.set_header.assert_called_with('date_formats', '{"9": "%Y-%m-%d"}')
+
+    @mock.patch('daedalus.validation.validate', return_value='{}')
+    def test_process_task_report(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.side_effect = lambda key: {'output_format': 'report'}.get(key)
+
+        response_mock = mock.MagicMock()
+
+        self.validation_consumer.process_task(request_mock, response_mock)
+        validate_mock.assert_called_with('foobar', output_format='report', summary={})
+        self.assertEqual(response_mock.body, '{}')
+        response_mock.set_header.assert_called_with('content_type', 'application/json')
+
+    @mock.patch('daedalus.validation.validate', return_value='{}')
+    def test_process_task_sample(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.side_effect = lambda key: {'output_format': 'sample'}.get(key)
 
         response_mock = mock.MagicMock()
 
         self.validation_consumer.process_task(request_mock, response_mock)
-        validate_mock.assert_called_with('foobar')
+        validate_mock.assert_called_with('foobar', output_format='sample', summary={})
+        response_mock.set_header.assert_called_with('content_type', 'application/json')
+
+    @mock.patch('daedalus.validation.validate', return_value='bazquux')
+    def test_process_task_max_errors(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.side_effect = lambda key: {'max_errors': '100'}.get(key)
+
+        self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        validate_mock.assert_called_with('foobar', max_errors=100, summary={})
+
+    @mock.patch('daedalus.validation.validate', return_value='bazquux')
+    def test_process_task_bad_max_errors(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        for header in ['many', '-1', '2.5']:
+            request_mock.get_header.side_effect = lambda key, header=header: {'max_errors': header}.get(key)
+            with self.assertRaises(daedalus.exceptions.BadHeader):
+                self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        self.assertFalse(validate_mock.called)
+
+    def test_process_task_cached(self):
+        def validate(body, summary):
+            summary['date_formats'] = {9: '%Y-%m-%d'}
+            return 'bazquux'
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
+
+        with mock.patch('daedalus.validation.validate', side_effect=validate) as validate_mock:
+            self.validation_consumer.process_task(request_mock, mock.MagicMock())
+            response_mock = mock.MagicMock()
+            self.validation_consumer.process_task(request_mock, response_mock)
+        self.assertEqual(validate_mock.call_count, 1)
+        self.assertEqual(response_mock.body, 'bazquux')
+        response_mock.set_header.assert_called_with('date_formats', '{"9": "%Y-%m-%d"}')
+
+    @mock.patch('daedalus.validation.validate', return_value='bazquux')
+    def test_process_task_cached_by_format(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
+        self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        request_mock.get_header.side_effect = lambda key: {'output_format': 'report'}.get(key)
+        self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        self.assertEqual(validate_mock.call_count, 2)
+
+    @mock.patch('daedalus.validation.validate', return_value='bazquux')
+    def test_process_task_cached_by_max_errors(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
+        with mock.patch('daedalus.config.VALIDATION_MAX_ERRORS', 10):
+            self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        # The limit given is the one the worker applies by default, so the output is the same.
+        request_mock.get_header.side_effect = lambda key: {'max_errors': '10'}.get(key)
+        with mock.patch('daedalus.config.VALIDATION_MAX_ERRORS', 10):
+            self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        self.assertEqual(validate_mock.call_count, 1)
+        # Workers applying another limit by default don't share the output.
+        request_mock.get_header.side_effect = None
+        self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        self.assertEqual(validate_mock.call_count, 2)
+
+    @mock.patch('daedalus.validation.validate', return_value='{}')
+    def test_process_task_sample_not_cached(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.side_effect = lambda key: {'output_format': 'sample'}.get(key)
+        self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        self.validation_consumer.process_task(request_mock, mock.MagicMock())
+        self.assertEqual(validate_mock.call_count, 2)
+
+    @mock.patch('daedalus.validation.validate', return_value='bazquux')
+    def test_process_task_cache_error(self, validate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
+        response_mock = mock.MagicMock()
+        with mock.patch.object(result_cache.__RESULTS__, 'get', side_effect=IOError('No such device')), \
+             mock.patch.object(result_cache.__RESULTS__, 'put', side_effect=OSError('No space left on device')):
+            self.validation_consumer.process_task(request_mock, response_mock)
+        self.assertEqual(validate_mock.call_count, 1)
         self.assertEqual(response_mock.body, 'bazquux')
 
 class TestMain(unittest.TestCase):
@@ -0,0 +1,70 @@
+import unittest
+
+import daedalus.validation
+from daedalus.validation import plan, validation
+from utils import validation_valid_excel, validation_invalid_type_excel
+
+class ValidationPlanTest(unittest.TestCase):
+    def setUp(self):
+        self.metadata = {'base_column': 1}
+
+    def test_columns(self):
+        compiled = plan.ValidationPlan(self.metadata, [u'INTEGER', u'US_STATE'], [1, u''])
+        self.assertEqual(compiled.columns, [(1, plan.__COLUMN_VALIDATORS__[u'INTEGER'], True), (2, validation.valid_us_state, False)])
+        self.assertEqual(compiled.mandatory_fields, [True, False])
+
+    def test_unknown_type(self):
+        with self.assertRaises(KeyError):
+            plan.ValidationPlan(self.metadata, [u'PLANET'], [1])
+
+    def test_template_key(self):
+        self.assertEqual(plan.template_key([[u'INTEGER', 1.0], [u'CITY', u'']]), ((u'INTEGER', 1.0), (u'CITY', u'')))
+
+    def test_reused_for_same_template(self):
+        plan.__PLAN_CACHE__.clear()
+        first = daedalus.validation.tape_validation.TapeValidation(validation_valid_excel())
+        second = daedalus.validation.tape_validation.TapeValidation(validation_invalid_type_excel())
+        first._read_excel_metadata()
+        second._read_excel_metadata()
+        # Each tape binds its own date validators onto the one compiled plan.
+        self.assertIsNot(first.plan, second.plan)
+        self.assertIs(first.plan.mandatory_fields, second.plan.mandatory_fields)
+        self.assertEqual(len(plan.__PLAN_CACHE__), 1)
+        self.assertEqual(first.metadata, second.metadata)
+        self.assertIsNot(first.metadata, second.metadata)
+
+    def test_bind(self):
+        compiled = plan.ValidationPlan(self.metadata, [u'INTEGER', u'DATE'], [1, 0])
+        date_column = validation.DateColumn()
+        bound = compiled.bind({1: date_column})
+        self.assertEqual(bound.columns, [(1, plan.__COLUMN_VALIDATORS__[u'INTEGER'], True), (2, date_column, False)])
+        self.assertEqual(bound.validators[1], date_column)
+        self.assertEqual(compiled.validators[1], validation.valid_date)
+
+class CompiledValidatorsTest(unittest.TestCase):
+    def test_validators_match(self):
+        fields = [u'', u'1', 2.0, u'2.5', u'$3,950.00', u'3950USD', u'8%', u'8.00%', u'101%', u'foo', u'12345-6789', u'2001.0', u'New Reno', u'#!']
+        for column_type, generic in [(u'ADDRESS', validation.valid_address), (u'CITY', validation.valid_city), (u'COUNTY', validation.valid_county),
+                                     (u'DOLLAR', validation.valid_dollar), (u'FLOAT', validation.valid_float), (u'INTEGER', validation.valid_integer),
+                                     (u'PERCENTAGE', validation.valid_percentage), (u'YEAR', validation.valid_year),
+                                     (u'ZIP_CODE', validation.valid_zip_code)]:
+            for field in fields:
+                try:
+                    expected = generic(field)
+                except Exception as error:
+                    with self.assertRaises(type(error)):
+                        plan.__COLUMN_VALIDATORS__[column_type](field)
+                else:
+                    self.assertEqual(plan.__COLUMN_VALIDATORS__[column_type](field), expected)
+
+    def test_factories_reused(self):
+        self.assertIs(validation.dollar_validator(2), validation.dollar_validator(2))
+        self.assertIsNot(validation.dollar_validator(2), validation.dollar_validator(3))
+
+    def test_bound_arguments(self):
+        self.assertEqual(validation.dollar_validator(2)(u'$3,950.00'), (True, None))
+        self.assertEqual(validation.dollar_validator(2)(u'$3,950.0'), (False, 'Invalid precision.'))
+        self.assertEqual(validation.integer_validator(0, 10)(u'11'), (False, 'Integer outside of max bounds: 11.'))
+        self.assertEqual(validation.float_validator(None, None, 1)(u'2.50'), (False, 'Precision does not match.'))
+        self.assertEqual(validation.percentage_validator(2)(u'8.00%'), (True, None))
+        self.assertEqual(validation.percentage_validator(2)(u'8.0%'), (False, 'Invalid character or format.'))
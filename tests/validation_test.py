@@ -1,3 +1,4 @@
+import datetime
 import unittest
 import re
 
@@ -142,6 +143,58 @@ class ValidDateTest(unittest.TestCase):
         result = daedalus.validation.validation.valid_date(field)
         self.assertEqual(result, (False, 'Invalid date.'))
 
+
+class DateMatcherTest(unittest.TestCase):
+    def test_formats(self):
+        for date_format in daedalus.validation.validation._DATE_FORMATS:
+            matcher = daedalus.validation.validation.date_matcher(date_format)
+            for day in [datetime.date(2015, 1, 2), datetime.date(2012, 2, 29), datetime.date(1999, 12, 31)]:
+                self.assertTrue(matcher(day.strftime(date_format)))
+
+    def test_never_wider_than_strptime(self):
+        fields = ['2015-02-29', '2015-13-01', '2015-00-10', '0000-01-01', '2015-Foo-01', '2015-01-01\n', '2015-1-1', '15-01-01', '']
+        for date_format in daedalus.validation.validation._DATE_FORMATS:
+            matcher = daedalus.validation.validation.date_matcher(date_format)
+            for field in fields:
+                if matcher(field):
+                    datetime.datetime.strptime(field, date_format)
+
+    def test_mismatch(self):
+        matcher = daedalus.validation.validation.date_matcher('%Y-%m-%d')
+        self.assertFalse(matcher('02/01/2015'))
+        self.assertFalse(matcher('2015-02-30'))
+
+class DateColumnTest(unittest.TestCase):
+    def setUp(self):
+        self.fields = [42278.0, '2015-01-02', '2015-Jan-02', '02/01/2015', '2015-02-29', 'yesterday', u'', '2015-12-31', '0-Aug-03']
+
+    def test_same_as_valid_date(self):
+        column = daedalus.validation.validation.DateColumn(sample_size=2)
+        for field in self.fields * 3:
+            self.assertEqual(column(field), daedalus.validation.validation.valid_date(field))
+
+    def test_inferred_while_validating(self):
+        column = daedalus.validation.validation.DateColumn(sample_size=2)
+        column(42278.0)
+        column('2015-01-02')
+        self.assertEqual(column.format, None)
+        column('2015-01-03')
+        self.assertEqual(column.format, '%Y-%m-%d')
+        column('03/01/2015')
+        self.assertEqual(column.format, '%Y-%m-%d')
+
+    def test_sample(self):
+        column = daedalus.validation.validation.DateColumn()
+        column.sample([42278.0, '2015-Jan-02', 'soon', '2015-Feb-03', '01/01/2015'])
+        self.assertEqual(column.format, '%Y-%b-%d')
+        for field in self.fields:
+            self.assertEqual(column(field), daedalus.validation.validation.valid_date(field))
+
+    def test_no_text_dates(self):
+        column = daedalus.validation.validation.DateColumn()
+        column.sample([42278.0, u''])
+        self.assertEqual(column.format, None)
+
 class ValidPercentageTest(unittest.TestCase):
     def test_true_excel(self):
         field = 0.05
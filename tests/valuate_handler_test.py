@@ -23,6 +23,22 @@ class TestValuateHandler(unittest.TestCase):
         transform_mock.assert_called_with(self.valuate_handler.request.body, target_format='json')
         self.assertEqual(self.valuate_handler.request_message.body, '{"json": "object"}')
 
+    @mock.patch('daedalus.xlstransform.transforms.transform', return_value='{"json": "object"}')
+    def test_post_solve(self, transform_mock):
+        arguments = {'solve': 'total_irr'}
+        with mock.patch.object(self.valuate_handler, 'get_argument', side_effect=lambda name, default: arguments.get(name, default)):
+            self.valuate_handler.post()
+        self.assertEqual(self.valuate_handler.request_message.body, {'portfolio': {'json': 'object'}, 'solve': 'total_irr'})
+
+    @mock.patch('daedalus.xlstransform.transforms.transform', return_value='{"json": "object"}')
+    def test_post_encoding(self, transform_mock):
+        arguments = {'encoding': 'columnar', 'precision': '6'}
+        with mock.patch.object(self.valuate_handler, 'get_argument', side_effect=lambda name, default: arguments.get(name, default)):
+            self.valuate_handler.post()
+        self.assertEqual(self.valuate_handler.request_message.get_header('encoding'), 'columnar')
+        self.assertEqual(self.valuate_handler.request_message.get_header('precision'), 6)
+        self.assertEqual(self.valuate_handler.request_message.body, '{"json": "object"}')
+
     @mock.patch('daedalus.xlstransform.transforms.transform', side_effect=ValueError('BOOM!'))
     def test_post_bad_transform(self, transform_mock):
         with mock.patch.object(self.valuate_handler, 'write') as write_mock:
@@ -31,3 +47,34 @@ class TestValuateHandler(unittest.TestCase):
                 transform_mock.assert_called_with(self.valuate_handler.request.body, target_format='json')
                 set_status_mock.assert_called_with(400)
                 write_mock.assert_called_with({'error': 'BOOM!'}) 
+
+    @mock.patch('daedalus.xlstransform.transforms.transform', return_value='{"json": "object"}')
+    def test_post_bad_encoding(self, transform_mock):
+        arguments = {'encoding': 'xml'}
+        with mock.patch.object(self.valuate_handler, 'get_argument', side_effect=lambda name, default: arguments.get(name, default)):
+            with mock.patch.object(self.valuate_handler, 'write') as write_mock:
+                with mock.patch.object(self.valuate_handler, 'set_status') as set_status_mock:
+                    self.valuate_handler.post()
+                    set_status_mock.assert_called_with(400)
+                    write_mock.assert_called_with({'error': 'unsupported encoding: \'xml\''})
+
+    @mock.patch('daedalus.xlstransform.transforms.transform', return_value='{"json": "object"}')
+    def test_post_bad_precision(self, transform_mock):
+        for precision in ['abc', '-1', '16']:
+            arguments = {'encoding': 'columnar', 'precision': precision}
+            with mock.patch.object(self.valuate_handler, 'get_argument', side_effect=lambda name, default: arguments.get(name, default)):
+                with mock.patch.object(self.valuate_handler, 'write') as write_mock:
+                    with mock.patch.object(self.valuate_handler, 'set_status') as set_status_mock:
+                        self.valuate_handler.post()
+                        set_status_mock.assert_called_with(400)
+                        write_mock.assert_called_with({'error': 'precision must be a number of decimals from 0 to 15, got %r' % precision})
+
+    @mock.patch('daedalus.xlstransform.transforms.transform', return_value='{"json": "object"}')
+    def test_post_bad_solve(self, transform_mock):
+        arguments = {'solve': 'npv'}
+        with mock.patch.object(self.valuate_handler, 'get_argument', side_effect=lambda name, default: arguments.get(name, default)):
+            with mock.patch.object(self.valuate_handler, 'write') as write_mock:
+                with mock.patch.object(self.valuate_handler, 'set_status') as set_status_mock:
+                    self.valuate_handler.post()
+                    set_status_mock.assert_called_with(400)
+                    write_mock.assert_called_with({'error': 'unsupported goal seek target: \'npv\''})
@@ -14,14 +14,84 @@ class TestValuationConsumer(unittest.TestCase):
     def test_process_task(self, valuate_mock):
         request_mock = mock.MagicMock()
         request_mock.body = 'foobar'
+        request_mock.get_header.return_value = None
 
         response_mock = mock.MagicMock()
 
         self.valuation_consumer.process_task(request_mock, response_mock)
         response_mock.set_header.assert_called_with('content_type', 'application/json')
-        valuate_mock.assert_called_with('foobar')
+        valuate_mock.assert_called_with('foobar', encoding='json', precision=None)
         self.assertEqual(response_mock.body, 'bazquux')
 
+    @mock.patch('daedalus.valuation.valuate', return_value='bazquux')
+    def test_process_task_encoding(self, valuate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = 'foobar'
+        request_mock.get_header.side_effect = {'encoding': 'npy', 'precision': 4}.get
+
+        response_mock = mock.MagicMock()
+
+        self.valuation_consumer.process_task(request_mock, response_mock)
+        response_mock.set_header.assert_called_with('content_type', 'application/octet-stream')
+        valuate_mock.assert_called_with('foobar', encoding='npy', precision=4)
+
+    @mock.patch('daedalus.valuation.valuate_many', return_value=['{"a":1}', '{"b":2}'])
+    def test_process_task_batch(self, valuate_many_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = {'portfolios': ['foo', 'bar'], 'big_matrix': True}
+
+        response_mock = mock.MagicMock()
+
+        self.valuation_consumer.process_task(request_mock, response_mock)
+        response_mock.set_header.assert_called_with('content_type', 'application/json')
+        valuate_many_mock.assert_called_with(['foo', 'bar'], big_matrix=True)
+        self.assertEqual(response_mock.body, '[{"a":1},{"b":2}]')
+
+    @mock.patch('daedalus.valuation.sensitivity_grid', return_value='{"axes":[]}')
+    def test_process_task_sensitivity(self, sensitivity_grid_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = {'portfolio': 'foo', 'axes': [['bips', [400, 500]]]}
+
+        response_mock = mock.MagicMock()
+
+        self.valuation_consumer.process_task(request_mock, response_mock)
+        sensitivity_grid_mock.assert_called_with('foo', [['bips', [400, 500]]], None)
+        self.assertEqual(response_mock.body, '{"axes":[]}')
+
+    @mock.patch('daedalus.valuation.simulate', return_value='{"P50":{}}')
+    def test_process_task_simulation(self, simulate_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = {'portfolio': 'foo', 'draws': 1000, 'seed': 7}
+
+        response_mock = mock.MagicMock()
+
+        self.valuation_consumer.process_task(request_mock, response_mock)
+        simulate_mock.assert_called_with('foo', big_matrix=False, draws=1000, seed=7, distributions=None, processes=1)
+        self.assertEqual(response_mock.body, '{"P50":{}}')
+
+    @mock.patch('daedalus.valuation.goal_seek', return_value=[3100000.0])
+    def test_process_task_solve(self, goal_seek_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = {'portfolio': 'foo', 'solve': 'surplus'}
+
+        response_mock = mock.MagicMock()
+
+        self.valuation_consumer.process_task(request_mock, response_mock)
+        goal_seek_mock.assert_called_with(['foo'], target='surplus')
+        self.assertEqual(response_mock.body, '{"Deal Value":3100000.0}')
+
+    @mock.patch('daedalus.valuation.valuate_segments', return_value='{"CA":{}}')
+    def test_process_task_segments(self, valuate_segments_mock):
+        request_mock = mock.MagicMock()
+        request_mock.body = {'portfolio': 'foo', 'segment_by': 'State'}
+
+        response_mock = mock.MagicMock()
+
+        self.valuation_consumer.process_task(request_mock, response_mock)
+        response_mock.set_header.assert_called_with('content_type', 'application/json')
+        valuate_segments_mock.assert_called_with('foo', 'State', big_matrix=False)
+        self.assertEqual(response_mock.body, '{"CA":{}}')
+
 class TestMain(unittest.TestCase):
     @mock.patch.object(daedalus.valuation.service.ValuationConsumer, 'run')
     @mock.patch('daedalus.common.service.preflight')
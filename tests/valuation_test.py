@@ -1,7 +1,9 @@
+import daedalus.exceptions
 import json
 import sys
 import unittest
 
+from daedalus.common import timing
 from daedalus.valuation import valuation, service
 from daedalus.xlstransform import transforms
 from decimal import Decimal
@@ -371,3 +373,213 @@ class TestValuation(unittest.TestCase):
     def test_process_task(self):
         with patch('daedalus.valuation') as valuation_mock:
             valuation_mock.assert_called()
+
+class TestNumpyEngine(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+
+    def test_good(self):
+        result = json.loads(valuation.valuate(self.data, engine='numpy'))
+        expected = json.loads(valuation.valuate(self.data))
+        self.assertEqual(sorted(result.keys()), sorted(expected.keys()))
+        self.assertIsNone(result['Offer Over Valuation']['1'])
+        self.assertAlmostEqual(result['Deal Value']['1'], expected['Deal Value']['1'])
+        self.assertAlmostEqual(result['Total IRR']['0'], expected['Total IRR']['0'])
+
+    def test_engines_agree(self):
+        self.assertTrue(valuation.engines_agree(self.data))
+
+    def test_engines_agree_big_matrix(self):
+        self.assertTrue(valuation.engines_agree(self.data, big_matrix=True))
+
+    def test_stage_timings(self):
+        with timing.record() as timings:
+            valuation.valuate(self.data, engine='numpy', cash_flow_irr=True)
+        self.assertEqual(list(timings.keys()), ['parse', 'aggregate', 'matrix_build', 'cash_flow_irr', 'encode'])
+
+    def test_unknown_engine(self):
+        with self.assertRaises(daedalus.exceptions.UnknownEngine):
+            valuation.valuate(self.data, engine='abacus')
+
+class TestValuateMany(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+
+    def test_good(self):
+        other = json.loads(transforms.transform(valuation_workbook_two()))
+        other['sheets'][0]['rows'][0][0] = 3000000.0
+        results = valuation.valuate_many([self.data, other])
+        self.assertEqual(len(results), 2)
+        self.assertEqual(json.loads(results[0]), json.loads(valuation.valuate(self.data, engine='numpy')))
+        self.assertEqual(json.loads(results[1]), json.loads(valuation.valuate(other, engine='numpy')))
+        self.assertEqual(json.loads(results[1])['Deal Value']['1'], 3000000.0)
+
+    def test_big_matrix(self):
+        results = valuation.valuate_many([self.data], big_matrix=True)
+        self.assertEqual(json.loads(results[0]), json.loads(valuation.valuate(self.data, big_matrix=True, engine='numpy')))
+
+    def test_empty(self):
+        self.assertEqual(valuation.valuate_many([]), [])
+
+class TestAggregateCache(unittest.TestCase):
+    def setUp(self):
+        valuation.__AGGREGATE_CACHE__.clear()
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+
+    def test_aggregates(self):
+        result = valuation._data_sheet_aggregates(self.data['sheets'][1])
+        self.assertEqual(result['total_current_valuation'], Decimal(3000000))
+        self.assertEqual(result['property_count'], 3)
+
+    def test_cache_hit(self):
+        first = valuation.valuate(self.data)
+        # Changing the deal sheet or a column that is not summed must reuse the data sheet aggregates.
+        self.data['sheets'][0]['rows'][0][0] = 3000000.0
+        self.data['sheets'][1]['rows'][0][self.data['sheets'][1]['columns'].index('State')] = u'NV'
+        with patch('daedalus.valuation.valuation._sum_columns', wraps=valuation._sum_columns) as sum_columns_mock:
+            with patch('daedalus.valuation.valuation._cell_number', wraps=valuation._cell_number) as cell_number_mock:
+                second = valuation.valuate(self.data)
+        self.assertFalse(sum_columns_mock.called)
+        self.assertFalse(cell_number_mock.called)
+        self.assertEqual(len(valuation.__AGGREGATE_CACHE__), 1)
+        self.assertNotEqual(first, second)
+
+    def test_cache_miss_on_changed_data(self):
+        valuation.valuate(self.data)
+        self.data['sheets'][1]['rows'][0][24] = 900000.0
+        result = json.loads(valuation.valuate(self.data))
+        self.assertEqual(len(valuation.__AGGREGATE_CACHE__), 2)
+        self.assertEqual(result['Deal Value']['0'], 3075000.0)
+
+    def test_cache_miss_on_added_row(self):
+        valuation.valuate(self.data)
+        rows = self.data['sheets'][1]['rows']
+        rows.append([None] * len(rows[0]))
+        self.assertEqual(valuation._data_sheet_aggregates(self.data['sheets'][1])['property_count'], 4)
+
+class TestStreamingAggregation(unittest.TestCase):
+    def setUp(self):
+        self.sheet = {'columns': ['Address', 'Monthly Rent', 'Valuation'],
+                      'rows': [['1 Elm St', 1000.0, 100000.0], ['2 Elm St', None, 200000.0], ['3 Elm St', 1500.0, 150000.0]]}
+
+    def test_sum_columns(self):
+        totals, row_count = valuation._sum_columns(self.sheet, ['Valuation', 'Monthly Rent'])
+        self.assertEqual(totals, [450000.0, 2500.0])
+        self.assertEqual(row_count, 3)
+
+    def test_sum_columns_empty_and_text_cells(self):
+        self.sheet['rows'][0][1] = u''
+        totals, _ = valuation._sum_columns(self.sheet, ['Monthly Rent'])
+        self.assertEqual(totals, [1500.0])
+        self.sheet['rows'][0][1] = u'n/a'
+        with self.assertRaises(daedalus.exceptions.BadCellValue):
+            valuation._sum_columns(self.sheet, ['Monthly Rent'])
+
+    def test_sum_columns_missing_column(self):
+        with self.assertRaises(daedalus.exceptions.BadDataFrameKey):
+            valuation._sum_columns(self.sheet, ['Rent'])
+
+    def test_get_from_sheet(self):
+        deal_sheet = {'columns': ['Current Offer', 'Target IRR'], 'rows': [[100.0, 0.12]]}
+        self.assertEqual(valuation._get_from_sheet('Target IRR', deal_sheet), Decimal(0.12))
+
+    def test_get_from_sheet_missing_key(self):
+        deal_sheet = {'columns': ['Current Offer'], 'rows': [[100.0]]}
+        with self.assertRaises(daedalus.exceptions.BadDataFrameKey):
+            valuation._get_from_sheet('Target IRR', deal_sheet)
+
+    def test_get_from_sheet_no_rows(self):
+        deal_sheet = {'columns': ['Current Offer'], 'rows': []}
+        with self.assertRaises(daedalus.exceptions.BadDataFrameKey):
+            valuation._get_from_sheet('Current Offer', deal_sheet)
+
+class TestCashFlowIrr(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+
+    def test_good(self):
+        result = json.loads(valuation.valuate(self.data, big_matrix=True, engine='numpy', cash_flow_irr=True))
+        self.assertEqual(len(result['Cash Flow IRR']), 33)
+        self.assertTrue(all(result['IRR Converged'].values()))
+        # Paying more for the same cash flows returns less.
+        self.assertGreater(result['Cash Flow IRR']['2'], result['Cash Flow IRR']['3'])
+
+    def test_decimal_engine(self):
+        result = json.loads(valuation.valuate(self.data, cash_flow_irr=True, holding_period=10))
+        self.assertTrue(all(result['IRR Converged'].values()))
+
+    def test_off_by_default(self):
+        result = json.loads(valuation.valuate(self.data))
+        self.assertNotIn('Cash Flow IRR', result)
+
+class TestValuateSegments(unittest.TestCase):
+    def setUp(self):
+        self.data = json.loads(transforms.transform(valuation_workbook_two()))
+
+    def test_single_segment(self):
+        # Every property is in CA, so the one segment is the whole portfolio.
+        result = json.loads(valuation.valuate_segments(self.data, 'State'))
+        self.assertEqual(result.keys(), ['CA'])
+        self.assertEqual(result['CA'], json.loads(valuation.valuate(self.data, engine='numpy')))
+
+    def test_segments_match_sub_sheets(self):
+        result = json.loads(valuation.valuate_segments(self.data, 'Zip', big_matrix=True))
+        self.assertEqual(sorted(result.keys()), ['94105', '94111', '94115'])
+        zip_index = self.data['sheets'][1]['columns'].index('Zip')
+        rows = self.data['sheets'][1]['rows']
+        for row in rows:
+            sub_sheet = json.loads(json.dumps(self.data))
+            sub_sheet['sheets'][1]['rows'] = [row]
+            share = row[24] / sum(other[24] for other in rows)
+            sub_sheet['sheets'][0]['rows'][0][0] *= share
+            expected = json.loads(valuation.valuate(sub_sheet, big_matrix=True, engine='numpy'))
+            for column in expected:
+                for offer in expected[column]:
+                    if isinstance(expected[column][offer], float):
+                        self.assertAlmostEqual(result[row[zip_index]][column][offer], expected[column][offer])
+
+    def test_missing_column(self):
+        with self.assertRaises(daedalus.exceptions.BadDataFrameKey):
+            valuation.valuate_segments(self.data, 'Planet')
+
+    def test_empty(self):
+        self.data['sheets'][1]['rows'] = []
+        self.assertEqual(valuation.valuate_segments(self.data, 'State'), '{}')
+
+    def test_no_labels(self):
+        state_index = self.data['sheets'][1]['columns'].index('State')
+        for row in self.data['sheets'][1]['rows']:
+            row[state_index] = None
+        with patch('numpy.bincount') as bincount_mock:
+            labels, rents, valuations, counts = valuation._segment_aggregates(self.data['sheets'][1], 'State')
+        self.assertFalse(bincount_mock.called)
+        self.assertEqual((labels, len(rents), len(valuations), len(counts)), ([], 0, 0, 0))
+
+    def test_missing_labels_and_cells(self):
+        columns = self.data['sheets'][1]['columns']
+        state_index, rent_index = columns.index('State'), columns.index(valuation.__COLUMN_LABEL__['rent'])
+        rows = self.data['sheets'][1]['rows']
+        unlabelled = json.loads(json.dumps(rows[0]))
+        unlabelled[state_index] = None
+        rows[1][rent_index] = u''
+        rows.append(unlabelled)
+        labels, rents, _, counts = valuation._segment_aggregates(self.data['sheets'][1], 'State')
+        self.assertEqual(labels, ['CA'])
+        self.assertEqual(counts.tolist(), [len(rows) - 1])
+        self.assertAlmostEqual(rents[0], sum(row[rent_index] for row in rows[:-1] if row[rent_index] != u''))
+        self.assertEqual(json.loads(valuation.valuate_segments(self.data, 'State')).keys(), ['CA'])
+
+    def test_empty_rent_cell(self):
+        # An empty cell is skipped by the segment totals as by the whole portfolio ones.
+        rent_index = self.data['sheets'][1]['columns'].index(valuation.__COLUMN_LABEL__['rent'])
+        self.data['sheets'][1]['rows'][1][rent_index] = u''
+        result = json.loads(valuation.valuate_segments(self.data, 'State'))
+        self.assertEqual(result['CA'], json.loads(valuation.valuate(self.data, engine='numpy')))
+
+    def test_text_rent_cell(self):
+        rent_index = self.data['sheets'][1]['columns'].index(valuation.__COLUMN_LABEL__['rent'])
+        self.data['sheets'][1]['rows'][1][rent_index] = u'n/a'
+        with self.assertRaises(daedalus.exceptions.BadCellValue):
+            valuation.valuate(self.data)
+        with self.assertRaises(daedalus.exceptions.BadCellValue):
+            valuation.valuate_segments(self.data, 'State')
@@ -0,0 +1,47 @@
+import numpy
+import pandas
+import unittest
+
+from daedalus.valuation import vectorized
+
+class OfferColumnsTest(unittest.TestCase):
+    def test_good(self):
+        result = vectorized.offer_columns([1.0, numpy.nan, 1.08], 1000.0, 1050.0, 120.0, 1100.0, 0.5, 0.1, 3.0, -0.035, 1.0141)
+        numpy.testing.assert_allclose(result['Deal Value'], [1000.0, 1050.0, 1080.0])
+        numpy.testing.assert_allclose(result['Profit vs Baseline Value'], [100.0, 50.0, 20.0])
+        numpy.testing.assert_allclose(result['Gross Yield'], [0.12, 120.0 / 1050.0, 120.0 / 1080.0])
+        numpy.testing.assert_allclose(result['NOI'], result['Gross Yield'] * 0.5)
+        numpy.testing.assert_allclose(result['Premium'], [0.0, 0.05, 0.08])
+        numpy.testing.assert_allclose(result['Coupon IRR'], result['NOI'] * 3.0 - 0.035)
+        numpy.testing.assert_allclose(result['Surplus or Deficit'], result['Coupon IRR'] - 0.1)
+        numpy.testing.assert_allclose(result['Total IRR'], result['Coupon IRR'] + 0.0141)
+
+    def test_zero_deal_value(self):
+        result = vectorized.offer_columns([0.0, 1.0], 1000.0, 0.0, 120.0, 1100.0, 0.5, 0.1, 3.0, -0.035, 1.0141)
+        self.assertTrue(numpy.isnan(result['Gross Yield'][0]))
+        self.assertEqual(result['Gross Yield'][1], 0.12)
+
+    def test_zero_total_value(self):
+        result = vectorized.offer_columns([1.0], 0.0, 0.0, 120.0, 0.0, 0.5, 0.1, 3.0, -0.035, 1.0141)
+        self.assertTrue(numpy.isnan(result['Premium'][0]))
+
+    def test_broadcast(self):
+        result = vectorized.offer_columns([1.0, 1.04], numpy.array([[1000.0], [2000.0]]), 0.0, 120.0, 0.0, 0.5, 0.1, 3.0, -0.035, 1.0141)
+        self.assertEqual(result['Deal Value'].shape, (2, 2))
+        numpy.testing.assert_allclose(result['Deal Value'], [[1000.0, 1040.0], [2000.0, 2080.0]])
+
+class WithinToleranceTest(unittest.TestCase):
+    def setUp(self):
+        self.expected = pandas.DataFrame({column: [1.0, None] for column in vectorized.__OFFER_COLUMNS__})
+
+    def test_good(self):
+        actual = {column: numpy.array([1.0 + 1e-12, numpy.nan]) for column in vectorized.__OFFER_COLUMNS__}
+        self.assertTrue(vectorized.within_tolerance(self.expected, actual))
+
+    def test_outside_tolerance(self):
+        actual = {column: numpy.array([1.001, numpy.nan]) for column in vectorized.__OFFER_COLUMNS__}
+        self.assertFalse(vectorized.within_tolerance(self.expected, actual))
+
+    def test_missing_values_mismatch(self):
+        actual = {column: numpy.array([1.0, 1.0]) for column in vectorized.__OFFER_COLUMNS__}
+        self.assertFalse(vectorized.within_tolerance(self.expected, actual))
@@ -0,0 +1,86 @@
+import json
+import unittest
+
+import xlrd
+
+from benchmarks import generators
+from daedalus.validation.tape_validation import TapeValidation
+from daedalus.xlstransform import transforms
+from daedalus.xlstransform.workbook import StreamingWorkbook, Workbook
+from mock import patch
+from utils import xls_data, xlsx_data, validation_valid_excel, validation_invalid_type_excel
+
+class WorkbookTest(unittest.TestCase):
+    def assert_matches_json(self, data):
+        workbook = Workbook(data)
+        sheets = json.loads(transforms.excel_to_json(data))['sheets']
+        self.assertEqual(workbook.sheet_names(), [sheet['name'] for sheet in sheets])
+        for index, sheet in enumerate(sheets):
+            self.assertEqual(workbook.columns(sheet['name']), sheet['columns'])
+            self.assertEqual(workbook.rows(sheet['name']), sheet['rows'])
+            self.assertEqual(workbook.rows(index), sheet['rows'])
+
+    def test_xls(self):
+        self.assertFalse(Workbook(xls_data(raw=True)).is_xlsx)
+        self.assert_matches_json(xls_data(raw=True))
+
+    def test_xlsx(self):
+        self.assertTrue(Workbook(xlsx_data(raw=True)).is_xlsx)
+        self.assert_matches_json(xlsx_data(raw=True))
+
+    def test_tape(self):
+        self.assert_matches_json(validation_invalid_type_excel())
+
+    def test_missing_sheet(self):
+        workbook = Workbook(validation_valid_excel())
+        self.assertEqual(workbook.sheet(u'Nope'), None)
+        self.assertEqual(workbook.sheet(42), None)
+        self.assertEqual(workbook.rows(u'Nope'), [])
+
+    def test_rows_kept(self):
+        workbook = Workbook(validation_valid_excel())
+        self.assertIs(workbook.rows(0), workbook.rows(workbook.sheet_names()[0]))
+
+    def test_formatting_info_xlsx(self):
+        # xlrd reads no styles from xlsx, asking for them must not fail.
+        self.assertTrue(Workbook(xlsx_data(raw=True), formatting_info=True).book.nsheets > 0)
+
+def trimmed(row):
+    while row and row[-1] == u'':
+        row = row[:-1]
+    return row
+
+class StreamingWorkbookTest(unittest.TestCase):
+    def assert_matches_workbook(self, data):
+        workbook, streaming = Workbook(data), StreamingWorkbook(data)
+        self.assertEqual(streaming.sheet_names(), workbook.sheet_names())
+        for name in workbook.sheet_names():
+            # Streamed rows can carry more trailing empty cells.
+            self.assertEqual([trimmed(row) for row in streaming.iter_rows(name)], [trimmed(row) for row in workbook.rows(name)])
+
+    def test_fixtures(self):
+        for data in [xlsx_data(raw=True), validation_valid_excel(), validation_invalid_type_excel()]:
+            self.assert_matches_workbook(data)
+
+    def test_synthetic(self):
+        self.assert_matches_workbook(generators.tape_workbook(50, seed=2, invalid_fraction=0.2))
+        self.assert_matches_workbook(generators.valuation_workbook(20))
+
+    def test_missing_sheet(self):
+        streaming = StreamingWorkbook(validation_valid_excel())
+        self.assertEqual(list(streaming.iter_rows(u'Nope')), [])
+        self.assertEqual(streaming.rows(42), [])
+
+class SingleParseTest(unittest.TestCase):
+    def test_validation_parses_once(self):
+        with patch('daedalus.xlstransform.workbook.xlrd.open_workbook', side_effect=xlrd.open_workbook) as open_mock:
+            validation = TapeValidation(validation_valid_excel())
+            validation._check_type()
+            validation._calculate_property_count()
+        self.assertEqual(open_mock.call_count, 1)
+        self.assertFalse(open_mock.call_args[1]['formatting_info'])
+
+    def test_map_sheet(self):
+        validation = TapeValidation(validation_valid_excel())
+        validation._read_excel_metadata()
+        self.assertEqual(validation.plan.column_types[0], validation.workbook.rows(u'Map')[0][0])
@@ -5,6 +5,7 @@ import StringIO
 import sys
 import unittest
 
+from daedalus.common import timing
 from daedalus.xlstransform import application, transforms, is_json
 from mock import patch
 from utils import xls_data, xlsx_data, json_xls_data, json_xlsx_data, to_json, json_corner_data, json_object_notation
@@ -30,6 +31,11 @@ class TestXlstransform(unittest.TestCase):
         with self.assertRaisesRegexp(daedalus.exceptions.BadFileFormat, 'Need excel document to translate to JSON'):
             transforms.transform(json_xls_data(raw=True), source_format='json', target_format='json')
 
+    def test_stage_timings(self):
+        with timing.record() as timings:
+            transforms.transform(transforms.transform(xls_data(raw=True)), source_format='json', target_format='excel')
+        self.assertEqual(list(timings.keys()), ['read_excel', 'encode_json', 'parse_json', 'write_excel'])
+
     def test_pretty_transform(self):
         transform = transforms.transform(xls_data(raw=True), pretty=True)
         self.assertTrue(isinstance(transform, basestring))
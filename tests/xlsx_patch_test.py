@@ -0,0 +1,129 @@
+import StringIO
+import struct
+import unittest
+import zipfile
+
+import openpyxl
+
+from benchmarks import generators
+from daedalus.exceptions import BadFileFormat
+from daedalus.validation.tape_validation import TapeValidation
+from daedalus.xlstransform import xlsx_patch
+from utils import validation_valid_excel, xls_data
+
+__STYLES__ = {
+    'red': {'fill': 'FFFF0000', 'font_colour': 'FFFFFFFF'},
+    'border': {'borders': [('left', 'thin', 'FFFF0000'), ('right', 'thin', 'FFFF0000')]}
+}
+
+def members(data):
+    archive = zipfile.ZipFile(StringIO.StringIO(data))
+    return dict((name, archive.read(name)) for name in archive.namelist())
+
+def compressed(data, name):
+    '''Bytes of a zip member as stored in the zip.'''
+    info = zipfile.ZipFile(StringIO.StringIO(data)).getinfo(name)
+    header = info.header_offset + 30
+    name_length, extra_length = struct.unpack('<HH', data[header - 4:header])
+    return data[header + name_length + extra_length:header + name_length + extra_length + info.compress_size]
+
+def first_sheet(data):
+    return openpyxl.load_workbook(StringIO.StringIO(data)).worksheets[0]
+
+class ColumnLettersTest(unittest.TestCase):
+    def test_round_trip(self):
+        for col, letters in [(0, 'A'), (25, 'Z'), (26, 'AA'), (51, 'AZ'), (701, 'ZZ'), (702, 'AAA')]:
+            self.assertEqual(xlsx_patch.column_letters(col), letters)
+            self.assertEqual(xlsx_patch.column_index(letters), col)
+
+class PatchWorkbookTest(unittest.TestCase):
+    def setUp(self):
+        self.tape = generators.tape_workbook(20)
+
+    def test_values(self):
+        output = xlsx_patch.patch_workbook(self.tape, [((2, 1), u'Caf\xe9 & <co>', None), ((3, 2), 42, None), ((4, 3), 1.5, None)],
+                                           __STYLES__)
+        sheet = first_sheet(output)
+        self.assertEqual(sheet.cell(3, 2).value, u'Caf\xe9 & <co>')
+        self.assertEqual(sheet.cell(4, 3).value, 42)
+        self.assertEqual(sheet.cell(5, 4).value, 1.5)
+
+    def test_style_keeps_value(self):
+        before = first_sheet(self.tape).cell(5, 2).value
+        output = xlsx_patch.patch_workbook(self.tape, [((4, 1), None, 'border'), ((4, 1), None, 'red')], __STYLES__)
+        cell = first_sheet(output).cell(5, 2)
+        self.assertEqual(cell.value, before)
+        # The later style of a cell wins, as with xlwt.
+        self.assertEqual(cell.fill.fgColor.rgb, 'FFFF0000')
+        self.assertEqual(cell.font.color.rgb, 'FFFFFFFF')
+        self.assertEqual(cell.border.left.style, None)
+
+    def test_styles_shared(self):
+        output = xlsx_patch.patch_workbook(self.tape, [((row, 1), None, 'border') for row in range(1, 10)], __STYLES__)
+        added = len(members(output)['xl/styles.xml']) - len(members(self.tape)['xl/styles.xml'])
+        self.assertTrue(0 < added < 500)
+
+    def test_other_members_copied(self):
+        output = xlsx_patch.patch_workbook(self.tape, [((2, 1), u'x', 'red')], __STYLES__)
+        before, after = members(self.tape), members(output)
+        self.assertEqual(sorted(after), sorted(before))
+        changed = [name for name in before if before[name] != after[name]]
+        self.assertEqual(sorted(changed), ['xl/styles.xml', 'xl/worksheets/sheet1.xml'])
+        self.assertEqual(zipfile.ZipFile(StringIO.StringIO(output)).testzip(), None)
+
+    def test_other_members_not_recompressed(self):
+        output = xlsx_patch.patch_workbook(self.tape, [((2, 1), u'x', 'red')], __STYLES__)
+        before, after = zipfile.ZipFile(StringIO.StringIO(self.tape)), zipfile.ZipFile(StringIO.StringIO(output))
+        for name in ['xl/workbook.xml', '[Content_Types].xml']:
+            self.assertEqual(after.getinfo(name).compress_type, before.getinfo(name).compress_type)
+            self.assertEqual(after.getinfo(name).CRC, before.getinfo(name).CRC)
+            self.assertEqual(compressed(output, name), compressed(self.tape, name))
+
+    def test_sheet_name(self):
+        book = openpyxl.load_workbook(StringIO.StringIO(self.tape))
+        book.create_sheet(u'Cover', 0)
+        output_stream = StringIO.StringIO()
+        book.save(output_stream)
+        output = xlsx_patch.patch_workbook(output_stream.getvalue(), [((2, 1), u'x', None)], __STYLES__, u'Portfolio')
+        patched = openpyxl.load_workbook(StringIO.StringIO(output))
+        self.assertEqual(patched[u'Portfolio'].cell(3, 2).value, u'x')
+        self.assertEqual(patched[u'Cover'].cell(3, 2).value, None)
+        self.assertRaises(BadFileFormat, xlsx_patch.patch_workbook, self.tape, [], __STYLES__, u'Missing')
+
+    def test_untouched_rows(self):
+        output = xlsx_patch.patch_workbook(self.tape, [((2, 1), u'x', None)], __STYLES__)
+        before, after = first_sheet(self.tape), first_sheet(output)
+        for row in [1, 2, 4, 10]:
+            self.assertEqual([cell.value for cell in after[row]], [cell.value for cell in before[row]])
+
+    def test_missing_cells_and_rows(self):
+        output = xlsx_patch.patch_workbook(self.tape, [((2, 60), u'wide', None), ((500, 0), u'low', 'red')], __STYLES__)
+        sheet = first_sheet(output)
+        self.assertEqual(sheet.cell(3, 61).value, u'wide')
+        self.assertEqual(sheet.cell(501, 1).value, u'low')
+        self.assertEqual(sheet.max_row, 501)
+
+    def test_fixture(self):
+        output = xlsx_patch.patch_workbook(validation_valid_excel(), [((1, 1), u'Valid', 'red')], __STYLES__)
+        self.assertEqual(first_sheet(output).cell(2, 2).value, u'Valid')
+
+    def test_not_xlsx(self):
+        self.assertRaises(BadFileFormat, xlsx_patch.patch_workbook, xls_data(raw=True), [], __STYLES__)
+
+class WriteToExcelTest(unittest.TestCase):
+    def test_alter_document(self):
+        tape = generators.tape_workbook(100, invalid_fraction=0.05)
+        validation = TapeValidation(tape)
+        problems = validation._check_type()
+        output = validation._alter_document(problems)
+        sheet = first_sheet(output)
+        status_row, status_col = validation.metadata['status_field']
+        status = sheet.cell(status_row + 1, status_col + 1)
+        self.assertEqual(status.value, ', '.join(str(row) for row in sorted(set(row for (row, _), _ in problems))))
+        self.assertEqual(status.fill.fgColor.rgb, 'FFFF0000')
+        self.assertTrue(problems)
+        for (row, col), _ in problems:
+            # Problems give 1-based Excel rows and 0-based columns.
+            cell = sheet.cell(row, col + 1)
+            self.assertEqual(cell.border.top.color.rgb, 'FFFF0000')
+            self.assertIn(cell.value, generators.__INVALID_VALUES__.values())